@@ -1,10 +1,10 @@
 import os
 import sys
 import time
-import shutil
 import logging
+import json
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context, url_for
 
 # Configure logging
 logging.basicConfig(
@@ -21,45 +21,166 @@ os.chdir(project_root)  # Set working directory to project root
 
 # Import business analyst service
 from src.application.business_analyst_service import BusinessAnalystService
+from src.application.dataset_catalog import DATASET_NAME_PATTERN
+from src.application.history_store import HistoryStore
+from src.application.job_queue import JobQueue, QueueFullError, current_job
+from src.core.chart_renderer import table_from_payload
+from src.core.result_tables import read_table_page
+from src.crew.business_analyst_crew import prewarm
 
 # Initialize Flask app
 app = Flask(__name__)
 app.template_folder = os.path.join(project_root, 'src', 'web', 'templates')
 app.static_folder = os.path.join(project_root, 'src', 'web', 'static')
 
-# Create static directories if they don't exist
-os.makedirs(os.path.join(app.static_folder, 'visualizations'), exist_ok=True)
+# Start the code sandboxes in the background while the service loads its datasets
+prewarm()
 
 # Initialize the business analyst service
 analyst_service = BusinessAnalystService()
 
-# Store analysis history
-analysis_history = []
+# Run analyses on a bounded pool of workers instead of the request threads
+job_queue = JobQueue.from_config(analyst_service.system_config.get("jobs", {}))
+RETRY_AFTER_SECONDS = 30
+# Artifact names are content hashes, so their content never changes
+ARTIFACT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Artifacts shown as visualizations; other files are only linked
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')
+# Comment lines sent while a job is quiet, so proxies don't close the event stream
+SSE_KEEPALIVE_SECONDS = 15
+
+# Finished analyses, kept across restarts
+history_config = analyst_service.system_config.get("history", {})
+history_store = HistoryStore(
+    path=history_config.get("path", os.path.join(".cache", "history.sqlite")),
+    max_entries=history_config.get("max_entries", 10000)
+)
+HISTORY_PAGE_SIZE = history_config.get("page_size", 20)
+HISTORY_MAX_PAGE_SIZE = 100
+# Rows of a large result table returned per request
+TABLE_PAGE_SIZE = 100
+TABLE_MAX_PAGE_SIZE = 1000
 
 @app.route('/')
 def index():
     """Render the main page"""
-    # Get available datasets for dropdown
-    datasets = analyst_service.list_datasets()
-    return render_template('index.html', history=analysis_history, datasets=datasets)
+    # Get available datasets for dropdown, including those still loading
+    datasets = [status['name'] for status in analyst_service.dataset_status() if status['status'] != 'failed']
+    history = history_store.page(limit=HISTORY_PAGE_SIZE)
+    return render_template('index.html', history=history['items'], history_cursor=history['latest'] or 0,
+                           datasets=datasets)
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
-    """Process a data analysis query"""
+    """Queue a data analysis query and return the id of its job"""
+    # Get the query from the form
+    query = request.form.get('query')
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    
+    # Get selected dataset
+    dataset_name = request.form.get('dataset')
+    
+    try:
+        # Set when a proxy or the WSGI server authenticates users
+        job = job_queue.submit(run_analysis, query, dataset_name, request.remote_user,
+                               metadata={'query': query, 'dataset': dataset_name})
+    except QueueFullError as e:
+        logger.warning(f"Rejected query '{query}': {str(e)}")
+        response = jsonify({'error': f"The server is busy: {str(e)}. Please try again shortly."})
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response, 503
+    
+    logger.info(f"Queued query: '{query}' on dataset: '{dataset_name}' as job {job.id}")
+    return job_accepted(job)
+
+def job_accepted(job):
+    """Answer a request that queued a job with the URLs to follow it"""
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'position': job_queue.position(job),
+        'status_url': url_for('job_status', job_id=job.id),
+        'events_url': url_for('job_events', job_id=job.id)
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Return the status of an analysis job, and its result once finished"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown or expired job '{job_id}'"}), 404
+    
+    status = job.to_dict()
+    status['position'] = job_queue.position(job)
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream the progress of an analysis job as Server-Sent Events"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown or expired job '{job_id}'"}), 404
+    
+    # Browsers reconnect with the id of the last event they received
+    last_event_id = request.headers.get('Last-Event-ID', -1, type=int)
+    
+    def generate():
+        after = last_event_id
+        if after < 0 and job.status == 'queued':
+            yield format_sse('status', {'status': job.status, 'position': job_queue.position(job)})
+        while True:
+            events = job.wait_for_events(after, timeout=SSE_KEEPALIVE_SECONDS)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                yield format_sse(event['type'], event['data'], event['id'])
+                after = event['id']
+                if event['type'] == 'done':
+                    return
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def format_sse(event_type, data, event_id=None):
+    """Format one Server-Sent Event"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.route('/jobs')
+def job_stats():
+    """Return job queue statistics"""
+    return jsonify(job_queue.stats())
+
+def run_analysis(query, dataset_name, user=None):
+    """Run a data analysis query on a job worker and record it in the history"""
     try:
-        # Get the query from the form
-        query = request.form.get('query')
-        if not query:
-            return jsonify({'error': 'No query provided'}), 400
+        logger.info(f"Processing query: '{query}' on dataset: '{dataset_name}'")
         
-        # Get selected dataset
-        dataset_name = request.form.get('dataset')
+        # Execute the analysis, streaming its progress to clients following the job
+        job = current_job()
+        artifact_paths = []
+        tables = []
         
-        logger.info(f"Processing query: '{query}' on dataset: '{dataset_name}'")
+        def progress(event_type, data):
+            # Job workers run outside a request, so URLs are built by hand
+            if event_type == 'artifact':
+                data = dict(data, url=f"/artifacts/{data['name']}")
+                artifact_paths.append(data['url'])
+            elif event_type == 'table':
+                if data.get('artifact'):
+                    data = dict(data, url=f"/tables/{data['artifact']}")
+                tables.append(data)
+            if job:
+                job.emit(event_type, data)
         
-        # Execute the analysis
         start_time = time.time()
-        result = analyst_service.analyze_query(query, dataset_name)
+        result = analyst_service.analyze_query(query, dataset_name, progress=progress)
         execution_time = time.time() - start_time
         
         logger.info(f"Analysis completed in {execution_time:.2f} seconds")
@@ -67,8 +188,8 @@ def analyze():
         # Check if result contains error
         if isinstance(result, str) and (result.startswith("Error:") or result.startswith("Analysis failed:")):
             logger.warning(f"Analysis returned error: {result}")
-            # Still return a 200 status code so we can display the error nicely
-            return jsonify({
+            # Still complete the job normally so we can display the error nicely
+            return {
                 'query': query,
                 'dataset': dataset_name,
                 'result': result,
@@ -76,13 +197,13 @@ def analyze():
                 'timestamp': datetime.now().strftime("%Y%m%d_%H%M%S"),
                 'visualizations': [],
                 'has_error': True
-            })
+            }
         
         # Create timestamp for this analysis
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # Handle visualizations
-        vis_paths = process_visualizations(timestamp)
+        # Charts produced by the analysis, served from the artifact store
+        vis_paths = [path for path in artifact_paths if path.endswith(IMAGE_EXTENSIONS)]
         
         # Store the analysis result
         analysis_record = {
@@ -92,72 +213,154 @@ def analyze():
             'execution_time': f"{execution_time:.2f} seconds",
             'timestamp': timestamp,
             'visualizations': vis_paths,
+            'artifacts': artifact_paths,
+            'tables': tables,
             'has_error': False
         }
         
-        # Add to history (keep only the latest 10 for simplicity)
-        analysis_history.insert(0, analysis_record)
-        if len(analysis_history) > 10:
-            analysis_history.pop()
+        analysis_record['id'] = history_store.add(analysis_record, user=user)
         
-        return jsonify(analysis_record)
+        return analysis_record
     
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        logger.error(f"Exception in analyze route: {str(e)}")
+        logger.error(f"Exception in analysis job: {str(e)}")
         logger.error(error_details)
         
-        return jsonify({
-            'query': query if 'query' in locals() else "Unknown query",
-            'dataset': dataset_name if 'dataset_name' in locals() else "Unknown dataset",
+        return {
+            'query': query,
+            'dataset': dataset_name,
             'result': f"An unexpected error occurred: {str(e)}",
             'execution_time': "Error",
             'timestamp': datetime.now().strftime("%Y%m%d_%H%M%S"),
             'visualizations': [],
             'has_error': True,
             'error_details': error_details
-        }), 500
-
-def process_visualizations(timestamp):
-    """Process visualization files generated by the analysis"""
-    vis_paths = []
-    viz_files = [
-        'sales_by_category.png', 
-        'sales_by_month.png', 
-        'sales_by_region.png', 
-        'sales_by_year.png'
-    ]
-    
-    static_viz_dir = os.path.join(app.static_folder, 'visualizations')
-    
-    for viz_file in viz_files:
-        source_path = os.path.join(project_root, viz_file)
-        if os.path.exists(source_path):
-            logger.info(f"Found visualization: {viz_file}")
-            # Create a timestamped filename to avoid overwriting
-            file_name, file_ext = os.path.splitext(viz_file)
-            new_filename = f"{file_name}_{timestamp}{file_ext}"
-            dest_path = os.path.join(static_viz_dir, new_filename)
-            
-            # Copy the file to static directory
-            shutil.copy2(source_path, dest_path)
-            
-            # Add to visualization paths (using relative path for templates)
-            vis_paths.append(f"/static/visualizations/{new_filename}")
-    
-    return vis_paths
+        }
 
 @app.route('/history')
 def history():
-    """Return analysis history"""
-    return jsonify(analysis_history)
+    """Return a page of the analysis history, newest first
+    
+    Query parameters: limit, since (only entries newer than this id, for polling),
+    before (only entries older than this id, for paging), dataset and user
+    """
+    # Values that are not integers are ignored
+    limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+    since = request.args.get('since', type=int)
+    before = request.args.get('before', type=int)
+    return jsonify(history_store.page(limit=limit, since=since, before=before,
+                                      dataset_name=request.args.get('dataset'),
+                                      user=request.args.get('user')))
+
+@app.route('/artifacts/<name>')
+def artifact(name):
+    """Serve a chart or file produced by an analysis"""
+    path = analyst_service.artifact_store.get(name)
+    if path is None:
+        return jsonify({'error': f"Unknown or expired artifact '{name}'"}), 404
+    try:
+        response = send_file(os.path.abspath(path), etag=name.split('.')[0], conditional=True)
+    except FileNotFoundError:
+        # Evicted since the lookup
+        return jsonify({'error': f"Unknown or expired artifact '{name}'"}), 404
+    response.headers['Cache-Control'] = ARTIFACT_CACHE_CONTROL
+    return response
+
+@app.route('/tables/<name>')
+def table_page(name):
+    """Return rows of a result table that was too large to send whole
+    
+    Query parameters: offset (first row) and limit
+    """
+    path = analyst_service.artifact_store.get(name)
+    if path is None or not name.endswith('.arrow'):
+        return jsonify({'error': f"Unknown or expired table '{name}'"}), 404
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', TABLE_PAGE_SIZE, type=int), 1), TABLE_MAX_PAGE_SIZE)
+    try:
+        return jsonify(read_table_page(path, offset=offset, limit=limit))
+    except FileNotFoundError:
+        # Evicted since the lookup
+        return jsonify({'error': f"Unknown or expired table '{name}'"}), 404
+
+@app.route('/charts', methods=['POST'])
+def render_chart():
+    """Render a chart of a result table, or return it as a Vega-Lite spec"""
+    if analyst_service.chart_service is None:
+        return jsonify({'error': 'Chart rendering is disabled'}), 404
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or 'data' not in payload or not isinstance(payload.get('spec') or {}, dict):
+        return jsonify({'error': 'Expected a JSON body with "data" (the table) and "spec" (the chart)'}), 400
+    
+    try:
+        df = table_from_payload(payload['data'])
+        chart = analyst_service.chart_service.render(df, payload.get('spec') or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ImportError as e:
+        logger.error(f"Cannot render chart images: {str(e)}")
+        return jsonify({'error': 'Image rendering is unavailable on this server, request format "vega-lite"'}), 501
+    
+    if 'name' in chart:
+        chart['url'] = url_for('artifact', name=chart['name'])
+    return jsonify(chart)
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Return answer cache hit/miss statistics"""
+    return jsonify(analyst_service.cache_stats())
+
+@app.route('/cache/refresh', methods=['POST'])
+def refresh_cache():
+    """Queue a job re-running stored analysis code against the current data of a dataset"""
+    dataset_name = request.form.get('dataset')
+    datasets = analyst_service.list_datasets()
+    if not dataset_name and datasets:
+        dataset_name = datasets[0]
+    if dataset_name not in datasets:
+        return jsonify({'error': f"Dataset '{dataset_name}' not found"}), 404
+    
+    try:
+        # Replays run in pool sandboxes, so they share the analyses' workers and backpressure
+        job = job_queue.submit(analyst_service.refresh_cached_answers, dataset_name,
+                               metadata={'task': 'cache_refresh', 'dataset': dataset_name})
+    except QueueFullError as e:
+        logger.warning(f"Rejected cache refresh of '{dataset_name}': {str(e)}")
+        response = jsonify({'error': f"The server is busy: {str(e)}. Please try again shortly."})
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response, 503
+    
+    logger.info(f"Queued cache refresh of dataset '{dataset_name}' as job {job.id}")
+    return job_accepted(job)
 
 @app.route('/datasets')
 def list_datasets():
-    """Return available datasets"""
-    datasets = analyst_service.list_datasets()
-    return jsonify(datasets)
+    """Return available datasets and whether they are ready to be queried"""
+    return jsonify(analyst_service.dataset_status())
+
+@app.route('/datasets', methods=['POST'])
+def add_dataset():
+    """Load and profile a dataset from the data directory in the background"""
+    file_name = request.form.get('file')
+    if not file_name:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    # Only files inside the data directory can be added
+    data_dir = os.path.realpath(os.path.join(project_root, 'data'))
+    dataset_path = os.path.realpath(os.path.join(data_dir, file_name))
+    if os.path.dirname(dataset_path) != data_dir or not os.path.isfile(dataset_path):
+        return jsonify({'error': f"File '{file_name}' not found in the data directory"}), 404
+    
+    dataset_name = request.form.get('name') or os.path.splitext(os.path.basename(dataset_path))[0]
+    if not DATASET_NAME_PATTERN.fullmatch(dataset_name):
+        return jsonify({'error': f"Invalid dataset name '{dataset_name}': use only letters, digits and underscores"}), 400
+    # Relative to the project root, which is also the sandboxes' working directory
+    analyst_service.register_dataset(os.path.relpath(dataset_path, project_root), dataset_name)
+    logger.info(f"Registering dataset '{dataset_name}' from {dataset_path}")
+    status = next(status for status in analyst_service.dataset_status() if status['name'] == dataset_name)
+    return jsonify(status), 202
 
 @app.route('/test')
 def test():
@@ -173,5 +376,5 @@ if __name__ == '__main__':
     logger.info(f"Template folder: {app.template_folder}")
     logger.info(f"Static folder: {app.static_folder}")
     
-    # Run the app
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    # Run the app (without the reloader, which would start a second copy of the workers and sandboxes)
+    app.run(host='0.0.0.0', port=8080, debug=True, use_reloader=False, threaded=True)
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+Benchmark the startup cost of importing the application modules.
+
+Each module is imported in a fresh interpreter, several times, and the
+median wall time is reported together with the slowest imports from
+`python -X importtime`. It also reports whether importing the module pulled
+in the Docker SDK or started sandbox threads, which must only happen on
+first use.
+
+Usage (from the project root):
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --module src.crew.business_analyst_crew --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = [
+    "src.crew.business_analyst_crew",
+    "src.application.business_analyst_service",
+]
+
+# Runs in the child interpreter: import the module and report what it did
+PROBE = """
+import sys, threading, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+threads = sorted(t.name for t in threading.enumerate() if t is not threading.main_thread())
+print(f"RESULT {{elapsed}} {{'docker' in sys.modules}} {{','.join(threads) or '-'}}")
+"""
+
+
+def run_import(module, importtime=False):
+    """
+    Import a module in a new interpreter.
+
+    Returns:
+        tuple: (seconds, whether docker was imported, background thread names, importtime log)
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", PROBE.format(module=module)]
+    completed = subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, text=True)
+    result_lines = [line for line in completed.stdout.splitlines() if line.startswith("RESULT ")]
+    if completed.returncode != 0 or not result_lines:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    _, seconds, docker_imported, threads = result_lines[-1].split(" ", 3)
+    return float(seconds), docker_imported == "True", threads, completed.stderr
+
+
+def slowest_imports(importtime_log, top):
+    """Parse `-X importtime` output into the top (cumulative microseconds, module) pairs."""
+    entries = []
+    for line in importtime_log.splitlines():
+        # Lines look like "import time:  self [us] | cumulative | module", the first one is a header
+        parts = line[len("import time:"):].split("|") if line.startswith("import time:") else []
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        entries.append((int(parts[1]), parts[2].strip()))
+    # Only report top-level packages, not every submodule they import
+    top_level = {}
+    for cumulative_us, name in entries:
+        root = name.split(".")[0]
+        if cumulative_us > top_level.get(root, (0, ""))[0]:
+            top_level[root] = (cumulative_us, name)
+    return sorted(top_level.values(), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure module import time")
+    parser.add_argument("--module", action="append", help="Module to import (repeatable)")
+    parser.add_argument("--runs", type=int, default=5, help="Imports per module")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    for module in args.module or DEFAULT_MODULES:
+        timings = []
+        for _ in range(args.runs):
+            seconds, docker_imported, threads, _ = run_import(module)
+            timings.append(seconds)
+
+        print(f"\n{module}")
+        print(f"  median {statistics.median(timings):.3f}s, min {min(timings):.3f}s, "
+              f"max {max(timings):.3f}s over {args.runs} runs")
+        print(f"  docker imported: {'yes' if docker_imported else 'no'}")
+        print(f"  background threads: {threads}")
+
+        _, _, _, importtime_log = run_import(module, importtime=True)
+        print("  slowest imports (cumulative):")
+        for cumulative_us, name in slowest_imports(importtime_log, args.top):
+            print(f"    {cumulative_us / 1e6:7.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
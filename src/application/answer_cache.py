@@ -0,0 +1,96 @@
+"""
+Persistent cache of analysis answers.
+
+Answers are keyed by the normalized question, the dataset name, a content
+fingerprint of the dataset and a version of the prompts/configuration, so a
+cached answer is only reused while none of those have changed. Entries expire
+after a TTL and the least recently used ones are evicted beyond a size limit
+(see SQLiteCache).
+"""
+import hashlib
+import json
+import os
+import re
+
+from src.application.sqlite_cache import SQLiteCache
+
+
+def normalize_question(question):
+    """
+    Normalize a question so trivially different phrasings share a cache entry.
+
+    Args:
+        question (str): The user's question
+
+    Returns:
+        str: Lowercased question with collapsed whitespace and no trailing punctuation
+    """
+    normalized = re.sub(r"\s+", " ", question.strip().lower())
+    return normalized.rstrip("?!. ")
+
+
+class AnswerCache(SQLiteCache):
+    """SQLite-backed answer cache with TTL expiry and LRU eviction."""
+
+    table = "answers"
+    columns = (
+        "question TEXT NOT NULL",
+        "dataset_name TEXT NOT NULL",
+        "answer TEXT NOT NULL",
+        "outputs TEXT NOT NULL",
+    )
+
+    def __init__(self, path=os.path.join(".cache", "answers.sqlite"), ttl_seconds=86400, max_entries=1000):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path (str): SQLite database file
+            ttl_seconds (float): Age after which an entry is no longer served
+            max_entries (int): Entries kept before the least recently used are evicted
+        """
+        super().__init__(path, ttl_seconds, max_entries)
+
+    @staticmethod
+    def make_key(question, dataset_name, dataset_fingerprint, config_version):
+        """
+        Build the cache key for a question.
+
+        Args:
+            question (str): The user's question
+            dataset_name (str): Name of the dataset queried
+            dataset_fingerprint (str): Content hash of the dataset
+            config_version (str): Version of the prompts and configuration
+
+        Returns:
+            str: The cache key
+        """
+        parts = [normalize_question(question), dataset_name, dataset_fingerprint or "", config_version or ""]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, question, dataset_name, dataset_fingerprint, config_version):
+        """
+        Look up a cached answer.
+
+        Returns:
+            dict or None: answer and outputs (as passed to put()), None on a miss or expired entry
+        """
+        row = self._get(self.make_key(question, dataset_name, dataset_fingerprint, config_version),
+                        ("answer", "outputs"))
+        return {"answer": row[0], "outputs": json.loads(row[1])} if row is not None else None
+
+    def put(self, question, dataset_name, dataset_fingerprint, config_version, answer, outputs=None):
+        """
+        Store an answer, evicting the least recently used entries beyond max_entries.
+
+        Args:
+            question (str): The user's question
+            dataset_name (str): Name of the dataset queried
+            dataset_fingerprint (str): Content hash of the dataset
+            config_version (str): Version of the prompts and configuration
+            answer (str): The answer
+            outputs (list, optional): JSON-serializable outputs shown with the answer
+                                      (e.g. charts and tables), returned with it on a hit
+        """
+        self._put(self.make_key(question, dataset_name, dataset_fingerprint, config_version),
+                  question=question, dataset_name=dataset_name, answer=answer, outputs=json.dumps(outputs or []))
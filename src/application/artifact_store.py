@@ -0,0 +1,194 @@
+"""
+Content-addressed store for the files analyses produce, such as charts.
+
+Each file is stored under the SHA-256 hash of its content, so an identical
+chart produced by another analysis is kept once, and its name never refers
+to different content, which lets clients cache it indefinitely. Files are
+evicted least recently used first (by modification time, which is updated
+whenever a file is stored again or served) once the store grows beyond a
+size budget.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+# <sha256 hex digest><lowercase extension>, e.g. 9f86d08...0a08.png
+ARTIFACT_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{1,8})?$")
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Compute the SHA-256 digest of a file's content.
+
+    Args:
+        path (str): File to hash
+        chunk_size (int): Bytes read at a time
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Directory of files named by content hash, with LRU eviction beyond a size budget."""
+
+    def __init__(self, path=os.path.join(".cache", "artifacts"), max_bytes=200 * 1024 * 1024):
+        """
+        Open (or create) the store.
+
+        Args:
+            path (str): Directory holding the artifacts
+            max_bytes (int): Total size kept before the least recently used artifacts are evicted
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stored = 0
+        self.deduplicated = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """(name, size, mtime) of every stored artifact."""
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.is_file() and ARTIFACT_NAME_PATTERN.match(entry.name):
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_size, stat.st_mtime))
+        return entries
+
+    @staticmethod
+    def _artifact_name(digest, extension):
+        """Artifact name of content with the given digest and file extension."""
+        extension = extension.lower()
+        return digest + (extension if re.fullmatch(r"\.[a-z0-9]{1,8}", extension) else "")
+
+    def _store(self, name, write):
+        """
+        Store content under a name unless it is already stored.
+
+        Args:
+            name (str): Artifact name
+            write (callable): Called with a binary file object to write the content to
+        """
+        destination = os.path.join(self.path, name)
+        with self._lock:
+            if os.path.exists(destination):
+                # Same content as a stored artifact: only mark it as recently used
+                os.utime(destination)
+                self.deduplicated += 1
+                return
+
+            # Write under a temporary name first, so readers never see a partial file
+            fd, temporary = tempfile.mkstemp(dir=self.path, prefix=".incoming-")
+            try:
+                with os.fdopen(fd, "wb") as target:
+                    write(target)
+                os.replace(temporary, destination)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+            self._size += os.path.getsize(destination)
+            self.stored += 1
+            if self._size > self.max_bytes:
+                self._evict(keep=name)
+
+    def put(self, source_path):
+        """
+        Store a copy of a file.
+
+        Args:
+            source_path (str): File to store
+
+        Returns:
+            str: Name of the artifact, the content hash plus the file's extension
+        """
+        name = self._artifact_name(file_digest(source_path), os.path.splitext(source_path)[1])
+
+        def write(target):
+            with open(source_path, "rb") as source:
+                shutil.copyfileobj(source, target)
+
+        self._store(name, write)
+        return name
+
+    def put_bytes(self, content, extension):
+        """
+        Store content held in memory, e.g. a rendered chart.
+
+        Args:
+            content (bytes): The content
+            extension (str): File extension, e.g. ".png"
+
+        Returns:
+            str: Name of the artifact
+        """
+        name = self._artifact_name(hashlib.sha256(content).hexdigest(), extension)
+        self._store(name, lambda target: target.write(content))
+        return name
+
+    def get(self, name):
+        """
+        Get the path of a stored artifact and mark it as recently used.
+
+        Args:
+            name (str): Artifact name as returned by put()
+
+        Returns:
+            str or None: Path of the file, None if the name is invalid or was evicted
+        """
+        if not ARTIFACT_NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.path, name)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def _evict(self, keep=None):
+        """Remove the least recently used artifacts until the store is within its budget."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        for name, size, _ in entries:
+            if self._size <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            try:
+                os.unlink(os.path.join(self.path, name))
+            except OSError:
+                continue
+            self._size -= size
+            self.evicted += 1
+
+    def gc(self):
+        """Evict least recently used artifacts beyond the size budget."""
+        with self._lock:
+            self._evict()
+
+    def stats(self):
+        """
+        Get store statistics.
+
+        Returns:
+            dict: Artifacts and bytes stored, and counts of stored, deduplicated and evicted files
+        """
+        with self._lock:
+            return {
+                "artifacts": len(self._entries()),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "stored": self.stored,
+                "deduplicated": self.deduplicated,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,139 @@
+"""
+Batch mode: answer a file of questions concurrently.
+
+Questions are read from a JSONL file and analyzed by a fixed number of worker
+threads sharing one BusinessAnalystService, so they share the loaded
+datasets, the answer, semantic and code caches and the crew configuration.
+Each analysis leases its own sandbox from the pool for as long as it runs,
+so a worker holds one sandbox at a time. Results are appended to a JSONL file
+as soon as each question finishes, so a long batch can be followed (or
+salvaged) while it runs.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("BatchRunner")
+
+# analyze_query() reports failures as answers starting with these
+ERROR_PREFIXES = ("Error:", "Analysis failed")
+
+
+def read_questions(path):
+    """
+    Read batch questions from a JSONL file.
+
+    Each line is either a JSON object with a "question" and optionally an
+    "id" and a "dataset", or a bare JSON string. Blank lines and lines
+    starting with # are skipped.
+
+    Args:
+        path (str): Path to the questions file
+
+    Returns:
+        list: Dicts with id, question and dataset (None for the default)
+
+    Raises:
+        ValueError: If a line is not valid JSON or has no question
+    """
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}")
+            if isinstance(item, str):
+                item = {"question": item}
+            if not isinstance(item, dict) or not str(item.get("question", "")).strip():
+                raise ValueError(f"{path}:{line_number}: expected a question")
+            questions.append({
+                "id": item.get("id", len(questions) + 1),
+                "question": item["question"].strip(),
+                "dataset": item.get("dataset"),
+            })
+    return questions
+
+
+def _answer(service, item, dataset_name):
+    """
+    Answer one question, timing it and each stage of its analysis.
+
+    Returns:
+        dict: The result record written to the output file
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    stages = []
+
+    def progress(event_type, data):
+        if event_type == "stage":
+            stages.append((data["stage"], time.perf_counter()))
+
+    answer = service.analyze_query(item["question"], item["dataset"] or dataset_name, progress=progress)
+    end = time.perf_counter()
+
+    # Each stage lasts until the next one starts, the last one until the answer
+    stage_seconds = {}
+    for (stage, stage_start), (_, stage_end) in zip(stages, stages[1:] + [(None, end)]):
+        stage_seconds[stage] = round(stage_end - stage_start, 3)
+
+    failed = answer is None or str(answer).startswith(ERROR_PREFIXES)
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        "dataset": item["dataset"] or dataset_name,
+        "status": "failed" if failed else "succeeded",
+        "answer": answer,
+        "started_at": started_at,
+        "seconds": round(end - start, 3),
+        "stages": stage_seconds,
+    }
+
+
+def run_batch(service, questions, output_path, concurrency=4, dataset_name=None):
+    """
+    Answer questions concurrently and write the results as JSONL.
+
+    Args:
+        service (BusinessAnalystService): Service shared by all workers
+        questions (list): Question dicts from read_questions()
+        output_path (str): JSONL file the results are appended to, one line per question
+        concurrency (int): Questions analyzed at the same time
+        dataset_name (str, optional): Dataset for questions that don't name one.
+                                      If None, the service's first dataset is used.
+
+    Returns:
+        dict: Number of questions, succeeded and failed, and the total wall time
+    """
+    write_lock = threading.Lock()
+    summary = {"questions": len(questions), "succeeded": 0, "failed": 0}
+    batch_start = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        def work(item):
+            try:
+                record = _answer(service, item, dataset_name)
+            except Exception as e:
+                logger.error(f"Question {item['id']} failed: {str(e)}")
+                record = {"id": item["id"], "question": item["question"], "dataset": item["dataset"] or dataset_name,
+                          "status": "failed", "answer": f"Error: {str(e)}"}
+            with write_lock:
+                output.write(json.dumps(record, default=str) + "\n")
+                output.flush()
+                summary[record["status"]] += 1
+                done = summary["succeeded"] + summary["failed"]
+                logger.info(f"[{done}/{len(questions)}] Question {record['id']} {record['status']} "
+                            f"in {record.get('seconds', 0):.1f}s")
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-worker") as executor:
+            # Consume the results so worker exceptions aren't silently dropped
+            list(executor.map(work, questions))
+
+    summary["seconds"] = round(time.perf_counter() - batch_start, 3)
+    return summary
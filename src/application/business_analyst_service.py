@@ -3,12 +3,24 @@ Service layer for business data analysis.
 Coordinates data loading, schema management, and analysis execution.
 """
 import os
+import re
 import sys
+import threading
+import time
 import traceback
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from src.application.answer_cache import AnswerCache
+from src.application.artifact_store import ArtifactStore
+from src.application.chart_service import ChartService
+from src.application.code_cache import CodeCache
+from src.application.dataset_catalog import DatasetCatalog
+from src.application.semantic_cache import SemanticCache, create_embedder
+from src.core.config_loader import ConfigLoader
 from src.core.data_manager import DataManager
 from src.core.schema_registry import SchemaRegistry
-from src.crew.business_analyst_crew import BusinessAnalystCrew
+from src.crew.business_analyst_crew import BusinessAnalystCrew, crew_factory
+from src.crew.models import QueryInterpretation
 
 # Configure logging
 logging.basicConfig(
@@ -18,93 +30,576 @@ logging.basicConfig(
 )
 logger = logging.getLogger("BusinessAnalystService")
 
+# Input for the analysis task when the interpreter runs in the same crew
+INTERPRETATION_FROM_CONTEXT = "See the query interpreter's analysis provided as context."
+
+# Code output quoted in the message of a failed analysis at most
+ERROR_OUTPUT_CHARS = 2000
+
+# Text columns with at most this many distinct values name filters in questions (e.g. regions)
+VOCABULARY_MAX_DISTINCT = 500
+
+# Dataset registration states, see dataset_status()
+LOADING = "loading"
+PROFILING = "profiling"
+READY = "ready"
+FAILED = "failed"
+
 class BusinessAnalystService:
     """Service for handling business data analysis"""
     
-    def __init__(self):
-        """Initialize with core components"""
-        self.data_manager = DataManager()
-        self.schema_registry = SchemaRegistry()
+    def __init__(self, data_manager=None, schema_registry=None):
+        """
+        Initialize with core components
+
+        Args:
+            data_manager (DataManager, optional): Data manager with datasets already loaded,
+                                                  e.g. by the CLI. If None, a new one loads
+                                                  the default dataset.
+            schema_registry (SchemaRegistry, optional): Registry of the loaded datasets' schemas
+        """
+        self.system_config = ConfigLoader().get_config("system")
+        load_default_dataset = data_manager is None
+        self.data_manager = data_manager or DataManager()
+        self.schema_registry = schema_registry or SchemaRegistry()
+        
+        # Cache answers per question, dataset content and prompt/config version
+        cache_config = self.system_config.get("answer_cache", {})
+        self.answer_cache = None
+        if cache_config.get("enabled", True):
+            self.answer_cache = AnswerCache(
+                path=cache_config.get("path", os.path.join(".cache", "answers.sqlite")),
+                ttl_seconds=cache_config.get("ttl_seconds", 86400),
+                max_entries=cache_config.get("max_entries", 1000)
+            )
+        
+        # Reuse interpretations of earlier, differently phrased versions of a question
+        semantic_config = self.system_config.get("semantic_cache", {})
+        self.semantic_cache = None
+        if semantic_config.get("enabled", True):
+            self.semantic_cache = SemanticCache(
+                create_embedder(semantic_config.get("embedder", {})),
+                path=semantic_config.get("path", os.path.join(".cache", "semantic.sqlite")),
+                similarity_threshold=semantic_config.get("similarity_threshold", 0.9),
+                ttl_seconds=semantic_config.get("ttl_seconds", 7 * 86400),
+                max_entries=semantic_config.get("max_entries", 5000)
+            )
+        
+        # Replay the code that answered an earlier question with the same interpretation
+        code_config = self.system_config.get("code_cache", {})
+        self.code_cache = None
+        if code_config.get("enabled", True):
+            self.code_cache = CodeCache(
+                path=code_config.get("path", os.path.join(".cache", "code.sqlite")),
+                ttl_seconds=code_config.get("ttl_seconds", 30 * 86400),
+                max_entries=code_config.get("max_entries", 1000)
+            )
+        
+        # Charts and files produced by analyses, stored by content hash
+        artifacts_config = self.system_config.get("artifacts", {})
+        self.artifact_store = ArtifactStore(
+            path=artifacts_config.get("path", os.path.join(".cache", "artifacts")),
+            max_bytes=artifacts_config.get("max_bytes", 200 * 1024 * 1024)
+        )
+        
+        # Charts of result tables rendered on the host, cached by data and spec
+        charts_config = self.system_config.get("charts", {})
+        self.chart_service = None
+        if charts_config.get("enabled", True):
+            self.chart_service = ChartService.from_config(self.artifact_store, charts_config)
         
-        # Load default dataset if available
-        self._initialize_default_dataset()
+        # Rank columns of wide tables by meaning too, sharing the semantic cache's model
+        if self.semantic_cache is not None and self.schema_registry.ranker.embedder is None:
+            self.schema_registry.ranker.embedder = self.semantic_cache.embedder
+        
+        # (dataset name, fingerprint) -> lowercase values of its categorical columns
+        self._vocabularies = {}
+        
+        # Datasets are loaded and profiled in the background, so startup and queries don't wait
+        self._registrations = {}
+        self._registration_futures = {}
+        self._registration_lock = threading.Lock()
+        self._registration_executor = ThreadPoolExecutor(
+            max_workers=self.system_config.get("data", {}).get("registration_workers", 2),
+            thread_name_prefix="dataset-registration"
+        )
+        
+        # Keep the datasets in sync with the files in the data directory
+        watch_config = self.system_config.get("data", {}).get("watch", {})
+        self.catalog = None
+        if load_default_dataset and watch_config.get("enabled", True):
+            self.catalog = DatasetCatalog(
+                watch_config.get("directory", "data"),
+                register=self.register_dataset,
+                unregister=self.remove_dataset,
+                interval_seconds=watch_config.get("interval_seconds", 10)
+            )
+            self.catalog.start()
+        elif load_default_dataset:
+            # Load default dataset if available
+            self._initialize_default_dataset()
+    
+    @property
+    def config_version(self):
+        """Version of the prompts and LLM settings the crews currently use"""
+        crew_factory.refresh()
+        return crew_factory.config_version
     
     def _initialize_default_dataset(self):
         """Initialize the default dataset if available"""
         default_dataset_path = os.path.join("data", "superstore.csv")
         if os.path.exists(default_dataset_path):
-            self.data_manager.load_dataset(default_dataset_path)
+            self.register_dataset(default_dataset_path)
     
     def list_datasets(self):
         """Get list of available datasets"""
         return self.data_manager.list_datasets()
     
     def load_dataset(self, dataset_path):
-        """Load a new dataset"""
-        return self.data_manager.load_dataset(dataset_path)
+        """Load a new dataset and register its schema, waiting until it is ready"""
+        try:
+            return self.register_dataset(dataset_path).result()
+        except Exception:
+            return None
+    
+    def remove_dataset(self, dataset_name):
+        """Forget a dataset and its schema, e.g. after its file was deleted"""
+        with self._registration_lock:
+            self._registrations.pop(dataset_name, None)
+            self._registration_futures.pop(dataset_name, None)
+        self.data_manager.remove_dataset(dataset_name)
+        self.schema_registry.remove_schema(dataset_name)
+    
+    def _set_registration(self, dataset_name, **fields):
+        """Update the registration status of a dataset."""
+        with self._registration_lock:
+            self._registrations.setdefault(dataset_name, {"name": dataset_name}).update(fields)
+    
+    def register_dataset(self, dataset_path, dataset_name=None):
+        """
+        Load a dataset and profile its schema in the background.
+        
+        CSV files of at least data.streaming.min_file_mb are ingested into the
+        partitioned store instead of being loaded into memory.
+        
+        Args:
+            dataset_path (str): Path to the dataset file
+            dataset_name (str, optional): Name to refer to the dataset.
+                                          If None, uses filename as name.
+            
+        Returns:
+            concurrent.futures.Future: Resolves to the loaded DataFrame (or LazyDataset
+                                       for ingested files) once the dataset is ready
+        """
+        if dataset_name is None:
+            dataset_name = os.path.splitext(os.path.basename(dataset_path))[0]
+        
+        with self._registration_lock:
+            future = self._registration_futures.get(dataset_name)
+            if future is not None and not future.done():
+                return future
+            self._registrations[dataset_name] = {
+                "name": dataset_name, "path": dataset_path, "status": LOADING, "queued_at": time.time()
+            }
+            future = self._registration_executor.submit(self._register, dataset_path, dataset_name)
+            self._registration_futures[dataset_name] = future
+        return future
     
-    def analyze_query(self, query, dataset_name=None):
+    def _register(self, dataset_path, dataset_name):
+        """Load a dataset, then profile and register its schema."""
+        start = time.time()
+        if self.data_manager.should_stream(dataset_path):
+            return self._register_lazy(dataset_path, dataset_name, start)
+        try:
+            df = self.data_manager.load_dataset(dataset_path, dataset_name)
+            if df is None:
+                raise ValueError(f"Could not load dataset from {dataset_path}")
+            
+            self._set_registration(dataset_name, status=PROFILING, rows=len(df), columns=len(df.columns))
+            self.schema_registry.register_schema(
+                dataset_name, df, fingerprint=self.data_manager.get_fingerprint(dataset_name)
+            )
+        except Exception as e:
+            logger.error(f"Registration of dataset '{dataset_name}' failed: {str(e)}")
+            self._set_registration(dataset_name, status=FAILED, error=str(e), seconds=round(time.time() - start, 3))
+            raise
+        
+        self._set_registration(dataset_name, status=READY, seconds=round(time.time() - start, 3))
+        logger.info(f"Dataset '{dataset_name}' is ready ({time.time() - start:.2f}s)")
+        return df
+    
+    def _register_lazy(self, dataset_path, dataset_name, start):
+        """Stream a file too large to load into the partitioned store, then register its schema from a sample."""
+        logger.info(f"Dataset file {dataset_path} is too large to load at once, ingesting it in chunks")
+        try:
+            lazy_dataset = self.data_manager.ingest_dataset(dataset_path, dataset_name)
+            if lazy_dataset is None:
+                raise ValueError(f"Could not ingest dataset from {dataset_path}")
+            
+            row_count = lazy_dataset.count_rows()
+            self._set_registration(dataset_name, status=PROFILING, rows=row_count, columns=len(lazy_dataset.columns))
+            self.schema_registry.register_schema(
+                dataset_name, lazy_dataset.head(100), row_count=row_count,
+                access_note=self.data_manager.get_load_instructions(dataset_name),
+                fingerprint=self.data_manager.get_fingerprint(dataset_name)
+            )
+        except Exception as e:
+            logger.error(f"Registration of dataset '{dataset_name}' failed: {str(e)}")
+            self._set_registration(dataset_name, status=FAILED, error=str(e), seconds=round(time.time() - start, 3))
+            raise
+        
+        self._set_registration(dataset_name, status=READY, seconds=round(time.time() - start, 3))
+        logger.info(f"Dataset '{dataset_name}' is ready ({time.time() - start:.2f}s)")
+        return lazy_dataset
+    
+    def dataset_status(self):
+        """
+        Get the registration status of every dataset.
+        
+        Returns:
+            list: Dicts with name, path, status (loading, profiling, ready or failed)
+                  and, once known, rows, columns, seconds taken and error
+        """
+        with self._registration_lock:
+            statuses = [dict(status) for status in self._registrations.values()]
+        # Datasets loaded directly on the data manager, e.g. by the CLI
+        known = {status["name"] for status in statuses}
+        for name in self.data_manager.list_datasets():
+            if name not in known:
+                statuses.append({"name": name, "status": READY if self.schema_registry.get_schema(name) else LOADING})
+        return statuses
+    
+    def _wait_for_registration(self, dataset_name, progress=None):
+        """
+        Wait until a dataset being registered is ready (all pending ones if None).
+        
+        Raises:
+            ValueError: If the registration failed
+        """
+        with self._registration_lock:
+            if dataset_name is None:
+                futures = dict(self._registration_futures)
+            else:
+                futures = {name: future for name, future in self._registration_futures.items() if name == dataset_name}
+        for name, future in futures.items():
+            if not future.done():
+                self._report_stage(progress, "waiting", f"Waiting for dataset '{name}' to finish loading")
+            try:
+                future.result()
+            except Exception as e:
+                if dataset_name is not None:
+                    raise ValueError(f"Dataset '{name}' could not be loaded: {str(e)}")
+    
+    def cache_stats(self):
+        """Get answer, semantic, code and chart render cache hit/miss statistics, and artifact store usage"""
+        stats = {}
+        caches = (
+            ("answer_cache", self.answer_cache),
+            ("semantic_cache", self.semantic_cache),
+            ("code_cache", self.code_cache),
+        )
+        for name, cache in caches:
+            stats[name] = {"enabled": False} if cache is None else dict(cache.stats(), enabled=True)
+        stats["artifact_store"] = self.artifact_store.stats()
+        stats["chart_renders"] = {"enabled": False} if self.chart_service is None else dict(
+            self.chart_service.stats(), enabled=True)
+        return stats
+    
+    def _interpret(self, crew, inputs):
+        """
+        Run the query interpreter on its own.
+        
+        Returns:
+            str: The structured interpretation as JSON, or the raw text if it
+                 could not be parsed into a QueryInterpretation
+        """
+        result = crew.interpretation_crew().kickoff(inputs=inputs)
+        output = result.tasks_output[0]
+        if output.pydantic is not None:
+            return output.pydantic.model_dump_json(indent=2)
+        return output.raw
+    
+    def _value_vocabulary(self, dataset_name, dataset_fingerprint):
+        """
+        Column names and values of categorical text columns of a dataset, lowercased,
+        for matching the constraints of similar questions (see semantic_cache.question_constraints()).
+        """
+        key = (dataset_name, dataset_fingerprint)
+        if key not in self._vocabularies:
+            vocabulary = set()
+            df = self.data_manager.get_dataset(dataset_name)
+            lazy_dataset = self.data_manager.get_lazy_dataset(dataset_name)
+            columns = df.columns if df is not None else lazy_dataset.columns if lazy_dataset is not None else []
+            vocabulary.update(" ".join(re.findall(r"[a-z0-9]+", str(column).lower())) for column in columns)
+            if df is not None:
+                for column in df.columns:
+                    if df[column].dtype == object or str(df[column].dtype) == "category":
+                        values = df[column].dropna().unique()
+                        if len(values) <= VOCABULARY_MAX_DISTINCT:
+                            vocabulary.update(str(value).lower() for value in values)
+            self._vocabularies = {k: v for k, v in self._vocabularies.items() if k[0] != dataset_name}
+            self._vocabularies[key] = vocabulary
+        return self._vocabularies[key]
+    
+    def _interpretation_key(self, interpretation):
+        """Canonical key of a structured interpretation, None for free-form text."""
+        try:
+            return QueryInterpretation.model_validate_json(interpretation).cache_key()
+        except ValueError:
+            return None
+    
+    def _replay_cached_code(self, crew, interpretation_key, dataset_name, schema_fingerprint):
+        """
+        Replay the stored steps of an interpreted question in the crew's sandbox.
+        
+        Returns:
+            str or None: The answer, None if nothing is stored or the replay failed
+        """
+        if self.code_cache is None or interpretation_key is None:
+            return None
+        entry = self.code_cache.get(interpretation_key, dataset_name, schema_fingerprint)
+        if entry is None:
+            return None
+        
+        logger.info(f"Replaying stored code of question '{entry['question']}'")
+        try:
+            outputs = crew.replay(entry["steps"])
+        except Exception as e:
+            # The data changed in a way the code doesn't handle; let the agent write new code
+            logger.warning(f"Replay of stored code failed, falling back to the analysis agent: {str(e)}")
+            self.code_cache.remove(entry["key"])
+            return None
+        return self._format_replay(entry, outputs)
+    
+    def _format_replay(self, entry, outputs):
+        """Format replayed steps and their outputs as an answer."""
+        sections = [f"Results of the stored analysis for '{entry['question']}', run on the current data."]
+        for step, output in zip(entry["steps"], outputs):
+            if step["tool"] == "sql":
+                sections.append(f"SQL:\n```sql\n{step['query']}\n```")
+            elif step["tool"] == "chart":
+                sections.append(f"{step['spec']['type'].capitalize()} chart of:\n```sql\n{step['query']}\n```")
+                continue
+            else:
+                sections.append(f"Code:\n```python\n{step['code']}\n```")
+            sections.append(f"Output:\n```\n{output.strip()}\n```")
+        return "\n\n".join(sections)
+    
+    def refresh_cached_answers(self, dataset_name):
+        """
+        Re-run the stored code of every cached question against the current
+        version of a dataset, e.g. after it was reloaded from an updated file,
+        and cache the new answers.
+        
+        Args:
+            dataset_name (str): Name of the refreshed dataset
+            
+        Returns:
+            dict: Number of questions refreshed and failed
+        """
+        refreshed = failed = 0
+        if self.code_cache is None:
+            return {"refreshed": refreshed, "failed": failed}
+        
+        dataset_fingerprint = self.data_manager.get_fingerprint(dataset_name)
+        schema_fingerprint = self.data_manager.get_schema_fingerprint(dataset_name)
+        for entry in self.code_cache.entries(dataset_name, schema_fingerprint):
+            crew = BusinessAnalystCrew(data_manager=self.data_manager, chart_service=self.chart_service)
+            try:
+                answer = self._format_replay(entry, crew.replay(entry["steps"]))
+                outputs = self._store_outputs(crew)
+            except Exception as e:
+                logger.warning(f"Could not refresh answer to '{entry['question']}': {str(e)}")
+                failed += 1
+                continue
+            finally:
+                crew.close()
+            
+            if self.answer_cache is not None:
+                self.answer_cache.put(entry["question"], dataset_name, dataset_fingerprint, self.config_version, answer,
+                                      outputs)
+            refreshed += 1
+        
+        logger.info(f"Refreshed {refreshed} cached answers for dataset '{dataset_name}' ({failed} failed)")
+        return {"refreshed": refreshed, "failed": failed}
+    
+    def _store_outputs(self, crew, progress=None):
+        """
+        Move the files an analysis produced into the artifact store and report
+        them and its result tables.
+        
+        Args:
+            crew (BusinessAnalystCrew): The crew that ran the analysis
+            progress: Optional callback, called as progress("artifact", {"name": ...})
+                      for every stored file and progress("table", table) for every
+                      result table; a table whose complete rows were stored as an
+                      Arrow file names it as "artifact"
+            
+        Returns:
+            list: The reported (event type, data) pairs, to be re-reported with
+                  _report_outputs() when the answer is served from the cache
+        """
+        stored, outputs = {}, []
+        table_files = {table.get("file") for table in crew.tables}
+        for path in crew.artifacts:
+            try:
+                stored[path] = self.artifact_store.put(path)
+            except OSError as e:
+                logger.warning(f"Could not store output file {path}: {str(e)}")
+                continue
+            if path not in table_files:
+                outputs.append(("artifact", {"name": stored[path]}))
+        
+        for table in crew.tables:
+            table = dict(table)
+            path = table.pop("file", None)
+            if stored.get(path):
+                table["artifact"] = stored[path]
+            outputs.append(("table", table))
+        self._report_outputs(outputs, progress)
+        return outputs
+    
+    def _outputs_available(self, outputs):
+        """Return True if every artifact that outputs of _store_outputs() name is still stored."""
+        names = [data["name"] if event_type == "artifact" else data.get("artifact") for event_type, data in outputs]
+        return all(self.artifact_store.get(name) is not None for name in names if name)
+    
+    @staticmethod
+    def _report_outputs(outputs, progress=None):
+        """Report (event type, data) pairs as returned by _store_outputs() to the progress callback."""
+        if progress is not None:
+            for event_type, data in outputs:
+                progress(event_type, data)
+    
+    @staticmethod
+    def _report_stage(progress, stage, message):
+        """Tell the progress callback, if any, which stage the analysis is in."""
+        if progress is not None:
+            progress("stage", {"stage": stage, "message": message})
+    
+    def analyze_query(self, query, dataset_name=None, progress=None):
         """
         Analyze a business query using the specified dataset
         
         Args:
             query: The natural language query to analyze
             dataset_name: Name of the dataset to use (uses first available if None)
+            progress: Optional callback, called as progress(event_type, data) with the
+                      stages, agent steps, streamed LLM tokens, stored artifacts
+                      (charts and files) and result tables of the analysis
             
         Returns:
             Analysis results or error message
         """
         try:
+            # Datasets added moments ago may still be loading and profiling
+            self._wait_for_registration(dataset_name, progress)
+            
             # Get available datasets
             datasets = self.data_manager.list_datasets()
             if not datasets:
                 raise ValueError("No datasets available. Please load a dataset first.")
             
-            # Use specified dataset or default to first available
+            # Use specified dataset or default to the configured one, or the first available
             if dataset_name is None:
-                dataset_name = datasets[0]
+                default_dataset = self.system_config.get("data", {}).get("default_dataset")
+                dataset_name = default_dataset if default_dataset in datasets else datasets[0]
             elif dataset_name not in datasets:
                 raise ValueError(f"Dataset '{dataset_name}' not found")
             
+            # Serve repeated questions on unchanged data from the answer cache
+            dataset_fingerprint = self.data_manager.get_fingerprint(dataset_name)
+            if self.answer_cache is not None:
+                cached = self.answer_cache.get(query, dataset_name, dataset_fingerprint, self.config_version)
+                # Answers whose charts or tables were evicted from the artifact store are recomputed
+                if cached is not None and self._outputs_available(cached["outputs"]):
+                    logger.info(f"Answer cache hit for query: '{query}'")
+                    self._report_stage(progress, "cached", "Answered from the cache")
+                    self._report_outputs(cached["outputs"], progress)
+                    return cached["answer"]
+            
             # Get dataset and schema
             df = self.data_manager.get_dataset(dataset_name)
-            schema_info = self.schema_registry.format_schema_for_llm(dataset_name)
+            schema_info = self.schema_registry.format_schema_for_llm(dataset_name, question=query)
+            
+            # A semantically equivalent earlier question lets us skip the interpreter
+            similar = None
+            if self.semantic_cache is not None:
+                vocabulary = self._value_vocabulary(dataset_name, dataset_fingerprint)
+                similar = self.semantic_cache.lookup(query, dataset_name, dataset_fingerprint, vocabulary)
             
             # Run the analysis using CrewAI
+            crew = BusinessAnalystCrew(data_manager=self.data_manager, progress=progress,
+                                       schema_registry=self.schema_registry, chart_service=self.chart_service)
             try:
-                crew = BusinessAnalystCrew()
-                result = crew.crew().kickoff(inputs={
+                inputs = {
                     "question": query, 
                     "dataset_name": dataset_name, 
-                    "schema_info": schema_info
-                })
+                    "schema_info": schema_info,
+                    "data_access": self.data_manager.get_load_instructions(dataset_name)
+                }
+                if similar is not None:
+                    logger.info(f"Reusing interpretation of similar question '{similar['question']}' "
+                                f"(similarity {similar['similarity']:.2f})")
+                    interpretation = similar["interpretation"]
+                    self._report_stage(progress, "interpreted",
+                                       f"Reusing the interpretation of '{similar['question']}'")
+                else:
+                    self._report_stage(progress, "interpreting", "Interpreting the question")
+                    interpretation = self._interpret(crew, inputs)
+                    if self.semantic_cache is not None and interpretation:
+                        self.semantic_cache.add(query, dataset_name, dataset_fingerprint, interpretation, vocabulary)
+                inputs["interpretation"] = interpretation
+                
+                # Questions with a known interpretation replay their stored code without the LLM
+                interpretation_key = self._interpretation_key(interpretation)
+                schema_fingerprint = self.data_manager.get_schema_fingerprint(dataset_name)
+                answer = self._replay_cached_code(crew, interpretation_key, dataset_name, schema_fingerprint)
+                if answer is not None:
+                    self._report_stage(progress, "replayed", "Re-ran the stored code of a matching question")
+                    outputs = self._store_outputs(crew, progress)
+                    # Only answers to the question's own interpretation are cached
+                    if self.answer_cache is not None and similar is None:
+                        self.answer_cache.put(query, dataset_name, dataset_fingerprint, self.config_version, answer,
+                                              outputs)
+                    return answer
+                
+                self._report_stage(progress, "analyzing", "Writing and running the analysis")
+                result = crew.analysis_crew().kickoff(inputs=inputs)
                 logger.info(f"Result type: {type(result)}\nAnalysis result: {result}")
                 # Check if result is empty or None, which indicates an LLM failure
                 if result is None or result == "":
                     return "Analysis failed: The AI model couldn't generate a response. This might be due to complexity of the query or a temporary issue with the AI service. Please try again with a simpler query or try later."
                 
+                outputs = self._store_outputs(crew, progress)
+                # Answers built on another question's interpretation are not cached, so a
+                # wrongly reused interpretation doesn't outlive this analysis
+                if self.answer_cache is not None and result.raw and similar is None:
+                    self.answer_cache.put(query, dataset_name, dataset_fingerprint, self.config_version, result.raw,
+                                          outputs)
+                if self.code_cache is not None and interpretation_key and crew.executed_steps and similar is None:
+                    self.code_cache.put(interpretation_key, dataset_name, schema_fingerprint, query, crew.executed_steps)
                 return result.raw
             except Exception as crew_error:
                 error_details = traceback.format_exc()
                 print(f"Error in CrewAI execution: {str(crew_error)}")
                 print(error_details)
                 
-                # Provide a more helpful error message with details from the code execution
-                # Find any Python output from the code execution in the error traceback
-                python_output = None
-                for line in error_details.split('\n'):
-                    if "Tool Output:" in line:
-                        python_output = line.split("Tool Output:", 1)[1].strip()
-                        break
+                # Provide a more helpful error message with the output of the last code execution
+                python_output = (crew.code_interpreter.last_output or "").strip()
                 
                 error_message = f"Analysis failed: Error in AI model execution.\n\n"
                 
                 if python_output:
+                    if len(python_output) > ERROR_OUTPUT_CHARS:
+                        python_output = python_output[:ERROR_OUTPUT_CHARS] + "\n..."
                     error_message += f"The code generated did run and produced this output:\n{python_output}\n\n"
                 
                 error_message += "However, the AI couldn't complete the analysis after examining the data. Please try a different or simpler query."
                 
                 return error_message
+            finally:
+                crew.close()
                 
         except Exception as e:
             print(f"Error in business analysis service: {str(e)}")
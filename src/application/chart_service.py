@@ -0,0 +1,132 @@
+"""
+Chart rendering on the host, for result tables such as group-by outputs.
+
+Charts are drawn from the table and a small spec instead of by plotting code
+running in the sandbox. Image renders are stored in the artifact store and
+remembered by the hash of their data and spec, so a chart that was drawn
+before is served without rendering it again. Vega-Lite specs are returned
+as JSON, for the browser to render.
+"""
+import threading
+from collections import OrderedDict
+
+from src.core.chart_renderer import normalize_spec, render_image, render_key, to_vega_lite
+
+
+class ChartService:
+    """Renders charts of result tables, caching the renders."""
+
+    def __init__(self, artifact_store, max_rows=5000, max_entries=1000, width=8, height=5, dpi=100):
+        """
+        Args:
+            artifact_store (ArtifactStore): Where rendered images are stored
+            max_rows (int): Largest table that is charted
+            max_entries (int): Renders remembered before the least recently used are forgotten
+            width (float): Figure width in inches
+            height (float): Figure height in inches
+            dpi (int): Resolution of PNG renders
+        """
+        self.artifact_store = artifact_store
+        self.max_rows = max_rows
+        self.max_entries = max_entries
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.hits = 0
+        self.misses = 0
+        # Render key -> artifact name, least recently used first
+        self._renders = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, artifact_store, charts_config):
+        """
+        Create a chart service from the charts section of the system configuration.
+
+        Args:
+            artifact_store (ArtifactStore): Where rendered images are stored
+            charts_config (dict): Chart settings
+
+        Returns:
+            ChartService: The service
+        """
+        return cls(
+            artifact_store,
+            max_rows=charts_config.get("max_rows", 5000),
+            max_entries=charts_config.get("cache_entries", 1000),
+            width=charts_config.get("width", 8),
+            height=charts_config.get("height", 5),
+            dpi=charts_config.get("dpi", 100)
+        )
+
+    def _cached(self, key):
+        """Artifact name of a remembered render that is still stored, else None."""
+        with self._lock:
+            name = self._renders.get(key)
+            if name is not None:
+                self._renders.move_to_end(key)
+        if name is not None and self.artifact_store.get(name) is None:
+            # The image was evicted from the store; render it again
+            with self._lock:
+                self._renders.pop(key, None)
+            name = None
+        return name
+
+    def _remember(self, key, name):
+        """Remember a render, forgetting the least recently used beyond max_entries."""
+        with self._lock:
+            self._renders[key] = name
+            self._renders.move_to_end(key)
+            while len(self._renders) > self.max_entries:
+                self._renders.popitem(last=False)
+
+    def render(self, df, spec):
+        """
+        Render a chart of a table.
+
+        Args:
+            df (pandas.DataFrame): The table
+            spec (dict): Chart spec, see chart_renderer.normalize_spec()
+
+        Returns:
+            dict: format and, for vega-lite, the Vega-Lite spec; for images the
+                  artifact name and whether the render came from the cache
+
+        Raises:
+            ValueError: If the spec doesn't fit the table
+            ImportError: If an image is requested and matplotlib is not installed
+        """
+        spec = normalize_spec(spec, df, max_rows=self.max_rows)
+        if spec["format"] == "vega-lite":
+            return {"format": spec["format"], "spec": to_vega_lite(df, spec)}
+
+        # Renders at another size are different images
+        key = render_key(df, dict(spec, size=[self.width, self.height, self.dpi]))
+        name = self._cached(key)
+        cached = name is not None
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+            image = render_image(df, spec, width=self.width, height=self.height, dpi=self.dpi)
+            name = self.artifact_store.put_bytes(image, f".{spec['format']}")
+            self._remember(key, name)
+        return {"format": spec["format"], "name": name, "cached": cached}
+
+    def stats(self):
+        """
+        Get render cache statistics.
+
+        Returns:
+            dict: Hits, misses, hit rate and remembered renders
+        """
+        with self._lock:
+            entries = len(self._renders)
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
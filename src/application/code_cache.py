@@ -0,0 +1,99 @@
+"""
+Cache of the tool calls that answered an interpreted question.
+
+When the analysis agent answers a question, the code and SQL it ran
+successfully are stored under the canonical interpretation of the question
+and the schema of the dataset. A later question with the same interpretation
+replays those steps in the sandbox instead of asking the LLM to write them
+again. Entries are keyed by the schema rather than the content of the data,
+so stored steps can also be re-run against a refreshed version of a dataset.
+"""
+import hashlib
+import json
+import os
+
+from src.application.sqlite_cache import SQLiteCache
+
+
+class CodeCache(SQLiteCache):
+    """SQLite-backed store of replayable analysis steps with TTL expiry and LRU eviction."""
+
+    table = "code_entries"
+    columns = (
+        "dataset_name TEXT NOT NULL",
+        "schema_fingerprint TEXT NOT NULL",
+        "question TEXT NOT NULL",
+        "steps TEXT NOT NULL",
+    )
+    indexes = (("idx_code_dataset", "dataset_name, schema_fingerprint"),)
+    # Columns of an entry, see _entry()
+    fields = ("key", "dataset_name", "schema_fingerprint", "question", "steps", "created_at")
+
+    def __init__(self, path=os.path.join(".cache", "code.sqlite"), ttl_seconds=30 * 86400, max_entries=1000):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path (str): SQLite database file
+            ttl_seconds (float): Age after which an entry is no longer replayed
+            max_entries (int): Entries kept before the least recently used are evicted
+        """
+        super().__init__(path, ttl_seconds, max_entries)
+
+    @staticmethod
+    def make_key(interpretation_key, dataset_name, schema_fingerprint):
+        """
+        Build the cache key of an interpreted question.
+
+        Args:
+            interpretation_key (str): Canonical interpretation (QueryInterpretation.cache_key())
+            dataset_name (str): Name of the dataset queried
+            schema_fingerprint (str): Hash of the dataset's columns and dtypes
+
+        Returns:
+            str: The cache key
+        """
+        parts = [interpretation_key, dataset_name, schema_fingerprint or ""]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _entry(self, row):
+        """Convert a row of fields to an entry dict."""
+        entry = dict(zip(self.fields, row))
+        entry["steps"] = json.loads(entry["steps"])
+        return entry
+
+    def get(self, interpretation_key, dataset_name, schema_fingerprint):
+        """
+        Look up the stored steps of an interpreted question.
+
+        Returns:
+            dict or None: Entry with key, question and steps, None on a miss or expired entry
+        """
+        row = self._get(self.make_key(interpretation_key, dataset_name, schema_fingerprint), self.fields)
+        return self._entry(row) if row is not None else None
+
+    def put(self, interpretation_key, dataset_name, schema_fingerprint, question, steps):
+        """
+        Store the steps that answered a question.
+
+        Args:
+            interpretation_key (str): Canonical interpretation of the question
+            dataset_name (str): Name of the dataset queried
+            schema_fingerprint (str): Hash of the dataset's columns and dtypes
+            question (str): The question as asked, for display
+            steps (list): Tool calls to replay, e.g. {"tool": "code", "code": ...}
+        """
+        self._put(self.make_key(interpretation_key, dataset_name, schema_fingerprint),
+                  dataset_name=dataset_name, schema_fingerprint=schema_fingerprint or "",
+                  question=question, steps=json.dumps(steps))
+
+    def entries(self, dataset_name, schema_fingerprint):
+        """
+        List the unexpired entries of a dataset schema, most recently used first.
+
+        Returns:
+            list: Entry dicts with key, question and steps
+        """
+        rows = self._select(self.fields, "dataset_name = ? AND schema_fingerprint = ?",
+                            (dataset_name, schema_fingerprint or ""))
+        return [self._entry(row) for row in rows]
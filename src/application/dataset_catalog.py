@@ -0,0 +1,161 @@
+"""
+Catalog of the dataset files in the data directory.
+
+A background thread scans the directory at a fixed interval and registers
+new and modified files of the supported formats, and unregisters deleted
+ones, so datasets can be added or updated without restarting the server.
+Only files that changed are reloaded. A file is picked up once its size and
+modification time are the same in two consecutive scans, so a file that is
+still being copied in isn't loaded half-written. Files whose names are not
+valid dataset names are skipped.
+"""
+import logging
+import os
+import re
+import threading
+
+from src.core.dataset_readers import dataset_format
+
+logger = logging.getLogger("DatasetCatalog")
+
+# Dataset names are used as SQL table names and in file names; match with fullmatch()
+DATASET_NAME_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+
+
+class DatasetCatalog:
+    """Keeps the registered datasets in sync with the files of a directory."""
+
+    def __init__(self, data_dir, register, unregister, interval_seconds=10):
+        """
+        Args:
+            data_dir (str): Directory holding the dataset files
+            register (callable): Called as register(path, dataset_name) for new and
+                                 changed files; returns a Future of the registration
+            unregister (callable): Called as unregister(dataset_name) for deleted files
+            interval_seconds (float): Time between scans
+        """
+        self.data_dir = data_dir
+        self.register = register
+        self.unregister = unregister
+        self.interval_seconds = interval_seconds
+        # Path -> (size, mtime) of the version registered last
+        self._registered = {}
+        # Path -> dataset name
+        self._names = {}
+        # Path -> (size, mtime) seen in the previous scan, for files that changed
+        self._pending = {}
+        # Path -> Future of a registration still running
+        self._running = {}
+        # Paths of files skipped for their names, so each is only reported once
+        self._invalid = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _signature(path):
+        """Size and modification time of a file, None if it is gone."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _dataset_name(self, path):
+        """Name a file is registered under: its base name, plus the extension if another format took it."""
+        stem, extension = os.path.splitext(os.path.basename(path))
+        taken = {name for other, name in self._names.items() if other != path}
+        return stem if stem not in taken else f"{stem}_{extension.lstrip('.').lower()}"
+
+    def _files(self):
+        """Supported dataset files in the data directory."""
+        try:
+            names = sorted(os.listdir(self.data_dir))
+        except OSError as e:
+            logger.warning(f"Cannot list data directory {self.data_dir}: {str(e)}")
+            return []
+        return [os.path.join(self.data_dir, name) for name in names
+                if dataset_format(name) is not None and os.path.isfile(os.path.join(self.data_dir, name))]
+
+    def scan(self, initial=False):
+        """
+        Register new and changed files and unregister deleted ones.
+
+        Args:
+            initial (bool): Register every file right away, without waiting
+                            for its size to settle
+
+        Returns:
+            list: Names of the datasets (re)registered by this scan
+        """
+        registered = []
+        with self._lock:
+            files = self._files()
+            for path in files:
+                name = self._names.get(path) or self._dataset_name(path)
+                if not DATASET_NAME_PATTERN.fullmatch(name):
+                    if path not in self._invalid:
+                        self._invalid.add(path)
+                        logger.warning(f"Skipping {path}: '{name}' is not a valid dataset name "
+                                       "(letters, digits and underscores only)")
+                    continue
+                signature = self._signature(path)
+                if signature is None or signature == self._registered.get(path):
+                    self._pending.pop(path, None)
+                    continue
+                # Reload once a previous registration of the file has finished
+                running = self._running.get(path)
+                if running is not None and not running.done():
+                    continue
+                # Wait for files being written to settle
+                if not initial and self._pending.get(path) != signature:
+                    self._pending[path] = signature
+                    continue
+
+                self._pending.pop(path, None)
+                self._names[path] = name
+                self._registered[path] = signature
+                self._running[path] = self.register(path, name)
+                registered.append(name)
+
+            for path in set(self._registered) - set(files):
+                name = self._names.pop(path)
+                del self._registered[path]
+                self._running.pop(path, None)
+                self._pending.pop(path, None)
+                logger.info(f"Dataset file {path} was removed, unregistering '{name}'")
+                self.unregister(name)
+
+        if registered:
+            logger.info(f"Registering datasets from {self.data_dir}: {', '.join(registered)}")
+        return registered
+
+    def datasets(self):
+        """
+        List the cataloged dataset files.
+
+        Returns:
+            dict: Dataset name -> file path
+        """
+        with self._lock:
+            return {name: path for path, name in self._names.items()}
+
+    def start(self):
+        """Register the files present now and watch the directory in a background thread."""
+        self.scan(initial=True)
+        self._thread = threading.Thread(target=self._watch, name="dataset-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching the directory."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _watch(self):
+        """Scan the directory until stopped."""
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.scan()
+            except Exception as e:
+                logger.error(f"Scanning {self.data_dir} failed: {str(e)}")
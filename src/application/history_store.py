@@ -0,0 +1,121 @@
+"""
+Persistent history of analyses.
+
+Finished analyses are stored in SQLite, so the history survives restarts of
+the app. Entries get increasing ids that serve as cursors: clients poll for
+the entries added since the newest one they have, and page back through
+older ones, so neither has to transfer the whole history. Only the newest
+max_entries entries are kept.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class HistoryStore:
+    """SQLite-backed analysis history with cursor pagination."""
+
+    def __init__(self, path=os.path.join(".cache", "history.sqlite"), max_entries=10000):
+        """
+        Open (or create) the history database.
+
+        Args:
+            path (str): SQLite database file
+            max_entries (int): Entries kept before the oldest are deleted
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                user TEXT,
+                dataset_name TEXT,
+                query TEXT NOT NULL,
+                record TEXT NOT NULL
+            )
+            """
+        )
+        # Filtered pages are read newest first, so the filters are indexed together with the id
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_history_created_at ON history (created_at)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_history_dataset ON history (dataset_name, id)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_history_user ON history (user, id)")
+        self._connection.commit()
+
+    def add(self, record, user=None):
+        """
+        Store a finished analysis.
+
+        Args:
+            record (dict): The analysis record, with at least query and dataset
+            user (str, optional): Who asked
+
+        Returns:
+            int: Id of the entry
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO history (created_at, user, dataset_name, query, record) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), user, record.get("dataset"), record["query"], json.dumps(record, default=str))
+            )
+            entry_id = cursor.lastrowid
+            self._connection.execute("DELETE FROM history WHERE id <= ?", (entry_id - self.max_entries,))
+            self._connection.commit()
+        return entry_id
+
+    def page(self, limit=20, since=None, before=None, dataset_name=None, user=None):
+        """
+        Get entries, newest first.
+
+        Args:
+            limit (int): Entries returned at most
+            since (int, optional): Only entries added after the entry with this id
+            before (int, optional): Only entries older than the entry with this id
+            dataset_name (str, optional): Only analyses of this dataset
+            user (str, optional): Only analyses by this user
+
+        Returns:
+            dict: items (the records, each with its id), latest (the newest id
+                  returned or, without items, since; pass it as since= to poll
+                  for newer entries) and next_before (pass it as before= for the
+                  next older page; None on the last page)
+        """
+        conditions, parameters = [], []
+        for clause, value in (("id > ?", since), ("id < ?", before),
+                              ("dataset_name = ?", dataset_name), ("user = ?", user)):
+            if value is not None:
+                conditions.append(clause)
+                parameters.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT id, created_at, user, record FROM history {where} ORDER BY id DESC LIMIT ?",
+                parameters + [limit + 1]
+            ).fetchall()
+
+        items = []
+        for entry_id, created_at, entry_user, record in rows[:limit]:
+            item = json.loads(record)
+            item.update(id=entry_id, created_at=created_at, user=entry_user)
+            items.append(item)
+        return {
+            "items": items,
+            "latest": items[0]["id"] if items else since,
+            "next_before": items[-1]["id"] if len(rows) > limit else None,
+        }
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
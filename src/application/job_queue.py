@@ -0,0 +1,332 @@
+"""
+Background job queue for long-running analyses.
+
+Requests submit a job and get its id back immediately; a fixed number of
+worker threads run the jobs in submission order. The queue is bounded, so
+when it is full new submissions are rejected instead of piling up, and
+finished jobs are kept for a while so clients can collect their results.
+While it runs, a job can publish progress events that clients follow live.
+
+Jobs only exist in the memory of the process running the queue, so the app
+must be served by a single process (scale with threads, not with worker
+processes); serving it from several processes is not supported. The queue
+holds a lock file to refuse to start a second time.
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where the single-process check is skipped
+    fcntl = None
+
+logger = logging.getLogger("JobQueue")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Streamed answer chunks; dropped once the job is done, see Job.compact_events()
+TOKEN_EVENT = "token"
+
+# The job run by the current worker thread, see current_job()
+_worker_state = threading.local()
+
+
+def current_job():
+    """
+    Get the job running on the calling thread.
+
+    Returns:
+        Job or None: The job, None when not called from a job worker
+    """
+    return getattr(_worker_state, "job", None)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    """A unit of work and its status."""
+
+    def __init__(self, sequence, function, args, kwargs, metadata):
+        self.id = uuid.uuid4().hex
+        self.sequence = sequence
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.metadata = metadata
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        self._next_event_id = 0
+        self._events_changed = threading.Condition()
+
+    @property
+    def done(self):
+        """Whether the job has finished, successfully or not."""
+        return self.status in (SUCCEEDED, FAILED)
+
+    def emit(self, event_type, data=None):
+        """
+        Publish a progress event to clients following the job.
+
+        Args:
+            event_type (str): Kind of event, e.g. "stage" or "token"
+            data (dict, optional): JSON-serializable event payload
+        """
+        with self._events_changed:
+            self.events.append({"id": self._next_event_id, "type": event_type, "data": data or {}})
+            self._next_event_id += 1
+            self._events_changed.notify_all()
+
+    def compact_events(self):
+        """
+        Drop the token events of a finished job.
+
+        They only matter while the answer is being written and make up most of
+        the events; the final result holds the complete answer. Event ids are
+        kept, so clients resuming after a given event are not affected.
+        """
+        with self._events_changed:
+            self.events = [event for event in self.events if event["type"] != TOKEN_EVENT]
+
+    def wait_for_events(self, after=-1, timeout=15):
+        """
+        Get the events published after a given one, waiting for new ones if needed.
+
+        Args:
+            after (int): Id of the last event already seen, -1 for all
+            timeout (float): Seconds to wait for a new event
+
+        Returns:
+            list: New events, empty if the timeout expired first
+        """
+        with self._events_changed:
+            self._events_changed.wait_for(lambda: self._next_event_id > after + 1, timeout=timeout)
+            return [event for event in self.events if event["id"] > after]
+
+    def to_dict(self):
+        """
+        Get the job status as a JSON-serializable dict.
+
+        Returns:
+            dict: Id, status, timings, metadata and, once finished, result or error
+        """
+        now = time.time()
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "queued_seconds": round((self.started_at or now) - self.created_at, 3),
+            "metadata": self.metadata,
+        }
+        if self.started_at is not None:
+            data["running_seconds"] = round((self.finished_at or now) - self.started_at, 3)
+        if self.status == SUCCEEDED:
+            data["result"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """Bounded queue of jobs run by a fixed pool of worker threads."""
+
+    def __init__(self, workers=4, max_pending=20, result_ttl_seconds=3600, lock_path=None):
+        """
+        Start the worker threads.
+
+        Args:
+            workers (int): Number of jobs run concurrently
+            max_pending (int): Queued jobs accepted before submissions are rejected
+            result_ttl_seconds (float): How long finished jobs stay retrievable
+            lock_path (str, optional): Lock file held while the queue runs, so
+                a second process using the same file refuses to start
+
+        Raises:
+            RuntimeError: If another process holds the lock file
+        """
+        self._lock_file = self._acquire_process_lock(lock_path) if lock_path else None
+        self._pid = os.getpid()
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl_seconds = result_ttl_seconds
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @classmethod
+    def from_config(cls, jobs_config):
+        """
+        Create a job queue from the `jobs` section of system.yaml.
+
+        Args:
+            jobs_config (dict): Job queue settings
+
+        Returns:
+            JobQueue: The running job queue
+        """
+        return cls(
+            workers=jobs_config.get("workers", 4),
+            max_pending=jobs_config.get("max_pending", 20),
+            result_ttl_seconds=jobs_config.get("result_ttl_seconds", 3600),
+            lock_path=jobs_config.get("lock_path", ".cache/jobs.lock")
+        )
+
+    @staticmethod
+    def _acquire_process_lock(lock_path):
+        """
+        Take an exclusive lock on a file for the lifetime of the process.
+
+        Args:
+            lock_path (str): The lock file
+
+        Returns:
+            file or None: The open lock file, None where file locks are unsupported
+
+        Raises:
+            RuntimeError: If another process holds the lock
+        """
+        if fcntl is None:
+            return None
+        directory = os.path.dirname(lock_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(
+                f"Another process already runs the job queue (lock file {lock_path}). Jobs are kept "
+                "in memory, so the app must run as a single process; use threads instead of worker "
+                "processes (e.g. gunicorn --workers 1 --threads 8)"
+            )
+        return lock_file
+
+    def submit(self, function, *args, metadata=None, **kwargs):
+        """
+        Queue a function call.
+
+        Args:
+            function (callable): Function to run on a worker thread
+            *args: Positional arguments for the function
+            metadata (dict, optional): Data returned with the job status, e.g. the query
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            QueueFullError: If max_pending jobs are already waiting
+            RuntimeError: If called in a process forked after the queue started
+        """
+        if os.getpid() != self._pid:
+            # The worker threads are not forked along, so the job would never run
+            raise RuntimeError("The job queue was created in another process; run the app as a single process")
+        self._prune()
+        job = Job(next(self._sequence), function, args, kwargs, metadata or {})
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFullError(f"Job queue is full ({self.max_pending} jobs waiting)")
+        return job
+
+    def get(self, job_id):
+        """
+        Look up a job.
+
+        Args:
+            job_id (str): Id returned by submit()
+
+        Returns:
+            Job or None: The job, None if unknown or expired
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Number of queued jobs ahead of a job, 0 once it is running."""
+        if job.status != QUEUED:
+            return 0
+        with self._lock:
+            return sum(1 for other in self._jobs.values()
+                       if other.status == QUEUED and other.sequence < job.sequence)
+
+    def stats(self):
+        """
+        Get queue statistics.
+
+        Returns:
+            dict: Worker count, capacity and number of jobs per status
+        """
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            QUEUED: statuses.count(QUEUED),
+            RUNNING: statuses.count(RUNNING),
+            SUCCEEDED: statuses.count(SUCCEEDED),
+            FAILED: statuses.count(FAILED),
+        }
+
+    def _prune(self):
+        """Forget finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.done and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def _worker(self):
+        """Run queued jobs until the process exits."""
+        while True:
+            job = self._queue.get()
+            job.started_at = time.time()
+            job.status = RUNNING
+            job.emit("status", {"status": RUNNING})
+            _worker_state.job = job
+            error = None
+            try:
+                result = job.function(*job.args, **job.kwargs)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}\n{traceback.format_exc()}")
+                result, error = None, str(e)
+            finally:
+                _worker_state.job = None
+
+            # Don't keep the arguments (e.g. DataFrames) alive until the job expires
+            job.args = job.kwargs = None
+            job.result, job.error = result, error
+            job.finished_at = time.time()
+            # Set last, so readers that see a final status also see the result
+            job.status = SUCCEEDED if error is None else FAILED
+            job.compact_events()
+            job.emit("done", job.to_dict())
+            self._queue.task_done()
@@ -0,0 +1,372 @@
+"""
+Semantic cache of question interpretations.
+
+Questions are embedded into vectors and compared by cosine similarity, so
+differently phrased versions of the same question ("sales by region", "what's
+revenue per region") can reuse the interpretation produced for an earlier one
+and skip the query interpreter LLM call. Questions are first rewritten with
+common synonyms and breakdown phrases in a canonical form, see
+canonical_question(), so that the dependency-free hashing embedder also
+matches simple paraphrases. Entries are scoped to a dataset fingerprint and
+dropped when the dataset content changes.
+
+Similar wording is not enough: "sales in 2016" and "sales in 2017" embed
+close together but need different filters. An interpretation is therefore
+only reused if the literal constraints of both questions (numbers, quoted
+text, names of data values, and words like "top" or "average" that change
+the result) are exactly the same, see question_constraints().
+"""
+import json
+import os
+import re
+import uuid
+import zlib
+
+import numpy as np
+
+from src.application.sqlite_cache import SQLiteCache
+
+# Words that change the result of a question even when the rest is the same
+MODIFIER_WORDS = {
+    "top", "bottom", "highest", "lowest", "most", "least", "largest", "smallest", "best", "worst",
+    "first", "last", "ascending", "descending", "increase", "decrease", "growth", "decline",
+    "average", "avg", "mean", "median", "total", "sum", "count", "number", "min", "minimum", "max",
+    "maximum", "share", "percent", "percentage", "ratio", "daily", "weekly", "monthly", "quarterly",
+    "yearly", "annual", "not", "without", "except", "excluding", "only", "above", "below", "over", "under",
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+    "november", "december", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "trend", "trends", "change", "changes", "distribution", "correlation",
+}
+
+# Most similar entries checked for matching constraints
+CANDIDATES = 5
+
+STOPWORDS = {
+    "a", "an", "and", "are", "can", "could", "did", "do", "does", "for", "generate", "get", "give",
+    "had", "has", "have", "how", "i", "in", "is", "it", "list", "make", "made", "me", "much", "my",
+    "of", "our", "please", "show", "tell", "the", "to", "us", "was", "we", "were", "what", "whats",
+    "what's", "which", "would", "you",
+}
+
+# Common names of the same measure or aggregation; a word that is a column or
+# value of the dataset itself is never replaced
+SYNONYMS = {
+    "revenue": "sales", "revenues": "sales", "turnover": "sales",
+    "earnings": "profit", "profits": "profit",
+    "client": "customer", "clients": "customers",
+    "avg": "average", "mean": "average",
+}
+
+# Ways to ask for a breakdown, all written as "by"
+GROUPING_PHRASES = re.compile(
+    r"\b(?:broken down by|break down by|split by|grouped by|group by|for each|for every|by each|per|each|across)\b"
+)
+
+
+def _canonical_word(word, vocabulary=()):
+    """A lowercase word, replaced by its canonical synonym unless the dataset uses it."""
+    word = word.lower()
+    return word if word in vocabulary else SYNONYMS.get(word, word)
+
+
+def canonical_question(question, vocabulary=()):
+    """
+    Rewrite a question so that common paraphrases read the same.
+
+    Args:
+        question (str): The question
+        vocabulary (iterable): Lowercase column names and data values, kept as they are
+
+    Returns:
+        str: Lowercase question with breakdown phrases as "by" and synonyms replaced,
+             e.g. "what's revenue per region" -> "what's sales by region"
+    """
+    text = GROUPING_PHRASES.sub("by", question.lower())
+    return " ".join(_canonical_word(word, vocabulary) for word in re.findall(r"[a-z0-9']+", text))
+
+
+def question_constraints(question, vocabulary=()):
+    """
+    Extract the literal constraints of a question, which must match exactly for
+    two questions to share an interpretation.
+
+    Args:
+        question (str): The question
+        vocabulary (iterable): Lowercase column names and data values (e.g. region
+                               or category names) that matter when they are mentioned
+
+    Returns:
+        list: Sorted constraints: numbers, quoted text, capitalized words after
+              the first, mentioned columns and data values and modifier words,
+              with synonyms replaced as in canonical_question()
+    """
+    constraints = {f"number:{float(number):g}" for number in re.findall(r"\d+(?:\.\d+)?", question)}
+    constraints |= {f"quoted:{quoted.lower()}" for pair in re.findall(r'"([^"]+)"|\'([^\']+)\'', question)
+                    for quoted in pair if quoted}
+    words = re.findall(r"[A-Za-z][\w'-]*", question)
+    # Capitalized words inside a sentence are usually names of regions, products, ...
+    constraints |= {f"name:{_canonical_word(word, vocabulary)}" for word in words[1:] if word[0].isupper()}
+    constraints |= {f"word:{_canonical_word(word, vocabulary)}" for word in words if word.lower() in MODIFIER_WORDS}
+    canonical = " ".join(_canonical_word(word, vocabulary) for word in re.findall(r"[A-Za-z0-9]+", question))
+    text = f" {canonical} "
+    for value in vocabulary:
+        normalized = " ".join(re.findall(r"[a-z0-9]+", value))
+        if normalized and f" {normalized} " in text:
+            constraints.add(f"name:{normalized}")
+    return sorted(constraints)
+
+
+class HashingEmbedder:
+    """
+    Dependency-free embedder using hashed word and character n-gram features.
+
+    It captures lexical overlap only, so questions are embedded after
+    canonical_question() maps common paraphrases to the same words.
+    """
+
+    def __init__(self, dimensions=512):
+        """
+        Args:
+            dimensions (int): Size of the embedding vectors
+        """
+        self.dimensions = dimensions
+
+    def _features(self, text):
+        """Yield (feature, weight) pairs for a text."""
+        words = [word for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOPWORDS]
+        # Singular and plural count as the same word
+        words = [word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+                 for word in words]
+        for word in words:
+            yield f"w:{word}", 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield f"c:{padded[i:i + 3]}", 0.5
+        for first, second in zip(words, words[1:]):
+            yield f"b:{first} {second}", 0.7
+
+    def embed(self, text):
+        """
+        Embed a text.
+
+        Args:
+            text (str): Text to embed
+
+        Returns:
+            numpy.ndarray: L2-normalized float32 vector
+        """
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature, weight in self._features(text):
+            # crc32 is stable across processes, unlike hash()
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dimensions] += weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a local sentence-transformers model."""
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        """
+        Args:
+            model_name (str): sentence-transformers model to load
+        """
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text):
+        """Embed a text as an L2-normalized float32 vector."""
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+def create_embedder(embedder_config):
+    """
+    Create the configured embedder, falling back to hashing if the model is unavailable.
+
+    Args:
+        embedder_config (dict): Embedder settings (type, model, dimensions)
+
+    Returns:
+        Embedder with an embed(text) method and a dimensions attribute
+    """
+    if embedder_config.get("type", "hashing") == "sentence_transformers":
+        try:
+            return SentenceTransformerEmbedder(embedder_config.get("model", "all-MiniLM-L6-v2"))
+        except Exception as e:
+            print(f"Semantic cache: sentence-transformers model unavailable ({e}), using hashing embedder")
+    return HashingEmbedder(embedder_config.get("dimensions", 512))
+
+
+class NumpyVectorIndex:
+    """
+    Brute-force cosine similarity index over normalized vectors.
+
+    Exact and fast enough for a few tens of thousands of questions; the
+    add/remove/search interface leaves room for an ANN index later.
+    """
+
+    def __init__(self, dimensions):
+        """
+        Args:
+            dimensions (int): Size of the indexed vectors
+        """
+        self.dimensions = dimensions
+        self._ids = []
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, entry_id, vector):
+        """Add a normalized vector under an id."""
+        self._ids.append(entry_id)
+        self._vectors = np.vstack([self._vectors, vector.reshape(1, -1)])
+
+    def remove(self, entry_id):
+        """Remove the vector stored under an id."""
+        if entry_id in self._ids:
+            position = self._ids.index(entry_id)
+            del self._ids[position]
+            self._vectors = np.delete(self._vectors, position, axis=0)
+
+    def search(self, vector, k=1):
+        """
+        Find the most similar vectors.
+
+        Args:
+            vector (numpy.ndarray): Normalized query vector
+            k (int): Number of results
+
+        Returns:
+            list: (entry id, cosine similarity) pairs, most similar first
+        """
+        if not self._ids:
+            return []
+        scores = self._vectors @ vector
+        top = np.argsort(-scores)[:k]
+        return [(self._ids[i], float(scores[i])) for i in top]
+
+
+class SemanticCache(SQLiteCache):
+    """Reuses interpretations of earlier questions that are semantically equivalent."""
+
+    table = "semantic_entries"
+    columns = (
+        "question TEXT NOT NULL",
+        "dataset_name TEXT NOT NULL",
+        "fingerprint TEXT NOT NULL",
+        "interpretation TEXT NOT NULL",
+        "constraints TEXT NOT NULL",
+        "embedding BLOB NOT NULL",
+    )
+    indexes = (("idx_semantic_dataset", "dataset_name, fingerprint"),)
+
+    def __init__(self, embedder, path=os.path.join(".cache", "semantic.sqlite"), similarity_threshold=0.9,
+                 ttl_seconds=7 * 86400, max_entries=5000):
+        """
+        Open (or create) the cache and load its vectors into memory.
+
+        Args:
+            embedder: Object with embed(text) and dimensions
+            path (str): SQLite database file
+            similarity_threshold (float): Minimum cosine similarity for a hit
+            ttl_seconds (float): Age after which entries are no longer served
+            max_entries (int): Entries kept before the least recently used are evicted
+        """
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        # One index per (dataset name, fingerprint), so changed data never matches
+        self._indexes = {}
+        super().__init__(path, ttl_seconds, max_entries)
+        self._load()
+
+    def _load(self):
+        """Load stored vectors that match the current embedder into the in-memory indexes."""
+        for key, dataset_name, fingerprint, embedding in self._select(("key", "dataset_name", "fingerprint",
+                                                                       "embedding")):
+            vector = np.frombuffer(embedding, dtype=np.float32)
+            if vector.shape[0] == self.embedder.dimensions:
+                self._index_for(dataset_name, fingerprint).add(key, vector)
+
+    def _index_for(self, dataset_name, fingerprint):
+        """Get or create the index of a dataset version (lock must be held or at init)."""
+        key = (dataset_name, fingerprint)
+        if key not in self._indexes:
+            self._indexes[key] = NumpyVectorIndex(self.embedder.dimensions)
+        return self._indexes[key]
+
+    def invalidate(self, dataset_name, current_fingerprint=None):
+        """
+        Drop entries of a dataset that don't belong to its current version.
+
+        Args:
+            dataset_name (str): Name of the dataset
+            current_fingerprint (str, optional): Fingerprint to keep; None drops all
+        """
+        with self._lock:
+            for key in [key for key in self._indexes if key[0] == dataset_name and key[1] != current_fingerprint]:
+                del self._indexes[key]
+            self._connection.execute(
+                f"DELETE FROM {self.table} WHERE dataset_name = ? AND fingerprint IS NOT ?",
+                (dataset_name, current_fingerprint)
+            )
+            self._connection.commit()
+
+    def lookup(self, question, dataset_name, fingerprint, vocabulary=()):
+        """
+        Find the interpretation of the most similar earlier question with the same constraints.
+
+        Args:
+            question (str): The user's question
+            dataset_name (str): Name of the dataset queried
+            fingerprint (str): Content hash of the dataset
+            vocabulary (iterable): Lowercase data values, see question_constraints()
+
+        Returns:
+            dict or None: Entry with question, interpretation and similarity, None on a miss
+        """
+        vector = self.embedder.embed(canonical_question(question, vocabulary))
+        constraints = json.dumps(question_constraints(question, vocabulary))
+        with self._lock:
+            if any(key[0] == dataset_name and key[1] != fingerprint for key in self._indexes):
+                self.invalidate(dataset_name, fingerprint)
+
+            index = self._index_for(dataset_name, fingerprint)
+            for key, similarity in index.search(vector, k=CANDIDATES):
+                if similarity < self.similarity_threshold:
+                    break
+                if not self._select(("key",), "key = ? AND constraints = ?", (key, constraints)):
+                    continue
+                # Counts the hit (or a miss, if it expired meanwhile) and marks the entry as used
+                row = self._get(key, ("question", "interpretation"))
+                if row is None:
+                    index.remove(key)
+                    return None
+                return {"question": row[0], "interpretation": row[1], "similarity": similarity}
+            self.misses += 1
+            return None
+
+    def add(self, question, dataset_name, fingerprint, interpretation, vocabulary=()):
+        """Store the interpretation produced for a question (vocabulary as for lookup())."""
+        vector = self.embedder.embed(canonical_question(question, vocabulary)).astype(np.float32)
+        key = uuid.uuid4().hex
+        with self._lock:
+            dropped = self._put(key, question=question, dataset_name=dataset_name, fingerprint=fingerprint,
+                                interpretation=interpretation,
+                                constraints=json.dumps(question_constraints(question, vocabulary)),
+                                embedding=vector.tobytes())
+            self._index_for(dataset_name, fingerprint).add(key, vector)
+            for index in self._indexes.values():
+                for dropped_key in dropped:
+                    index.remove(dropped_key)
+
+    def stats(self):
+        """
+        Get cache statistics for this process.
+
+        Returns:
+            dict: Hits, misses, hit rate, stored entries and the similarity threshold
+        """
+        return dict(super().stats(), similarity_threshold=self.similarity_threshold)
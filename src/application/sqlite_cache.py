@@ -0,0 +1,175 @@
+"""
+Base class of the persistent caches.
+
+Each cache is one SQLite table of entries under a string key, with the time
+the entry was stored and last used. Entries expire after a TTL and the least
+recently used ones are evicted beyond a size limit. SQLite lets the caches
+survive restarts of the app; subclasses only define their table, its
+columns and how keys are built.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteCache:
+    """SQLite table of keyed entries with TTL expiry and LRU eviction."""
+
+    # Set by subclasses: table name, "name TYPE" definitions of the value
+    # columns and (index name, indexed columns) pairs
+    table = None
+    columns = ()
+    indexes = ()
+
+    def __init__(self, path, ttl_seconds, max_entries):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path (str): SQLite database file
+            ttl_seconds (float): Age after which an entry is no longer served
+            max_entries (int): Entries kept before the least recently used are evicted
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Reentrant, so subclasses can hold it around the helpers below
+        self._lock = threading.RLock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._create_table()
+
+    def _create_table(self):
+        """Create the table, recreating it if it was stored with other columns."""
+        definitions = ["key TEXT PRIMARY KEY", *self.columns,
+                       "created_at REAL NOT NULL", "last_access REAL NOT NULL"]
+        names = [definition.split()[0] for definition in definitions]
+        existing = [row[1] for row in self._connection.execute(f"PRAGMA table_info({self.table})")]
+        if existing and existing != names:
+            # Written by an older version; the entries can simply be recomputed
+            self._connection.execute(f"DROP TABLE {self.table}")
+        self._connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({', '.join(definitions)})")
+        self._connection.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_access ON {self.table} (last_access)"
+        )
+        for name, indexed in self.indexes:
+            self._connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {self.table} ({indexed})")
+        self._connection.commit()
+
+    def _get(self, key, fields):
+        """
+        Look up an entry, counting the hit or miss and marking it as used.
+
+        Args:
+            key (str): The cache key
+            fields (tuple): Columns to return
+
+        Returns:
+            tuple or None: The values of fields, None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT created_at, {', '.join(fields)} FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[0] > self.ttl_seconds:
+                if row is not None:
+                    self._connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._connection.commit()
+                self.misses += 1
+                return None
+
+            self._connection.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+            return row[1:]
+
+    def _put(self, key, **values):
+        """
+        Store an entry, dropping expired entries and the least recently used beyond max_entries.
+
+        Args:
+            key (str): The cache key
+            **values: Value of every column
+
+        Returns:
+            list: Keys of the entries that were dropped
+        """
+        now = time.time()
+        names = ["key", *values, "created_at", "last_access"]
+        with self._lock:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(names)}) "
+                f"VALUES ({', '.join('?' * len(names))})",
+                (key, *values.values(), now, now)
+            )
+            dropped = [row[0] for row in self._connection.execute(
+                f"SELECT key FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,)
+            )]
+            excess = self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] \
+                - len(dropped) - self.max_entries
+            if excess > 0:
+                dropped += [row[0] for row in self._connection.execute(
+                    f"SELECT key FROM {self.table} WHERE created_at >= ? ORDER BY last_access ASC LIMIT ?",
+                    (now - self.ttl_seconds, excess)
+                )]
+            self._connection.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(k,) for k in dropped])
+            self._connection.commit()
+        return dropped
+
+    def _select(self, fields, where="1", parameters=()):
+        """
+        Get unexpired entries matching a condition, most recently used first.
+
+        Returns:
+            list: Tuples of the values of fields
+        """
+        with self._lock:
+            return self._connection.execute(
+                f"SELECT {', '.join(fields)} FROM {self.table} WHERE ({where}) AND created_at >= ? "
+                "ORDER BY last_access DESC",
+                (*parameters, time.time() - self.ttl_seconds)
+            ).fetchall()
+
+    def remove(self, key):
+        """Drop an entry."""
+        with self._lock:
+            self._connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._connection.commit()
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._connection.execute(f"DELETE FROM {self.table}")
+            self._connection.commit()
+
+    def stats(self):
+        """
+        Get cache statistics for this process.
+
+        Returns:
+            dict: Hits, misses, hit rate and current number of entries
+        """
+        with self._lock:
+            entries = self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,260 @@
+"""
+Chart rendering of result tables, without running code in the sandbox.
+
+A chart is described by a small spec (chart type, x column, y columns,
+title) and drawn from a result table, typically the output of a group-by.
+It can be rendered to PNG or SVG with matplotlib, or translated into a
+Vega-Lite spec for the browser to render. Rendering uses matplotlib's
+object-oriented API instead of pyplot, so charts can be drawn from several
+threads at once, and renders are deterministic so they can be cached by
+the hash of their data and spec.
+"""
+import hashlib
+import io
+import json
+
+import pandas as pd
+
+from src.core.column_profiler import to_json_value
+
+CHART_TYPES = ("bar", "barh", "line", "area", "scatter", "pie")
+FORMATS = ("png", "svg", "vega-lite")
+# Bump when the rendering changes, so cached renders are not reused
+RENDERER_VERSION = 1
+
+VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+VEGA_LITE_MARKS = {"bar": "bar", "barh": "bar", "line": "line", "area": "area", "scatter": "point", "pie": "arc"}
+
+
+def table_from_payload(data):
+    """
+    Build a DataFrame from a JSON result table.
+
+    Args:
+        data (dict or list): {"columns": [...], "rows": [[...], ...]}, where columns are
+                             names or {"name", "type"} as in result table payloads,
+                             or a list of row objects
+
+    Returns:
+        pandas.DataFrame: The table
+
+    Raises:
+        ValueError: If the payload is not a table
+    """
+    error = 'Chart data must be {"columns": [...], "rows": [[...]]} or a list of row objects'
+    if isinstance(data, dict) and isinstance(data.get("columns"), list) and isinstance(data.get("rows"), list):
+        columns = [column if isinstance(column, dict) else {"name": column} for column in data["columns"]]
+        if not all(isinstance(column.get("name"), str) for column in columns):
+            raise ValueError(f"{error}; every column needs a name")
+        if not all(isinstance(row, list) and len(row) == len(columns) for row in data["rows"]):
+            raise ValueError(f"{error}; every row needs one value per column")
+        df = pd.DataFrame(data["rows"], columns=[column["name"] for column in columns])
+        # Result tables send dates as ISO strings
+        for column in columns:
+            if column.get("type") == "datetime":
+                df[column["name"]] = pd.to_datetime(df[column["name"]], errors="coerce")
+        return df
+    if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        return pd.DataFrame.from_records(data)
+    raise ValueError(error)
+
+
+def normalize_spec(spec, df, max_rows=5000):
+    """
+    Validate a chart spec against a table and fill in defaults.
+
+    Args:
+        spec (dict): type, x, y (a column or list of columns) and optionally
+                     title, format and sort ("ascending"/"descending" by the first y column)
+        df (pandas.DataFrame): The table to chart
+        max_rows (int): Largest table that is charted
+
+    Returns:
+        dict: The spec with every field set, y always a list
+
+    Raises:
+        ValueError: If the spec doesn't fit the table
+    """
+    chart_type = spec.get("type", "bar")
+    if chart_type not in CHART_TYPES:
+        raise ValueError(f"Unknown chart type '{chart_type}' (supported: {', '.join(CHART_TYPES)})")
+    chart_format = spec.get("format", "png")
+    if chart_format not in FORMATS:
+        raise ValueError(f"Unknown chart format '{chart_format}' (supported: {', '.join(FORMATS)})")
+    if df.empty:
+        raise ValueError("Cannot chart an empty table")
+    if len(df) > max_rows:
+        raise ValueError(f"Table has {len(df)} rows, charts are limited to {max_rows}; aggregate it first")
+
+    columns = [str(col) for col in df.columns]
+    # By default, the categories are the first text or date column (as group-by keys usually are)
+    labels = [col for col in columns if not pd.api.types.is_numeric_dtype(df[col])]
+    x = spec.get("x") or (labels or columns)[0]
+    y = spec.get("y") or [col for col in columns if col != x and pd.api.types.is_numeric_dtype(df[col])][:1]
+    y = [y] if isinstance(y, str) else list(y)
+    for column in [x] + y:
+        if column not in columns:
+            raise ValueError(f"Column '{column}' is not in the table (columns: {', '.join(columns)})")
+    if not y:
+        raise ValueError("No numeric column to plot; set y")
+    if x in y:
+        raise ValueError(f"Column '{x}' cannot be on both axes")
+    for column in y:
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            raise ValueError(f"Column '{column}' is not numeric")
+    if chart_type == "pie" and len(y) != 1:
+        raise ValueError("Pie charts show exactly one y column")
+
+    sort = spec.get("sort")
+    if sort not in (None, "ascending", "descending"):
+        raise ValueError("sort must be 'ascending' or 'descending'")
+    return {"type": chart_type, "x": x, "y": y, "title": spec.get("title") or "",
+            "format": chart_format, "sort": sort}
+
+
+def _prepare(df, spec):
+    """The table columns a chart uses, sorted as requested."""
+    df = df.rename(columns=str)[[spec["x"]] + spec["y"]]
+    if spec["sort"]:
+        df = df.sort_values(spec["y"][0], ascending=spec["sort"] == "ascending", kind="stable")
+    return df.reset_index(drop=True)
+
+
+def render_key(df, spec):
+    """
+    Cache key of a render: a hash of the table's content and the normalized spec.
+
+    Args:
+        df (pandas.DataFrame): The table
+        spec (dict): Spec as returned by normalize_spec()
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"spec": spec, "version": RENDERER_VERSION,
+                              "columns": [str(col) for col in df.columns],
+                              "dtypes": [str(dtype) for dtype in df.dtypes]}, sort_keys=True).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def to_vega_lite(df, spec):
+    """
+    Translate a chart into a Vega-Lite spec with the data inlined.
+
+    Args:
+        df (pandas.DataFrame): The table
+        spec (dict): Spec as returned by normalize_spec()
+
+    Returns:
+        dict: Vega-Lite spec
+    """
+    df = _prepare(df, spec)
+    x, y = spec["x"], spec["y"]
+    x_type = "temporal" if pd.api.types.is_datetime64_any_dtype(df[x]) else (
+        "quantitative" if spec["type"] == "scatter" and pd.api.types.is_numeric_dtype(df[x]) else "nominal")
+    # Keep the table's (or the requested) order instead of Vega-Lite's alphabetical one
+    x_sort = None if x_type != "nominal" else list(dict.fromkeys(to_json_value(value) for value in df[x]))
+    values = [{col: to_json_value(value) for col, value in zip(df.columns, row)}
+              for row in df.itertuples(index=False, name=None)]
+
+    chart = {"$schema": VEGA_LITE_SCHEMA, "data": {"values": values},
+             "mark": {"type": VEGA_LITE_MARKS[spec["type"]], "tooltip": True}}
+    if spec["title"]:
+        chart["title"] = spec["title"]
+    if spec["type"] == "pie":
+        chart["encoding"] = {"theta": {"field": y[0], "type": "quantitative"},
+                             "color": {"field": x, "type": "nominal", "sort": x_sort}}
+        return chart
+
+    category = {"field": x, "type": x_type}
+    if x_sort is not None:
+        category["sort"] = x_sort
+    if len(y) > 1:
+        # Several measures are folded into one series per measure
+        chart["transform"] = [{"fold": y, "as": ["measure", "value"]}]
+        value = {"field": "value", "type": "quantitative"}
+        chart["encoding"] = {"color": {"field": "measure", "type": "nominal"}}
+        if spec["type"] in ("bar", "barh"):
+            chart["encoding"]["xOffset" if spec["type"] == "bar" else "yOffset"] = {"field": "measure"}
+    else:
+        value = {"field": y[0], "type": "quantitative"}
+        chart["encoding"] = {}
+    if spec["type"] == "barh":
+        chart["encoding"].update(y=category, x=value)
+    else:
+        chart["encoding"].update(x=category, y=value)
+    return chart
+
+
+def render_image(df, spec, width=8, height=5, dpi=100):
+    """
+    Draw a chart with matplotlib.
+
+    Args:
+        df (pandas.DataFrame): The table
+        spec (dict): Spec as returned by normalize_spec(), format png or svg
+        width (float): Figure width in inches
+        height (float): Figure height in inches
+        dpi (int): Resolution of PNG renders
+
+    Returns:
+        bytes: The encoded image
+
+    Raises:
+        ImportError: If matplotlib is not installed
+    """
+    from matplotlib.figure import Figure
+
+    df = _prepare(df, spec)
+    x, y = spec["x"], spec["y"]
+    figure = Figure(figsize=(width, height), dpi=dpi)
+    axes = figure.subplots()
+    labels = df[x].astype(str) if spec["type"] != "scatter" else df[x]
+
+    if spec["type"] == "pie":
+        axes.pie(df[y[0]], labels=labels, autopct="%1.1f%%", startangle=90, counterclock=False)
+        axes.set_aspect("equal")
+    elif spec["type"] in ("bar", "barh"):
+        positions = range(len(df))
+        bar_width = 0.8 / len(y)
+        for i, column in enumerate(y):
+            offsets = [position - 0.4 + bar_width * (i + 0.5) for position in positions]
+            if spec["type"] == "bar":
+                axes.bar(offsets, df[column], width=bar_width, label=column)
+            else:
+                axes.barh(offsets, df[column], height=bar_width, label=column)
+        if spec["type"] == "bar":
+            axes.set_xticks(list(positions), labels, rotation=45 if len(df) > 6 else 0, ha="right" if len(df) > 6 else "center")
+            axes.set_ylabel(y[0] if len(y) == 1 else "")
+        else:
+            axes.set_yticks(list(positions), labels)
+            # First row at the top, as in the table
+            axes.invert_yaxis()
+            axes.set_xlabel(y[0] if len(y) == 1 else "")
+    else:
+        for column in y:
+            if spec["type"] == "line":
+                axes.plot(labels, df[column], marker="o" if len(df) <= 50 else None, label=column)
+            elif spec["type"] == "area":
+                axes.fill_between(labels, df[column], alpha=0.4, label=column)
+                axes.plot(labels, df[column])
+            else:
+                axes.scatter(labels, df[column], label=column)
+        axes.set_xlabel(x)
+        axes.set_ylabel(y[0] if len(y) == 1 else "")
+        if spec["type"] != "scatter" and len(df) > 6:
+            axes.tick_params(axis="x", labelrotation=45)
+
+    if len(y) > 1:
+        axes.legend()
+    if spec["title"]:
+        axes.set_title(spec["title"])
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    # No creation date in the file, so the same chart always has the same bytes
+    metadata = {"Date": None} if spec["format"] == "svg" else {}
+    figure.savefig(buffer, format=spec["format"], metadata=metadata)
+    return buffer.getvalue()
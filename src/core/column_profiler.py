@@ -0,0 +1,84 @@
+"""
+Column statistics for dataset schemas.
+
+Profiles every column of a DataFrame in a few vectorized passes: null and
+distinct counts for all columns, min/max/mean/quartiles for numeric columns,
+date ranges for datetime columns and the most frequent values for text,
+categorical and boolean columns. The result is plain JSON-serializable data,
+so it can be stored with the schema and shown to the LLM instead of having
+the agent explore the data itself.
+"""
+import numpy as np
+import pandas as pd
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def to_json_value(value):
+    """Convert a numpy/pandas scalar to a JSON-serializable Python value."""
+    if value is None or (not isinstance(value, (list, tuple, dict)) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        # Plain dates read better without a midnight time
+        return value.date().isoformat() if value == value.normalize() else value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (int, float, bool, str)):
+        return value
+    return str(value)
+
+
+def profile_dataframe(df, top_k=5, sample_size=3):
+    """
+    Compute per-column statistics of a DataFrame.
+
+    Args:
+        df (pandas.DataFrame): The data to profile
+        top_k (int): Most frequent values kept for text, categorical and boolean columns
+        sample_size (int): Example values kept per column
+
+    Returns:
+        list: One dict per column with name, data_type, sample_values,
+              null_count and distinct_count, plus min/max/mean/quantiles
+              (numeric), min/max (dates) or top_values (other columns)
+    """
+    null_counts = df.isna().sum()
+    distinct_counts = df.nunique(dropna=True)
+
+    numeric = [col for col in df.columns
+               if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+    dates = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+
+    numeric_stats = pd.DataFrame()
+    if numeric:
+        numeric_frame = df[numeric]
+        numeric_stats = pd.concat([
+            numeric_frame.min().rename("min"),
+            numeric_frame.max().rename("max"),
+            numeric_frame.mean().rename("mean"),
+            numeric_frame.quantile(QUANTILES).T.rename(columns=lambda q: f"p{int(q * 100)}"),
+        ], axis=1)
+    date_stats = pd.DataFrame()
+    if dates:
+        date_stats = pd.concat([df[dates].min().rename("min"), df[dates].max().rename("max")], axis=1)
+
+    profiles = []
+    for col in df.columns:
+        non_null = len(df) - int(null_counts[col])
+        profile = {
+            "name": col,
+            "data_type": str(df[col].dtype),
+            "sample_values": [to_json_value(value) for value in df[col].head(sample_size).tolist()],
+            "null_count": int(null_counts[col]),
+            "distinct_count": int(distinct_counts[col]),
+        }
+        if col in numeric_stats.index:
+            profile.update({stat: to_json_value(value) for stat, value in numeric_stats.loc[col].items()})
+        elif col in date_stats.index:
+            profile.update({stat: to_json_value(value) for stat, value in date_stats.loc[col].items()})
+        elif 0 < profile["distinct_count"] < non_null:
+            # Skip identifier-like columns where every value is unique
+            counts = df[col].value_counts(dropna=True).head(top_k)
+            profile["top_values"] = [[to_json_value(value), int(count)] for value, count in counts.items()]
+        profiles.append(profile)
+    return profiles
@@ -1,41 +1,407 @@
 """
 Data Manager for handling dataset loading and access.
 """
+import hashlib
+import os
 import pandas as pd
+from src.core.config_loader import ConfigLoader
+from src.core.dataset_cache import DatasetCache
+from src.core.dataset_readers import dataset_format, read_dataset
+from src.core.dtype_optimizer import format_optimization_report, optimize_dataframe
+from src.core.partitioned_store import ingest_csv
+from src.core.rollup_cube import RollupCube
+from src.core.shared_datasets import (
+    SHARED_DIR, list_shared_datasets, publish_dataset, publish_rollup, register_partitioned_dataset
+)
 
 class DataManager:
     """Handles loading and accessing datasets."""
     
-    def __init__(self):
-        """Initialize with empty dataset storage."""
+    def __init__(self, data_config=None):
+        """
+        Initialize with empty dataset storage.
+        
+        Args:
+            data_config (dict, optional): The `data` section of system.yaml.
+                                          If None, it is read from config/system.yaml.
+        """
+        if data_config is None:
+            data_config = ConfigLoader().get_config("system").get("data", {})
+        
+        self.data_config = data_config
         self.datasets = {}
+        self.lazy_datasets = {}
+        self.paths = {}
+        self.versions = {}
+        self.fingerprints = {}
+        self.optimization_reports = {}
+        self.rollups = {}
+        # Dataset name -> hash of the rows its rollups were built from, to detect appends
+        self.rollup_row_hashes = {}
+        self.cache = None
+        if data_config.get("cache_enabled", True):
+            self.cache = DatasetCache(
+                cache_dir=data_config.get("cache_dir", os.path.join(".cache", "datasets")),
+                date_columns=data_config.get("date_columns", []),
+                date_format=data_config.get("date_format"),
+                categorical_max_ratio=data_config.get("categorical_max_ratio", 0.5)
+            )
+        
+        # Publish loaded datasets as memory-mappable files for the sandboxes
+        self.share_with_sandbox = data_config.get("share_with_sandbox", True)
+        self.shared_dir = data_config.get("shared_dir", SHARED_DIR)
     
-    def load_dataset(self, dataset_path, dataset_name=None):
+    def load_dataset(self, dataset_path, dataset_name=None, optimize=None):
         """
         Load a dataset from a file path.
         
+        CSV, TSV, Parquet, Excel and JSON-lines files are supported. They are
+        served from the columnar dataset cache when it holds a copy of the
+        current version of the file.
+        
         Args:
             dataset_path (str): Path to the dataset file
             dataset_name (str, optional): Name to refer to the dataset.
                                          If None, uses filename as name.
+            optimize (bool, optional): Convert columns to compact dtypes
+                                       (categoricals, downcast numbers, dates).
+                                       If None, uses data.optimize_dtypes from config.
         
         Returns:
             pandas.DataFrame: The loaded dataset
         """
         if dataset_name is None:
             # Extract filename without extension as dataset name
-            import os
             dataset_name = os.path.splitext(os.path.basename(dataset_path))[0]
         
-        # Simple CSV loading for now
         try:
-            df = pd.read_csv(dataset_path)
+            if optimize is None:
+                optimize = self.data_config.get("optimize_dtypes", False)
+            
+            if self.cache is not None:
+                df, report = self.cache.load(dataset_path, optimize=optimize)
+            else:
+                df = read_dataset(dataset_path)
+                report = []
+                if optimize:
+                    df, report = self._optimize(df)
+            
+            version = DatasetCache.cache_key(dataset_path)
+            if optimize:
+                version += "-optimized"
+                self.optimization_reports[dataset_name] = report
+                print(f"Optimized dtypes of dataset '{dataset_name}':\n{format_optimization_report(report)}")
+            
             self.datasets[dataset_name] = df
+            self.lazy_datasets.pop(dataset_name, None)
+            self.paths[dataset_name] = dataset_path
+            self.versions[dataset_name] = version
             print(f"Loaded dataset '{dataset_name}' with {len(df)} rows and {len(df.columns)} columns")
-            return df
         except Exception as e:
             print(f"Error loading dataset: {e}")
             return None
+        
+        if self.share_with_sandbox:
+            self.publish_dataset(dataset_name)
+        self.update_rollups(dataset_name)
+        return df
+    
+    def _optimize(self, df):
+        """Convert a dataset to compact dtypes, returning it with the per-column report."""
+        return optimize_dataframe(
+            df,
+            date_columns=self.data_config.get("date_columns", []),
+            date_format=self.data_config.get("date_format"),
+            categorical_max_ratio=self.data_config.get("categorical_max_ratio", 0.5)
+        )
+    
+    def get_optimization_report(self, dataset_name):
+        """
+        Get the per-column dtype conversions of an optimized dataset.
+        
+        Args:
+            dataset_name (str): Name of the dataset
+            
+        Returns:
+            list: Report dicts with old/new dtype and bytes saved per column
+        """
+        return self.optimization_reports.get(dataset_name, [])
+    
+    def publish_dataset(self, dataset_name):
+        """
+        Publish a loaded dataset to the shared volume so sandbox code can
+        memory-map it with load_shared_dataset() instead of parsing the file.
+        
+        Args:
+            dataset_name (str): Name of the dataset to publish
+            
+        Returns:
+            str or None: Path of the published file, None if publishing failed
+        """
+        df = self.get_dataset(dataset_name)
+        if df is None:
+            return None
+        
+        try:
+            return publish_dataset(
+                df,
+                dataset_name,
+                version=self.versions.get(dataset_name),
+                shared_dir=self.shared_dir
+            )
+        except Exception as e:
+            print(f"Could not publish dataset '{dataset_name}' to the sandbox: {e}")
+            return None
+    
+    def update_rollups(self, dataset_name):
+        """
+        Build or update the rollup cube of a dataset, if data.rollups configures one.
+        
+        When the reloaded data starts with the rows the cube was built from
+        (rows were appended to the file), only the new rows are aggregated.
+        
+        Args:
+            dataset_name (str): Name of a loaded dataset
+            
+        Returns:
+            RollupCube or None: The cube, None if not configured or building failed
+        """
+        rollup_config = self.data_config.get("rollups", {}).get(dataset_name)
+        df = self.get_dataset(dataset_name)
+        if not rollup_config or df is None:
+            return None
+        
+        try:
+            row_hashes = pd.util.hash_pandas_object(df, index=False).values
+            cube = self.rollups.get(dataset_name)
+            previous = self.rollup_row_hashes.get(dataset_name)
+            appended = (
+                cube is not None and previous is not None and len(df) >= cube.row_count
+                and hashlib.sha1(row_hashes[:cube.row_count].tobytes()).hexdigest() == previous
+            )
+            if appended:
+                new_rows = df.iloc[cube.row_count:]
+                cube.append(new_rows)
+                print(f"Updated rollups of dataset '{dataset_name}' with {len(new_rows)} appended rows")
+            else:
+                cube = RollupCube.build(
+                    df,
+                    rollup_config["dimensions"],
+                    rollup_config["measures"],
+                    max_dimensions=rollup_config.get("max_dimensions", 3)
+                )
+                print(f"Built rollups of dataset '{dataset_name}': {len(cube.table())} rows")
+            self.rollup_row_hashes[dataset_name] = hashlib.sha1(row_hashes.tobytes()).hexdigest()
+            self.rollups[dataset_name] = cube
+            if self.share_with_sandbox:
+                publish_rollup(cube, dataset_name, shared_dir=self.shared_dir)
+            return cube
+        except Exception as e:
+            print(f"Could not build rollups of dataset '{dataset_name}': {e}")
+            self.rollups.pop(dataset_name, None)
+            self.rollup_row_hashes.pop(dataset_name, None)
+            return None
+    
+    def get_rollup(self, dataset_name):
+        """
+        Retrieve the rollup cube of a dataset.
+        
+        Args:
+            dataset_name (str): Name of the dataset
+            
+        Returns:
+            RollupCube or None: The cube if one was built, None otherwise
+        """
+        return self.rollups.get(dataset_name)
+    
+    def should_stream(self, dataset_path):
+        """
+        Whether a file is too large to load at once and should be ingested instead.
+        
+        Args:
+            dataset_path (str): Path to the dataset file
+            
+        Returns:
+            bool: True for CSV files of at least data.streaming.min_file_mb
+        """
+        min_file_mb = self.data_config.get("streaming", {}).get("min_file_mb")
+        if min_file_mb is None or dataset_format(dataset_path) != "csv":
+            return False
+        try:
+            return os.path.getsize(dataset_path) >= min_file_mb * 1024 * 1024
+        except OSError:
+            return False
+    
+    def ingest_dataset(self, dataset_path, dataset_name=None, partition_by=None, chunksize=None):
+        """
+        Stream a CSV file that may not fit in memory into a partitioned
+        columnar store and register a lazy handle on it.
+        
+        The store lives in the shared directory, so sandbox code can open the
+        same data with open_shared_lazy_dataset().
+        
+        Args:
+            dataset_path (str): Path to the CSV file
+            dataset_name (str, optional): Name to refer to the dataset.
+                                         If None, uses filename as name.
+            partition_by (str, optional): Partition column, or "<date column>:year".
+                                          If None, uses data.streaming.partition_by from config.
+            chunksize (int, optional): Rows read per chunk.
+                                       If None, uses data.streaming.chunksize from config.
+        
+        Returns:
+            LazyDataset or None: Handle on the ingested data, None if ingestion failed
+        """
+        if dataset_name is None:
+            dataset_name = os.path.splitext(os.path.basename(dataset_path))[0]
+        
+        streaming_config = self.data_config.get("streaming", {})
+        if partition_by is None:
+            partition_by = streaming_config.get("partition_by")
+        if chunksize is None:
+            chunksize = streaming_config.get("chunksize", 500000)
+        
+        try:
+            version = DatasetCache.cache_key(dataset_path)
+            store_dir = os.path.join(self.shared_dir, "partitioned", dataset_name)
+            lazy_dataset = ingest_csv(
+                dataset_path,
+                store_dir,
+                partition_by=partition_by,
+                chunksize=chunksize,
+                date_columns=self.data_config.get("date_columns", []),
+                date_format=self.data_config.get("date_format"),
+                version=version
+            )
+            lazy_dataset.name = dataset_name
+            register_partitioned_dataset(dataset_name, store_dir, version=version, shared_dir=self.shared_dir)
+        except Exception as e:
+            print(f"Error ingesting dataset: {e}")
+            return None
+        
+        self.lazy_datasets[dataset_name] = lazy_dataset
+        # An in-memory copy of an older, smaller version of the file is outdated
+        for store in (self.datasets, self.optimization_reports, self.rollups, self.rollup_row_hashes):
+            store.pop(dataset_name, None)
+        self.paths[dataset_name] = dataset_path
+        self.versions[dataset_name] = version
+        print(f"Ingested dataset '{dataset_name}' into {store_dir} ({len(lazy_dataset.columns)} columns)")
+        return lazy_dataset
+    
+    def get_lazy_dataset(self, dataset_name):
+        """
+        Retrieve the lazy handle of an ingested dataset.
+        
+        Args:
+            dataset_name (str): Name of the dataset
+            
+        Returns:
+            LazyDataset or None: The handle if found, None otherwise
+        """
+        return self.lazy_datasets.get(dataset_name)
+    
+    def get_fingerprint(self, dataset_name):
+        """
+        Get a content hash of a dataset, computed once per loaded version.
+        
+        Lazy datasets are too large to hash, so their source file version
+        (path, size and modification time) is used instead.
+        
+        Args:
+            dataset_name (str): Name of the dataset
+            
+        Returns:
+            str or None: The fingerprint, None if the dataset is unknown
+        """
+        version = self.versions.get(dataset_name)
+        cached = self.fingerprints.get(dataset_name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        df = self.get_dataset(dataset_name)
+        if df is not None:
+            digest = hashlib.sha1()
+            digest.update(",".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items()).encode("utf-8"))
+            digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+            fingerprint = digest.hexdigest()[:16]
+        elif dataset_name in self.lazy_datasets:
+            fingerprint = version
+        else:
+            return None
+        
+        self.fingerprints[dataset_name] = (version, fingerprint)
+        return fingerprint
+
+    def get_schema_fingerprint(self, dataset_name):
+        """
+        Get a hash of a dataset's column names and types.
+
+        Unlike get_fingerprint(), it stays the same when the data is refreshed
+        with new rows, so analysis code written for one version can be re-run
+        on the next.
+
+        Args:
+            dataset_name (str): Name of the dataset
+
+        Returns:
+            str or None: The fingerprint, None if the dataset is unknown
+        """
+        df = self.get_dataset(dataset_name)
+        if df is not None:
+            schema = ",".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+        elif dataset_name in self.lazy_datasets:
+            schema = str(self.lazy_datasets[dataset_name].schema)
+        else:
+            return None
+        return hashlib.sha1(schema.encode("utf-8")).hexdigest()[:16]
+
+    def get_load_instructions(self, dataset_name):
+        """
+        Describe how sandbox code gets a dataset, using the fastest way available.
+        
+        Args:
+            dataset_name (str): Name of the dataset
+            
+        Returns:
+            str: Instructions with the code to load the dataset
+        """
+        if dataset_name in self.lazy_datasets and dataset_name not in self.datasets:
+            return (
+                f"The dataset is too large to load at once. Open it with `ds = open_shared_lazy_dataset('{dataset_name}')` "
+                "(from src.core.shared_datasets) and read only what you need with "
+                "`ds.scan(columns=[...], filters=[(column, op, value), ...])`."
+            )
+        published = list_shared_datasets(self.shared_dir).get(dataset_name, {})
+        if self.share_with_sandbox and dataset_name in self.versions and published.get("version") == self.versions[dataset_name]:
+            instructions = (
+                f"Load the dataset with `df = load_shared_dataset('{dataset_name}')`; it is memory-mapped "
+                "from a pre-parsed Arrow file, with dates and categoricals already converted, so it "
+                "loads instantly. Do not read the source file."
+            )
+        else:
+            instructions = (f"Load the dataset with `df = read_dataset('{self.paths.get(dataset_name)}')` "
+                            "(from src.core.dataset_readers).")
+        
+        cube = self.get_rollup(dataset_name)
+        if cube is not None:
+            instructions += (
+                f" Pre-aggregated rollups hold the {cube.describe()}. For such totals, query the SQL "
+                f"table \"{dataset_name}_rollup\" (filter on grouping_set) or, in Python, use "
+                f"`load_shared_rollup('{dataset_name}').lookup(group_by=[...], filters={{column: value}})` "
+                "instead of aggregating the full data."
+            )
+        return instructions
+    
+    def remove_dataset(self, dataset_name):
+        """
+        Forget a dataset, e.g. after its file was deleted.
+        
+        Args:
+            dataset_name (str): Name of the dataset
+        """
+        for store in (self.datasets, self.lazy_datasets, self.paths, self.versions,
+                      self.fingerprints, self.optimization_reports, self.rollups, self.rollup_row_hashes):
+            store.pop(dataset_name, None)
     
     def get_dataset(self, dataset_name):
         """
@@ -54,6 +420,8 @@ class DataManager:
         List all available datasets.
         
         Returns:
-            list: Names of available datasets
+            list: Names of available datasets, in-memory and lazy
         """
-        return list(self.datasets.keys())
\ No newline at end of file
+        return list(self.datasets.keys()) + [
+            name for name in self.lazy_datasets if name not in self.datasets
+        ]
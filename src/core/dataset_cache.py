@@ -0,0 +1,151 @@
+"""
+Columnar cache for parsed datasets.
+
+The first load of a dataset file (CSV, Excel, JSON lines, ...) parses it,
+applies dtypes (dates, categoricals) and writes the result to a Parquet file.
+Later loads read the Parquet file, which is much faster than parsing text and
+keeps the converted dtypes. Entries are keyed by the source path, size and
+modification time and by the parse options, so editing or replacing the file,
+or changing how it is parsed, invalidates the cached copy.
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from src.core.dataset_readers import read_dataset
+from src.core.dtype_optimizer import optimize_dataframe
+
+
+class DatasetCache:
+    """Caches parsed datasets as Parquet files."""
+
+    def __init__(self, cache_dir=os.path.join(".cache", "datasets"), date_columns=None,
+                 date_format=None, categorical_max_ratio=0.5):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir (str): Directory holding the cached Parquet files
+            date_columns (list, optional): Columns to parse as dates when present
+            date_format (str, optional): strftime format of the date columns;
+                                         if None, pandas infers it (day first)
+            categorical_max_ratio (float): Text columns whose share of distinct
+                                           values is below this become categoricals
+        """
+        self.cache_dir = cache_dir
+        self.date_columns = date_columns or []
+        self.date_format = date_format
+        self.categorical_max_ratio = categorical_max_ratio
+
+    @staticmethod
+    def _path_hash(dataset_path):
+        """Hash of the absolute source path, shared by all versions of the file."""
+        return hashlib.sha1(os.path.abspath(dataset_path).encode("utf-8")).hexdigest()[:12]
+
+    @staticmethod
+    def cache_key(dataset_path):
+        """
+        Build the cache key for the current version of a file.
+
+        Args:
+            dataset_path (str): Path to the source file
+
+        Returns:
+            str: Key derived from the path, size and modification time
+        """
+        stat = os.stat(dataset_path)
+        version = f"{stat.st_size}:{stat.st_mtime_ns}"
+        version_hash = hashlib.sha1(version.encode("utf-8")).hexdigest()[:12]
+        return f"{DatasetCache._path_hash(dataset_path)}-{version_hash}"
+
+    def _options_hash(self, optimize=False):
+        """Hash of the options a file is parsed with, which change the cached result."""
+        options = {
+            "date_columns": list(self.date_columns),
+            "date_format": self.date_format,
+            "categorical_max_ratio": self.categorical_max_ratio,
+            "optimize": bool(optimize),
+        }
+        return hashlib.sha1(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+    def _cache_path(self, dataset_path, optimize=False):
+        """Location of the cached copy of the current version of a file, parsed with the current options."""
+        return os.path.join(self.cache_dir,
+                            f"{self.cache_key(dataset_path)}-{self._options_hash(optimize)}.parquet")
+
+    def _remove_stale_entries(self, dataset_path):
+        """Delete cached copies of older versions of the same file and of other parse options."""
+        prefix = f"{self._path_hash(dataset_path)}-"
+        # The plain and the optimized copy of the current version are both kept
+        current = {os.path.splitext(os.path.basename(self._cache_path(dataset_path, optimize)))[0]
+                   for optimize in (False, True)}
+        for file_name in os.listdir(self.cache_dir):
+            # Entry name without .parquet, .json or the .tmp suffixes of writes in progress
+            if file_name.startswith(prefix) and file_name.split(".")[0] not in current:
+                try:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                except OSError:
+                    pass
+
+    def _parse(self, dataset_path, optimize=False):
+        """
+        Read a dataset file and convert dates and low-cardinality text columns.
+        With optimize, also detect other date columns and downcast numbers.
+        """
+        df = read_dataset(dataset_path)
+        return optimize_dataframe(
+            df,
+            date_columns=self.date_columns,
+            date_format=self.date_format,
+            categorical_max_ratio=self.categorical_max_ratio,
+            detect_dates=optimize,
+            downcast_numeric=optimize
+        )
+
+    def load(self, dataset_path, optimize=False):
+        """
+        Load a dataset file, using the cached Parquet copy when it is current.
+
+        Args:
+            dataset_path (str): Path to the dataset file
+            optimize (bool): Apply the full dtype optimization (cached separately)
+
+        Returns:
+            tuple: (pandas.DataFrame, list of per-column dtype conversion reports)
+        """
+        cache_path = self._cache_path(dataset_path, optimize)
+        # The report is written last, so an entry is only complete once it exists
+        report_path = f"{os.path.splitext(cache_path)[0]}.json"
+        if os.path.exists(cache_path) and os.path.exists(report_path):
+            try:
+                df = pd.read_parquet(cache_path)
+                with open(report_path, "r") as file:
+                    report = json.load(file)
+                return df, report
+            except Exception as e:
+                print(f"Ignoring unreadable dataset cache {cache_path}: {e}")
+
+        df, report = self._parse(dataset_path, optimize)
+
+        # Write to temporary files first so readers never see a partial entry
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        tmp_report_path = f"{report_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+            with open(tmp_report_path, "w") as file:
+                json.dump(report, file)
+            os.replace(tmp_report_path, report_path)
+            self._remove_stale_entries(dataset_path)
+        except ImportError as e:
+            print(f"Dataset cache disabled, Parquet support is not installed: {e}")
+        except Exception as e:
+            print(f"Could not write dataset cache {cache_path}: {e}")
+            for path in (tmp_path, tmp_report_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        return df, report
@@ -0,0 +1,85 @@
+"""
+Readers for the dataset file formats the application can load.
+
+Each format uses its fastest available reader: the multithreaded Arrow
+parsers for CSV and JSON lines (falling back to the pandas parsers when
+pyarrow is missing or can't handle a file), Parquet directly, and Excel
+through pandas, which is slow, so those files benefit most from the
+columnar dataset cache.
+"""
+import os
+
+import pandas as pd
+
+# File extension -> format name
+SUPPORTED_FORMATS = {
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".xlsx": "excel",
+    ".xls": "excel",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+
+
+def dataset_format(dataset_path):
+    """
+    Get the format of a dataset file from its extension.
+
+    Args:
+        dataset_path (str): Path to the dataset file
+
+    Returns:
+        str or None: Format name, None if the format is not supported
+    """
+    return SUPPORTED_FORMATS.get(os.path.splitext(dataset_path)[1].lower())
+
+
+def _read_delimited(dataset_path, separator):
+    """Read CSV/TSV with the Arrow parser, falling back to the pandas one."""
+    try:
+        return pd.read_csv(dataset_path, sep=separator, engine="pyarrow")
+    except (ImportError, ValueError) as e:
+        # Missing pyarrow, or input the Arrow parser rejects (e.g. ragged rows)
+        print(f"Fast CSV reader unavailable for {dataset_path} ({e}), using the default parser")
+        return pd.read_csv(dataset_path, sep=separator)
+
+
+def _read_jsonl(dataset_path):
+    """Read JSON lines with the Arrow parser, falling back to the pandas one."""
+    try:
+        return pd.read_json(dataset_path, lines=True, engine="pyarrow")
+    except (ImportError, ValueError) as e:
+        print(f"Fast JSON reader unavailable for {dataset_path} ({e}), using the default parser")
+        return pd.read_json(dataset_path, lines=True)
+
+
+def read_dataset(dataset_path):
+    """
+    Read a dataset file into a DataFrame.
+
+    Args:
+        dataset_path (str): Path to a CSV, TSV, Parquet, Excel or JSON-lines file
+
+    Returns:
+        pandas.DataFrame: The dataset
+
+    Raises:
+        ValueError: If the file format is not supported
+    """
+    file_format = dataset_format(dataset_path)
+    if file_format == "csv":
+        return _read_delimited(dataset_path, ",")
+    if file_format == "tsv":
+        return _read_delimited(dataset_path, "\t")
+    if file_format == "parquet":
+        return pd.read_parquet(dataset_path)
+    if file_format == "excel":
+        # First sheet only; requires openpyxl (xlsx) or xlrd (xls)
+        return pd.read_excel(dataset_path)
+    if file_format == "jsonl":
+        return _read_jsonl(dataset_path)
+    raise ValueError(f"Unsupported dataset format: {dataset_path} "
+                     f"(supported: {', '.join(sorted(SUPPORTED_FORMATS))})")
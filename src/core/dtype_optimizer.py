@@ -0,0 +1,150 @@
+"""
+Dtype optimization for loaded datasets.
+
+Profiles each column and converts it to a more compact dtype: low-cardinality
+text becomes categorical, date-like text becomes datetime64 and numeric columns
+are downcast to the smallest type that holds their values without loss.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Number of values checked when guessing whether a text column holds dates
+DATE_SAMPLE_SIZE = 100
+
+NULLABLE_INT_TYPES = ["Int8", "Int16", "Int32", "Int64"]
+
+
+def _is_text(series):
+    """Return True for plain text columns (object or string dtype, not categorical)."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    return pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)
+
+
+def _parse_dates(series, date_format=None):
+    """Convert a series to datetime64, raising ValueError if it doesn't parse."""
+    if date_format:
+        return pd.to_datetime(series, format=date_format)
+    return pd.to_datetime(series, dayfirst=True)
+
+
+def _looks_like_dates(series, date_format=None):
+    """Return True if a sample of the non-null values parses as dates."""
+    sample = series.dropna().head(DATE_SAMPLE_SIZE)
+    if sample.empty or not all(isinstance(value, str) for value in sample):
+        return False
+    # Plain numbers would happily parse as dates, so require a separator
+    if not sample.str.contains(r"[-/.:]", regex=True).all():
+        return False
+    try:
+        with warnings.catch_warnings():
+            # Format inference warnings are expected while probing arbitrary text
+            warnings.simplefilter("ignore", UserWarning)
+            _parse_dates(sample, date_format)
+        return True
+    except (ValueError, TypeError, OverflowError):
+        return False
+
+
+def _downcast_float(series):
+    """Downcast a float column, converting integral values to (nullable) integers."""
+    values = series.dropna()
+    if values.empty:
+        return series
+    if np.array_equal(values, np.floor(values)):
+        if not series.isna().any():
+            return pd.to_numeric(series, downcast="integer")
+        for dtype in NULLABLE_INT_TYPES:
+            info = np.iinfo(dtype.lower())
+            if values.min() >= info.min and values.max() <= info.max:
+                return series.astype(dtype)
+    # Only narrow to float32 when it round-trips exactly (e.g. not for currency amounts)
+    narrowed = series.astype(np.float32)
+    if np.array_equal(narrowed.astype(series.dtype), series, equal_nan=True):
+        return narrowed
+    return series
+
+
+def optimize_dataframe(df, date_columns=None, date_format=None, categorical_max_ratio=0.5,
+                       detect_dates=True, downcast_numeric=True):
+    """
+    Convert columns of a DataFrame to compact dtypes.
+
+    Args:
+        df (pandas.DataFrame): The dataset to optimize (not modified)
+        date_columns (list, optional): Columns that always get parsed as dates
+        date_format (str, optional): strftime format of the date columns
+        categorical_max_ratio (float): Text columns whose share of distinct
+                                       values is below this become categoricals
+        detect_dates (bool): Also parse other text columns that look like dates
+        downcast_numeric (bool): Downcast integer and float columns
+
+    Returns:
+        tuple: (optimized DataFrame, list of per-column report dicts with the
+                old and new dtype, bytes before and after and bytes saved)
+    """
+    df = df.copy()
+    date_columns = set(date_columns or [])
+    row_count = max(len(df), 1)
+    report = []
+
+    for col in df.columns:
+        series = df[col]
+        bytes_before = int(series.memory_usage(index=False, deep=True))
+        converted = series
+
+        if _is_text(series):
+            if col in date_columns or (detect_dates and _looks_like_dates(series, date_format)):
+                try:
+                    converted = _parse_dates(series, date_format)
+                except (ValueError, TypeError, OverflowError) as e:
+                    print(f"Could not parse dates in column '{col}', keeping it as text: {e}")
+            if converted is series and series.nunique(dropna=True) / row_count < categorical_max_ratio:
+                converted = series.astype("category")
+        elif downcast_numeric and pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_extension_array_dtype(series.dtype):
+            converted = pd.to_numeric(series, downcast="integer")
+        elif downcast_numeric and pd.api.types.is_float_dtype(series.dtype):
+            converted = _downcast_float(series)
+
+        if converted is series:
+            continue
+
+        df[col] = converted
+        bytes_after = int(converted.memory_usage(index=False, deep=True))
+        report.append({
+            "column": str(col),
+            "from_dtype": str(series.dtype),
+            "to_dtype": str(converted.dtype),
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_saved": bytes_before - bytes_after,
+        })
+
+    return df, report
+
+
+def format_optimization_report(report):
+    """
+    Format a report from optimize_dataframe() as a readable table.
+
+    Args:
+        report (list): Per-column report dicts
+
+    Returns:
+        str: One line per converted column plus a total
+    """
+    if not report:
+        return "No columns were converted."
+
+    lines = []
+    for entry in report:
+        lines.append(
+            f"- {entry['column']}: {entry['from_dtype']} -> {entry['to_dtype']}, "
+            f"{entry['bytes_before']:,} -> {entry['bytes_after']:,} bytes "
+            f"(saved {entry['bytes_saved']:,})"
+        )
+    total_saved = sum(entry["bytes_saved"] for entry in report)
+    lines.append(f"Total saved: {total_saved:,} bytes")
+    return "\n".join(lines)
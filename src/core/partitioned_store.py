@@ -0,0 +1,277 @@
+"""
+Partitioned columnar storage for datasets that don't fit in memory.
+
+CSV files are streamed in chunks into a Hive-partitioned Parquet directory.
+A LazyDataset handle reads from it on demand, pushing column selection and
+row filters down to the Parquet scan so that only the needed partitions,
+row groups and columns are read.
+
+This module is also imported inside the sandbox, so it must only depend on
+pandas and pyarrow.
+"""
+import json
+import os
+import re
+import shutil
+
+import pandas as pd
+
+METADATA_FILE = "_ingest.json"
+
+
+def _derived_column_name(column, part):
+    """Name of the partition column derived from a date column, e.g. order_date_year."""
+    base = re.sub(r"[^0-9a-zA-Z]+", "_", column).strip("_").lower()
+    return f"{base}_{part}"
+
+
+def _widen_type(current, other):
+    """
+    Narrowest Arrow type holding values of both types.
+
+    Mixed integers and floats become float64, anything else that differs
+    becomes a string; null (an empty column) takes the other type.
+    """
+    import pyarrow as pa
+
+    if current.equals(other) or pa.types.is_null(other):
+        return current
+    if pa.types.is_null(current):
+        return other
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(check(current) for check in numeric) and any(check(other) for check in numeric):
+        return pa.float64()
+    return pa.string()
+
+
+def _widen_schema(schema, other):
+    """Schema whose fields hold the values of both schemas, in the order of the first."""
+    import pyarrow as pa
+
+    if schema is None:
+        return pa.schema([field.remove_metadata() for field in other]).remove_metadata()
+    return pa.schema([
+        field.with_type(_widen_type(field.type, other.field(field.name).type))
+        for field in schema
+    ])
+
+
+def _rewrite_files(paths, schema):
+    """Cast Parquet files written with an older schema to a wider one, in place."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for path in paths:
+        table = pq.read_table(path)
+        # Partition columns are stored in the directory names, not in the files
+        target = [schema.field(name) for name in table.schema.names]
+        if all(field.type.equals(table.schema.field(field.name).type) for field in target):
+            continue
+        temporary_path = f"{path}.tmp"
+        pq.write_table(table.cast(pa.schema(target)), temporary_path)
+        os.replace(temporary_path, path)
+
+
+def _parse_partition_spec(partition_by):
+    """
+    Split a partition spec into (source column, date part or None).
+
+    "Region" partitions by the column itself, "Order Date:year" by the year of a date column.
+    """
+    if partition_by and ":" in partition_by:
+        column, part = partition_by.rsplit(":", 1)
+        if part not in ("year", "month"):
+            raise ValueError(f"Unsupported date partition '{part}', use year or month")
+        return column, part
+    return partition_by, None
+
+
+class LazyDataset:
+    """Handle on a partitioned dataset that reads data only when asked to."""
+
+    def __init__(self, path, name=None):
+        """
+        Open a partitioned dataset directory.
+
+        Args:
+            path (str): Directory written by ingest_csv()
+            name (str, optional): Dataset name, used for display
+        """
+        import pyarrow.dataset as ds
+
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self._dataset = ds.dataset(path, format="parquet", partitioning="hive",
+                                   exclude_invalid_files=True)
+        self.metadata = {}
+        metadata_path = os.path.join(path, METADATA_FILE)
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r") as file:
+                self.metadata = json.load(file)
+
+    @property
+    def columns(self):
+        """List of column names, including partition columns."""
+        return list(self._dataset.schema.names)
+
+    @property
+    def schema(self):
+        """Arrow schema of the dataset."""
+        return self._dataset.schema
+
+    @property
+    def arrow_dataset(self):
+        """Underlying pyarrow Dataset, e.g. for query engines that scan Arrow directly."""
+        return self._dataset
+
+    @staticmethod
+    def _to_expression(filters):
+        """Convert DNF filter tuples, e.g. [("Region", "=", "West")], to an Arrow expression."""
+        if filters is None:
+            return None
+        from pyarrow.parquet import filters_to_expression
+        return filters_to_expression(filters)
+
+    def scan(self, columns=None, filters=None):
+        """
+        Read the selected columns of the rows matching the filters.
+
+        Args:
+            columns (list, optional): Columns to read, None reads all
+            filters (list, optional): Filters in DNF form, e.g.
+                [("order_date_year", ">=", 2017), ("Region", "in", ["East", "West"])]
+                or a list of such lists to OR them
+
+        Returns:
+            pandas.DataFrame: The matching data
+        """
+        table = self._dataset.to_table(columns=columns, filter=self._to_expression(filters))
+        return table.to_pandas()
+
+    def iter_batches(self, columns=None, filters=None, batch_size=100_000):
+        """
+        Stream the matching data as DataFrames of at most batch_size rows.
+
+        Args:
+            columns (list, optional): Columns to read, None reads all
+            filters (list, optional): Filters in DNF form (see scan())
+            batch_size (int): Maximum rows per DataFrame
+
+        Yields:
+            pandas.DataFrame: Consecutive batches of the matching data
+        """
+        scanner = self._dataset.scanner(columns=columns, filter=self._to_expression(filters),
+                                        batch_size=batch_size)
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def count_rows(self, filters=None):
+        """Count the rows matching the filters without materializing them."""
+        return self._dataset.count_rows(filter=self._to_expression(filters))
+
+    def head(self, n=5, columns=None):
+        """Read the first n rows."""
+        return self._dataset.head(n, columns=columns).to_pandas()
+
+    def __len__(self):
+        """Total number of rows."""
+        return self.count_rows()
+
+    def __repr__(self):
+        return f"LazyDataset(name={self.name!r}, columns={len(self.columns)}, path={self.path!r})"
+
+
+def ingest_csv(csv_path, store_dir, partition_by=None, chunksize=500_000, date_columns=None,
+               date_format=None, version=None):
+    """
+    Stream a CSV file into a partitioned Parquet store.
+
+    The file is read chunk by chunk, so memory use is bounded by the chunk size
+    rather than the file size. When a later chunk doesn't fit the column types
+    seen so far (e.g. an id column that looked numeric), the types are widened
+    and the chunks already written are rewritten. The store is built next to
+    the target directory and swapped in at the end; an existing store with the
+    same version is reused.
+
+    Args:
+        csv_path (str): Source CSV file
+        store_dir (str): Directory to write the partitioned dataset to
+        partition_by (str, optional): Column to partition by, or "<date column>:year"
+                                      / "<date column>:month" for a derived date part
+        chunksize (int): Rows per chunk
+        date_columns (list, optional): Columns to parse as dates
+        date_format (str, optional): strftime format of the date columns
+        version (str, optional): Version key of the source file
+
+    Returns:
+        LazyDataset: Handle on the written store
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    source_column, date_part = _parse_partition_spec(partition_by)
+    partition_column = _derived_column_name(source_column, date_part) if date_part else source_column
+
+    metadata_path = os.path.join(store_dir, METADATA_FILE)
+    if version is not None and os.path.exists(metadata_path):
+        with open(metadata_path, "r") as file:
+            metadata = json.load(file)
+        if metadata.get("version") == version and metadata.get("partition_by") == partition_column:
+            return LazyDataset(store_dir)
+
+    date_columns = list(date_columns or [])
+    if date_part and source_column not in date_columns:
+        date_columns.append(source_column)
+
+    tmp_dir = f"{store_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    schema = None
+    written_files = []
+    row_count = 0
+    try:
+        # low_memory=False parses each chunk at once, so a column has one type within a chunk
+        for index, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunksize, low_memory=False)):
+            for col in date_columns:
+                if col in chunk.columns:
+                    chunk[col] = pd.to_datetime(chunk[col], format=date_format, errors="coerce")
+            if date_part == "year":
+                chunk[partition_column] = chunk[source_column].dt.year.astype("Int32")
+            elif date_part == "month":
+                chunk[partition_column] = chunk[source_column].dt.strftime("%Y-%m")
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            widened = _widen_schema(schema, table.schema)
+            if schema is not None and not widened.equals(schema):
+                _rewrite_files(written_files, widened)
+            schema = widened
+            table = table.cast(schema)
+
+            ds.write_dataset(
+                table,
+                tmp_dir,
+                format="parquet",
+                partitioning=[partition_column] if partition_column else None,
+                partitioning_flavor="hive" if partition_column else None,
+                basename_template=f"chunk-{index:05d}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+                file_visitor=lambda written: written_files.append(written.path),
+            )
+            row_count += len(chunk)
+
+        with open(os.path.join(tmp_dir, METADATA_FILE), "w") as file:
+            json.dump({
+                "source": os.path.abspath(csv_path),
+                "version": version,
+                "partition_by": partition_column,
+                "rows": row_count,
+            }, file, indent=2)
+
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.replace(tmp_dir, store_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return LazyDataset(store_dir)
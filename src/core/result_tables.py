@@ -0,0 +1,105 @@
+"""
+Result tables passed from the tools to the agents, the service and the UI.
+
+A table payload is plain JSON: name, columns (each with a name and a type:
+integer, number, boolean, datetime, duration, category or string), rows
+(lists of values, at most a fixed number), row_count and truncated. The
+sandbox kernel builds the same payloads for the DataFrames that code cells
+show, and writes the complete table as an Arrow IPC file when only the
+first rows fit; read_table_page() serves further rows from such a file.
+The agents only get a short text preview of a table, not all its rows.
+"""
+import json
+
+import pandas as pd
+
+
+def column_type(dtype):
+    """
+    Get the type name of a column in a table payload.
+
+    Args:
+        dtype: pandas/numpy dtype of the column
+
+    Returns:
+        str: integer, number, boolean, datetime, duration, category or string
+    """
+    if str(dtype) == "category":
+        return "category"
+    return {"b": "boolean", "i": "integer", "u": "integer", "f": "number",
+            "M": "datetime", "m": "duration"}.get(dtype.kind, "string")
+
+
+def _rows(df):
+    """JSON-compatible rows of a DataFrame, dates as ISO strings."""
+    return json.loads(df.to_json(orient="values", date_format="iso", default_handler=str))
+
+
+def encode_table(df, name, max_rows):
+    """
+    Build the payload of a result table.
+
+    Args:
+        df (pandas.DataFrame): The table
+        name (str): Name shown with the table
+        max_rows (int): Rows included at most
+
+    Returns:
+        dict: The table payload
+    """
+    df = df.rename(columns=str)
+    return {
+        "name": name,
+        "columns": [{"name": col, "type": column_type(dtype)} for col, dtype in zip(df.columns, df.dtypes)],
+        "rows": _rows(df.head(max_rows)),
+        "row_count": len(df),
+        "truncated": len(df) > max_rows,
+    }
+
+
+def format_table_preview(table, max_rows=10):
+    """
+    Describe a table payload in a few lines of text, e.g. for an agent.
+
+    Args:
+        table (dict): The table payload
+        max_rows (int): Rows shown at most
+
+    Returns:
+        str: Name, size and the first rows
+    """
+    names = [col["name"] for col in table["columns"]]
+    shown = table["rows"][:max_rows]
+    header = f"[Table '{table['name']}': {table['row_count']:,} rows x {len(names)} columns"
+    if len(shown) < table["row_count"]:
+        header += f", first {len(shown)} shown here; the user sees the complete table"
+    header += "]"
+    if not shown:
+        return f"{header}\n(no rows; columns: {', '.join(names)})"
+    return f"{header}\n{pd.DataFrame(shown, columns=names).to_string(index=False)}"
+
+
+def read_table_page(path, offset=0, limit=100):
+    """
+    Read rows of a table written as an Arrow IPC file, without loading the rest.
+
+    Args:
+        path (str): Arrow IPC (Feather v2) file
+        offset (int): First row
+        limit (int): Rows read at most
+
+    Returns:
+        dict: columns, rows, offset and row_count of the whole table
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        page = table.slice(offset, limit).to_pandas()
+        row_count = table.num_rows
+    return {
+        "columns": [{"name": str(col), "type": column_type(dtype)} for col, dtype in zip(page.columns, page.dtypes)],
+        "rows": _rows(page),
+        "offset": offset,
+        "row_count": row_count,
+    }
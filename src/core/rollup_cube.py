@@ -0,0 +1,249 @@
+"""
+Pre-aggregated rollups of a dataset (a small OLAP cube).
+
+The measures of a dataset are aggregated (sum, count, min, max) once at the
+finest grain of a set of dimensions, such as Region, Category and the month
+of the order date. Every combination of up to max_dimensions of those
+dimensions is then rolled up from that base instead of the raw rows, and
+the results are kept in one table with a grouping_set column naming the
+grouped dimensions. Totals by those dimensions become lookups in a table whose
+size depends on the number of distinct dimension values, not on the number
+of rows, instead of scans of the whole dataset.
+
+All aggregates are additive, so appended rows are aggregated on their own and
+merged into the base.
+
+This module is also imported inside the sandbox, so it must only depend on
+pandas and pyarrow.
+"""
+import itertools
+import json
+
+import pandas as pd
+
+from src.core.partitioned_store import _derived_column_name, _parse_partition_spec
+
+GROUPING_COLUMN = "grouping_set"
+ROWS_COLUMN = "row_count"
+AGGREGATES = ("sum", "count", "min", "max")
+# How partial aggregates of each kind are combined
+MERGE_AGGREGATES = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+METADATA_KEY = b"rollup_cube"
+
+
+class RollupCube:
+    """Rollups of measures by every small combination of a set of dimensions."""
+
+    def __init__(self, dimensions, measures, max_dimensions=3):
+        """
+        Args:
+            dimensions (list): Columns to group by, or "<date column>:year" /
+                               "<date column>:month" for a part of a date
+            measures (list): Numeric columns to aggregate
+            max_dimensions (int): Largest number of dimensions grouped together
+        """
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+        self.max_dimensions = max_dimensions
+        self.row_count = 0
+        # Aggregates at the finest grain, the rollups are computed from it
+        self._base = None
+        self._table = None
+
+    @property
+    def dimension_columns(self):
+        """Names of the dimension columns in the rollup table, e.g. order_date_month."""
+        columns = []
+        for dimension in self.dimensions:
+            column, part = _parse_partition_spec(dimension)
+            columns.append(_derived_column_name(column, part) if part else column)
+        return columns
+
+    def _column_for(self, dimension):
+        """Rollup table column of a dimension given by spec or column name."""
+        if dimension in self.dimension_columns:
+            return dimension
+        if dimension in self.dimensions:
+            return self.dimension_columns[self.dimensions.index(dimension)]
+        raise KeyError(f"'{dimension}' is not a dimension of the cube ({', '.join(self.dimensions)})")
+
+    def _aggregate_rows(self, df):
+        """Aggregate raw rows at the finest grain of the dimensions."""
+        keys = {}
+        for dimension, name in zip(self.dimensions, self.dimension_columns):
+            column, part = _parse_partition_spec(dimension)
+            if part == "year":
+                keys[name] = df[column].dt.year.astype("Int32")
+            elif part == "month":
+                keys[name] = df[column].dt.strftime("%Y-%m")
+            else:
+                keys[name] = df[column]
+        frame = pd.DataFrame(keys)
+        frame[ROWS_COLUMN] = 1
+        aggregations = {ROWS_COLUMN: (ROWS_COLUMN, "sum")}
+        for measure in self.measures:
+            frame[measure] = df[measure]
+            for aggregate in AGGREGATES:
+                aggregations[f"{measure}_{aggregate}"] = (measure, aggregate)
+        return frame.groupby(list(keys), observed=True, dropna=False).agg(**aggregations).reset_index()
+
+    def _merge(self, partials, group_by):
+        """Combine partial aggregates, grouped by some of the dimension columns."""
+        aggregations = {ROWS_COLUMN: (ROWS_COLUMN, "sum")}
+        for measure in self.measures:
+            for aggregate in AGGREGATES:
+                name = f"{measure}_{aggregate}"
+                aggregations[name] = (name, MERGE_AGGREGATES[aggregate])
+        if not group_by:
+            return pd.DataFrame({name: [partials[name].agg(function)] for name, (_, function) in aggregations.items()})
+        return partials.groupby(list(group_by), observed=True, dropna=False).agg(**aggregations).reset_index()
+
+    @classmethod
+    def build(cls, df, dimensions, measures, max_dimensions=3):
+        """
+        Build the cube of a dataset.
+
+        Args:
+            df (pandas.DataFrame): The dataset
+            dimensions (list): Dimension columns or date part specs
+            measures (list): Numeric columns to aggregate
+            max_dimensions (int): Largest number of dimensions grouped together
+
+        Returns:
+            RollupCube: The built cube
+        """
+        cube = cls(dimensions, measures, max_dimensions)
+        cube._base = cube._aggregate_rows(df)
+        cube.row_count = len(df)
+        return cube
+
+    def append(self, new_rows):
+        """
+        Add rows appended to the dataset, aggregating only the new rows.
+
+        Args:
+            new_rows (pandas.DataFrame): The appended rows
+        """
+        if new_rows.empty:
+            return
+        combined = pd.concat([self._base, self._aggregate_rows(new_rows)], ignore_index=True)
+        self._base = self._merge(combined, self.dimension_columns)
+        self.row_count += len(new_rows)
+        self._table = None
+
+    def grouping_sets(self):
+        """All combinations of up to max_dimensions dimension columns, the grand total included."""
+        columns = self.dimension_columns
+        return [group for size in range(min(self.max_dimensions, len(columns)) + 1)
+                for group in itertools.combinations(columns, size)]
+
+    def table(self):
+        """
+        Get all rollups as one table.
+
+        Returns:
+            pandas.DataFrame: One row per group of every grouping set, with the
+                              grouped dimension columns, grouping_set (the grouped
+                              columns joined by commas, in cube order), row_count and
+                              <measure>_sum/_count/_min/_max columns
+        """
+        if self._table is None:
+            parts = []
+            for group in self.grouping_sets():
+                rollup = self._merge(self._base, group)
+                rollup[GROUPING_COLUMN] = ",".join(group)
+                parts.append(rollup)
+            table = pd.concat(parts, ignore_index=True)
+            ordered = [GROUPING_COLUMN] + self.dimension_columns + [ROWS_COLUMN]
+            self._table = table[ordered + [col for col in table.columns if col not in ordered]]
+        return self._table
+
+    def lookup(self, group_by=(), filters=None):
+        """
+        Get the aggregates of the measures by some dimensions, without scanning the dataset.
+
+        Args:
+            group_by (list): Dimensions to group by (column names or date part specs)
+            filters (dict, optional): Dimension -> value or list of accepted values
+
+        Returns:
+            pandas.DataFrame or None: The grouped dimensions, row_count and
+                                      <measure>_sum/_count/_min/_max/_mean columns;
+                                      None if more dimensions are involved than the
+                                      cube materializes
+        """
+        group_by = [self._column_for(dimension) for dimension in group_by]
+        filters = {self._column_for(dimension): value for dimension, value in (filters or {}).items()}
+        needed = set(group_by) | set(filters)
+        if len(needed) > self.max_dimensions:
+            return None
+
+        # The grouping set with exactly the needed columns, in cube order
+        grouping_set = ",".join(col for col in self.dimension_columns if col in needed)
+        table = self.table()
+        rows = table[table[GROUPING_COLUMN] == grouping_set]
+        for column, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            rows = rows[rows[column].isin(values)]
+
+        result = self._merge(rows, group_by) if filters else rows[group_by + [
+            col for col in table.columns if col not in self.dimension_columns and col != GROUPING_COLUMN
+        ]].reset_index(drop=True)
+        for measure in self.measures:
+            result[f"{measure}_mean"] = result[f"{measure}_sum"] / result[f"{measure}_count"]
+        return result
+
+    def describe(self):
+        """
+        Describe the cube, e.g. for agent instructions.
+
+        Returns:
+            str: Measures, dimensions and how grouping sets are named
+        """
+        return (
+            f"sum, count, min, max and mean of {', '.join(self.measures)} by any combination of up to "
+            f"{self.max_dimensions} of the columns {', '.join(self.dimension_columns)} "
+            f"(grouping_set lists the grouped columns comma-separated, in that order; "
+            f"'' is the grand total)"
+        )
+
+    def save(self, path):
+        """
+        Write the rollup table to an uncompressed Arrow file that can be memory-mapped.
+
+        Args:
+            path (str): Destination file
+        """
+        import pyarrow as pa
+        from pyarrow import feather
+
+        table = pa.Table.from_pandas(self.table(), preserve_index=False)
+        metadata = {
+            "dimensions": self.dimensions,
+            "measures": self.measures,
+            "max_dimensions": self.max_dimensions,
+            "row_count": self.row_count,
+        }
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               METADATA_KEY: json.dumps(metadata).encode("utf-8")})
+        feather.write_feather(table, path, compression="uncompressed")
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open a cube written by save(). Loaded cubes support lookup() but not append().
+
+        Args:
+            path (str): Arrow file
+
+        Returns:
+            RollupCube: The cube
+        """
+        import pyarrow as pa
+
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        metadata = json.loads(table.schema.metadata[METADATA_KEY])
+        cube = cls(metadata["dimensions"], metadata["measures"], metadata["max_dimensions"])
+        cube.row_count = metadata["row_count"]
+        cube._table = table.to_pandas()
+        return cube
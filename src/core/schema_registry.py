@@ -1,43 +1,133 @@
 """
 Schema Registry for storing and retrieving dataset metadata.
+
+Schemas include per-column statistics (nulls, distinct values, ranges,
+quartiles, most frequent values), so the agents know the data without
+exploring it first. Profiling a large dataset takes a while, so schemas are
+stored on disk per dataset fingerprint and reused until the data changes.
+
+For wide tables, the description given for a question is kept within a
+token budget: the columns most relevant to the question are described in
+full and the others only named. Agents can look up the rest with the Schema
+Lookup tool, which uses describe_columns().
 """
+import json
+import os
+import re
+from src.core.column_profiler import profile_dataframe
+from src.core.config_loader import ConfigLoader
+from src.core.schema_summarizer import ColumnRanker, estimate_tokens
 
 class SchemaRegistry:
     """Manages dataset schema information."""
     
-    def __init__(self):
-        """Initialize with empty schema storage."""
+    def __init__(self, schema_config=None, embedder=None):
+        """
+        Initialize with empty schema storage.
+        
+        Args:
+            schema_config (dict, optional): The `schema` section of system.yaml.
+                                            If None, it is read from config/system.yaml.
+            embedder (optional): Embedder used to rank columns by relevance to a question,
+                                 in addition to keyword matching
+        """
+        if schema_config is None:
+            schema_config = ConfigLoader().get_config("system").get("schema", {})
+        
         self.schemas = {}
+        self.top_k = schema_config.get("top_values", 5)
+        self.cache_dir = None
+        if schema_config.get("cache_enabled", True):
+            self.cache_dir = schema_config.get("cache_dir", os.path.join(".cache", "schemas"))
+        
+        # Approximate tokens a schema description for a question may take, None for no limit
+        self.token_budget = schema_config.get("token_budget", 1500)
+        self.ranker = ColumnRanker(embedder)
+    
+    def _cache_path(self, dataset_name, fingerprint):
+        """Location of the stored schema of one version of a dataset."""
+        return os.path.join(self.cache_dir, f"{dataset_name}-{fingerprint}.json")
+    
+    def _load_cached(self, dataset_name, fingerprint):
+        """Read a stored schema, None if there is none or it is unreadable."""
+        try:
+            with open(self._cache_path(dataset_name, fingerprint), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
     
-    def register_schema(self, dataset_name, dataframe):
+    def _store(self, schema, fingerprint):
+        """Write a schema to disk, replacing those of older versions of the dataset."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Exactly this dataset's files: "sales-<fingerprint>.json" must not match "sales-2024-<fingerprint>.json"
+        stored = re.compile(re.escape(schema["table_name"]) + r"-[0-9a-f]{16}\.json")
+        current = os.path.basename(self._cache_path(schema["table_name"], fingerprint))
+        for file_name in os.listdir(self.cache_dir):
+            if stored.fullmatch(file_name) and file_name != current:
+                try:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                except OSError:
+                    pass
+        
+        # Write to a temporary file first so readers never see a partial schema
+        path = self._cache_path(schema["table_name"], fingerprint)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(schema, f)
+        os.replace(temporary_path, path)
+    
+    def register_schema(self, dataset_name, dataframe, row_count=None, access_note=None, fingerprint=None):
         """
-        Extract and store basic schema information from dataframe.
+        Extract and store schema information and column statistics from dataframe.
         
         Args:
             dataset_name (str): Name of the dataset
             dataframe (pandas.DataFrame): The dataset to extract schema from
+                                          (a sample for datasets too large to load)
+            row_count (int, optional): Total rows, if dataframe is only a sample
+            access_note (str, optional): How analysis code should access the data
+            fingerprint (str, optional): Version of the data (DataManager.get_fingerprint()).
+                                         If given, the schema is stored on disk and reused
+                                         for the same version instead of profiling again.
             
         Returns:
             dict: The extracted schema information
         """
+        use_cache = self.cache_dir is not None and fingerprint is not None
+        if use_cache:
+            schema = self._load_cached(dataset_name, fingerprint)
+            if schema is not None and schema.get("access_note") == access_note:
+                print(f"Loaded stored schema of dataset '{dataset_name}'")
+                self.schemas[dataset_name] = schema
+                return schema
+        
         schema = {
             "table_name": dataset_name,
-            "row_count": len(dataframe),
-            "columns": []
+            "row_count": len(dataframe) if row_count is None else row_count,
+            "profiled_rows": len(dataframe),
+            "columns": profile_dataframe(dataframe, top_k=self.top_k)
         }
+        if access_note:
+            schema["access_note"] = access_note
         
-        # Get basic column information
-        for col in dataframe.columns:
-            col_info = {
-                "name": col,
-                "data_type": str(dataframe[col].dtype),
-                "sample_values": dataframe[col].head(3).tolist()
-            }
-            schema["columns"].append(col_info)
+        if use_cache:
+            try:
+                self._store(schema, fingerprint)
+            except OSError as e:
+                print(f"Could not store schema of dataset '{dataset_name}': {e}")
         
         self.schemas[dataset_name] = schema
         return schema
     
+    def remove_schema(self, dataset_name):
+        """
+        Forget the schema of a dataset (the stored copy is kept for when it returns).
+        
+        Args:
+            dataset_name (str): Name of the dataset
+        """
+        self.schemas.pop(dataset_name, None)
+    
     def get_schema(self, dataset_name):
         """
         Retrieve schema for a dataset.
@@ -50,12 +140,15 @@ class SchemaRegistry:
         """
         return self.schemas.get(dataset_name)
     
-    def format_schema_for_llm(self, dataset_name):
+    def format_schema_for_llm(self, dataset_name, question=None):
         """
         Format schema information for LLM context.
         
         Args:
             dataset_name (str): Name of the dataset
+            question (str, optional): The question the schema is needed for. If given and
+                                      the full description exceeds the token budget, only
+                                      the columns most relevant to it are described.
             
         Returns:
             str: Formatted schema information
@@ -64,12 +157,114 @@ class SchemaRegistry:
         if not schema:
             return "Schema not found."
         
+        header = self._format_header(schema)
+        full = header + "Columns:\n" + "".join(self._format_column(col) for col in schema["columns"])
+        if question is None or self.token_budget is None or estimate_tokens(full) <= self.token_budget:
+            return full
+        return self._summarize(schema, question, header)
+    
+    def _format_header(self, schema):
+        """Describe the dataset as a whole: name, size and how to access it."""
         formatted = f"Dataset: {schema['table_name']}\n"
         formatted += f"Total Rows: {schema['row_count']}\n\n"
-        formatted += "Columns:\n"
+        if schema.get("access_note"):
+            formatted += f"Data Access: {schema['access_note']}\n\n"
+        profiled_rows = schema.get("profiled_rows", schema["row_count"])
+        if profiled_rows != schema["row_count"]:
+            formatted += f"Column statistics are computed on a sample of {profiled_rows} rows.\n\n"
+        return formatted
+    
+    def _format_column(self, col):
+        """Describe one column in one line."""
+        return f"- {col['name']} ({col['data_type']}): {self._format_column_stats(col)}\n"
+    
+    def _summarize(self, schema, question, header):
+        """
+        Describe the columns most relevant to a question in full and list the
+        others by name, within the token budget.
+        """
+        ranked = self.ranker.rank(schema, question)
+        note = (
+            f"The dataset has {len(ranked)} columns. The {{detailed}} most relevant to the question "
+            "are described below; the others are only listed. Use the Schema Lookup tool to get the "
+            "statistics of any other column.\n\n"
+        )
+        more = ", and {remaining} more (search them with the Schema Lookup tool)\n"
+        budget = self.token_budget - estimate_tokens(header + note + "Columns:\n\nOther columns: " + more)
+        # Keep room to list at least some of the other columns by name
+        names_reserve = min(len(ranked), 50) * 5
         
-        for col in schema["columns"]:
-            sample_str = ", ".join(str(v) for v in col["sample_values"])
-            formatted += f"- {col['name']} ({col['data_type']}): {sample_str}\n"
+        detailed = []
+        for col in ranked:
+            cost = estimate_tokens(self._format_column(col))
+            if detailed and cost > budget - names_reserve:
+                break
+            detailed.append(self._format_column(col))
+            budget -= cost
+        
+        formatted = header + note.format(detailed=len(detailed)) + "Columns:\n" + "".join(detailed)
+        remaining = ranked[len(detailed):]
+        if remaining:
+            names = []
+            for col in remaining:
+                name = f"{col['name']} ({col['data_type']})"
+                budget -= estimate_tokens(name + ", ")
+                if budget < 0:
+                    break
+                names.append(name)
+            formatted += "\nOther columns: " + ", ".join(names)
+            if len(names) < len(remaining):
+                formatted += more.format(remaining=len(remaining) - len(names))
+            else:
+                formatted += "\n"
+        return formatted
+    
+    def describe_columns(self, dataset_name, names, limit=50):
+        """
+        Describe the columns of a dataset matching names or keywords.
+        
+        Args:
+            dataset_name (str): Name of the dataset
+            names (list): Column names, or parts of names, to look up (case-insensitive)
+            limit (int): Maximum number of columns described
+            
+        Returns:
+            str: One line per matching column, or a message if none matched
+        """
+        schema = self.get_schema(dataset_name)
+        if not schema:
+            return f"Schema of dataset '{dataset_name}' not found. Available: {', '.join(self.schemas) or 'none'}"
+        
+        terms = [name.strip().lower() for name in names if name.strip()]
+        exact = [col for col in schema["columns"] if str(col["name"]).lower() in terms]
+        partial = [col for col in schema["columns"] if col not in exact
+                   and any(term in str(col["name"]).lower() for term in terms)]
+        matches = exact + partial
+        if not matches:
+            return f"No columns of '{dataset_name}' match {', '.join(terms)}."
+        
+        formatted = "".join(self._format_column(col) for col in matches[:limit])
+        if len(matches) > limit:
+            formatted += f"... and {len(matches) - limit} more matching columns; use more specific names.\n"
+        return formatted
+    
+    @staticmethod
+    def _format_column_stats(col):
+        """Describe a column's statistics in one line."""
+        def value(v):
+            return f"{v:.6g}" if isinstance(v, float) else str(v)
         
-        return formatted
\ No newline at end of file
+        parts = [f"{col['null_count']} nulls", f"{col['distinct_count']} distinct"]
+        if "p50" in col:
+            parts.append(
+                f"min {value(col['min'])}, p25 {value(col['p25'])}, median {value(col['p50'])}, "
+                f"p75 {value(col['p75'])}, max {value(col['max'])}, mean {value(col['mean'])}"
+            )
+        elif "min" in col:
+            parts.append(f"from {col['min']} to {col['max']}")
+        elif col.get("top_values"):
+            top = ", ".join(f"{value(v)} ({count})" for v, count in col["top_values"])
+            parts.append(f"most frequent: {top}")
+        else:
+            parts.append("e.g. " + ", ".join(value(v) for v in col["sample_values"]))
+        return "; ".join(parts)
\ No newline at end of file
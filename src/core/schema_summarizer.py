@@ -0,0 +1,143 @@
+"""
+Relevance ranking of dataset columns for compact schema prompts.
+
+Wide tables produce schema descriptions that dominate the agents' prompts.
+Columns are ranked by how well they match a question, by keyword overlap with
+the column name and its most frequent values and, if an embedder is given, by
+embedding similarity, so the most relevant ones can be described in detail
+and the rest only listed.
+"""
+import re
+import threading
+
+import numpy as np
+
+# Rough size of a token in characters, good enough to keep prompts within a budget
+CHARS_PER_TOKEN = 4
+
+STOPWORDS = {
+    "a", "all", "an", "and", "are", "by", "can", "could", "do", "does", "each", "for", "from",
+    "give", "how", "i", "in", "is", "it", "me", "most", "of", "on", "per", "please", "show",
+    "tell", "than", "the", "to", "top", "us", "we", "what", "whats", "which", "with", "would", "you",
+}
+
+# Words that make date columns relevant even when no column is named in the question
+TIME_WORDS = {
+    "date", "day", "daily", "week", "weekly", "month", "monthly", "quarter", "quarterly",
+    "year", "yearly", "annual", "trend", "over", "time", "when", "since", "until", "before", "after",
+}
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of LLM tokens in a text.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Approximate token count
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _words(text):
+    """Split text, identifiers included ("OrderDate", "ship_mode"), into normalized words."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    words = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        # Crude stemming, so "sales" matches "sale" and "categories" matches "category"
+        if word.endswith("ies") and len(word) > 4:
+            word = word[:-3] + "y"
+        elif word.endswith("s") and len(word) > 3:
+            word = word[:-1]
+        words.add(word)
+    return words
+
+
+class ColumnRanker:
+    """Ranks the columns of a schema by relevance to a question."""
+
+    def __init__(self, embedder=None, keyword_weight=1.0, embedding_weight=1.0):
+        """
+        Args:
+            embedder (optional): Object with an embed(text) method returning normalized
+                                 vectors, e.g. the semantic cache's. If None, only
+                                 keywords are matched.
+            keyword_weight (float): Weight of the keyword score
+            embedding_weight (float): Weight of the embedding similarity
+        """
+        self.embedder = embedder
+        self.keyword_weight = keyword_weight
+        self.embedding_weight = embedding_weight
+        # (embedder id, table name, column names) -> matrix of column embeddings
+        self._column_vectors = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _column_text(col):
+        """Text a column is matched on: its name and most frequent values."""
+        values = [str(value) for value, _ in col.get("top_values", [])]
+        return " ".join([str(col["name"])] + values)
+
+    def _keyword_scores(self, columns, question_words):
+        """
+        Share of each column's name words found in the question, plus bonuses for
+        matching values and for date columns when the question is about time.
+        """
+        scores = np.zeros(len(columns), dtype=np.float32)
+        if not question_words:
+            return scores
+        about_time = bool(question_words & TIME_WORDS) or any(re.fullmatch(r"(19|20)\d\d", word)
+                                                              for word in question_words)
+        for i, col in enumerate(columns):
+            name_words = _words(col["name"])
+            if name_words:
+                scores[i] = len(name_words & question_words) / len(name_words)
+            value_words = set()
+            for value, _ in col.get("top_values", []):
+                value_words |= _words(value)
+            if value_words & question_words:
+                scores[i] += 0.5
+            if about_time and col["data_type"].startswith("datetime"):
+                scores[i] += 0.5
+        return scores
+
+    def _embedding_scores(self, schema, question):
+        """Cosine similarity between the question and each column."""
+        columns = schema["columns"]
+        key = (id(self.embedder), schema["table_name"], tuple(col["name"] for col in columns))
+        with self._lock:
+            vectors = self._column_vectors.get(key)
+        if vectors is None:
+            # Embedded once per schema, then reused for every question
+            vectors = np.stack([self.embedder.embed(self._column_text(col)) for col in columns])
+            with self._lock:
+                self._column_vectors[key] = vectors
+        return vectors @ self.embedder.embed(question)
+
+    def rank(self, schema, question):
+        """
+        Order the columns of a schema from most to least relevant.
+
+        Args:
+            schema (dict): Schema as built by SchemaRegistry.register_schema()
+            question (str): The user's question
+
+        Returns:
+            list: The schema's column dicts, most relevant first
+        """
+        columns = schema["columns"]
+        if not columns:
+            return []
+        scores = self.keyword_weight * self._keyword_scores(columns, _words(question))
+        if self.embedder is not None:
+            try:
+                scores = scores + self.embedding_weight * self._embedding_scores(schema, question)
+            except Exception as e:
+                print(f"Could not rank columns by embedding similarity, using keywords only: {e}")
+        # Stable sort keeps the original column order among equally relevant columns
+        order = np.argsort(-scores, kind="stable")
+        return [columns[i] for i in order]
@@ -0,0 +1,220 @@
+"""
+Shared dataset handoff between the host process and the code sandboxes.
+
+The host publishes each loaded dataset as an uncompressed Arrow IPC (Feather v2)
+file inside the workspace, which is mounted into every sandbox. Sandbox code
+memory-maps the file instead of parsing the CSV again, so the column buffers
+are shared through the page cache rather than copied into each process.
+
+This module is imported inside the sandbox, so it must only depend on
+pandas and pyarrow.
+"""
+import json
+import os
+import threading
+
+# Relative to the workspace root, which is the working directory on both sides
+SHARED_DIR = os.path.join(".cache", "shared")
+MANIFEST_FILE = "manifest.json"
+
+# Serializes read-modify-write updates of the manifest by concurrent dataset loads
+_manifest_lock = threading.Lock()
+
+
+def _read_manifest(shared_dir):
+    """Load the manifest of published datasets, or an empty one."""
+    manifest_path = os.path.join(shared_dir, MANIFEST_FILE)
+    try:
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(shared_dir, manifest):
+    """Atomically replace the manifest."""
+    manifest_path = os.path.join(shared_dir, MANIFEST_FILE)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def publish_dataset(df, dataset_name, version=None, shared_dir=SHARED_DIR):
+    """
+    Write a dataset where sandboxes can memory-map it.
+
+    Args:
+        df (pandas.DataFrame): The dataset to publish
+        dataset_name (str): Name sandbox code uses to load it
+        version (str, optional): Version key of the data; publishing the same
+                                 version again is a no-op
+        shared_dir (str): Directory shared with the sandboxes
+
+    Returns:
+        str: Path of the published Arrow file
+    """
+    from pyarrow import feather
+
+    os.makedirs(shared_dir, exist_ok=True)
+    file_name = f"{dataset_name}.arrow"
+    path = os.path.join(shared_dir, file_name)
+
+    entry = _read_manifest(shared_dir).get(dataset_name)
+    if version is not None and entry and entry.get("version") == version and os.path.exists(path):
+        return path
+
+    # Uncompressed so the file can be memory-mapped without decoding
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    with _manifest_lock:
+        manifest = _read_manifest(shared_dir)
+        manifest[dataset_name] = {
+            "file": file_name,
+            "version": version,
+            "rows": len(df),
+            "columns": [str(col) for col in df.columns],
+        }
+        _write_manifest(shared_dir, manifest)
+    return path
+
+
+def register_partitioned_dataset(dataset_name, store_dir, version=None, shared_dir=SHARED_DIR):
+    """
+    Record a partitioned dataset (see partitioned_store.py) in the manifest.
+
+    Args:
+        dataset_name (str): Name sandbox code uses to open it
+        store_dir (str): Partitioned dataset directory inside the shared directory
+        version (str, optional): Version key of the data
+        shared_dir (str): Directory shared with the sandboxes
+    """
+    os.makedirs(shared_dir, exist_ok=True)
+    with _manifest_lock:
+        manifest = _read_manifest(shared_dir)
+        manifest[dataset_name] = {
+            "file": os.path.relpath(store_dir, shared_dir),
+            "kind": "partitioned",
+            "version": version,
+        }
+        _write_manifest(shared_dir, manifest)
+
+
+def list_shared_datasets(shared_dir=SHARED_DIR):
+    """
+    List published datasets.
+
+    Returns:
+        dict: Manifest entries keyed by dataset name
+    """
+    return _read_manifest(shared_dir)
+
+
+def load_shared_dataset(dataset_name, fallback_path=None, shared_dir=SHARED_DIR, arrow_backed=False):
+    """
+    Memory-map a published dataset as a DataFrame.
+
+    Numeric and date columns without nulls reference the mapped file directly.
+    Enable pandas copy-on-write in the caller, because those buffers are
+    read-only and in-place edits must copy them first.
+
+    Args:
+        dataset_name (str): Name the dataset was published under
+        fallback_path (str, optional): CSV to read if the dataset is not published
+        shared_dir (str): Directory shared with the host
+        arrow_backed (bool): Keep every column Arrow-backed (pandas ArrowDtype),
+                             which avoids copies for text columns as well
+
+    Returns:
+        pandas.DataFrame: The dataset
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    entry = _read_manifest(shared_dir).get(dataset_name)
+    if entry and entry.get("kind") == "partitioned":
+        raise ValueError(f"Dataset '{dataset_name}' is partitioned; use open_shared_lazy_dataset() instead")
+    path = os.path.join(shared_dir, entry["file"]) if entry else None
+    if path is None or not os.path.exists(path):
+        if fallback_path is None:
+            raise FileNotFoundError(f"Dataset '{dataset_name}' has not been published to {shared_dir}")
+        return pd.read_csv(fallback_path)
+
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    if arrow_backed:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas(split_blocks=True)
+
+
+def open_shared_lazy_dataset(dataset_name, shared_dir=SHARED_DIR):
+    """
+    Open a partitioned dataset without loading it.
+
+    Args:
+        dataset_name (str): Name the dataset was registered under
+        shared_dir (str): Directory shared with the host
+
+    Returns:
+        LazyDataset: Handle supporting column and filter pushdown via scan()
+    """
+    from src.core.partitioned_store import LazyDataset
+
+    entry = _read_manifest(shared_dir).get(dataset_name)
+    if not entry or entry.get("kind") != "partitioned":
+        raise FileNotFoundError(f"No partitioned dataset named '{dataset_name}' in {shared_dir}")
+    return LazyDataset(os.path.join(shared_dir, entry["file"]), name=dataset_name)
+
+
+def publish_rollup(cube, dataset_name, shared_dir=SHARED_DIR):
+    """
+    Write the rollup cube of a published dataset where sandboxes can memory-map it.
+
+    Args:
+        cube (RollupCube): The dataset's rollups
+        dataset_name (str): Name of the dataset, which must already be in the manifest
+        shared_dir (str): Directory shared with the sandboxes
+
+    Returns:
+        str: Path of the published Arrow file
+    """
+    os.makedirs(shared_dir, exist_ok=True)
+    file_name = f"{dataset_name}.rollup.arrow"
+    path = os.path.join(shared_dir, file_name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        cube.save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    with _manifest_lock:
+        manifest = _read_manifest(shared_dir)
+        manifest.setdefault(dataset_name, {})["rollup"] = file_name
+        _write_manifest(shared_dir, manifest)
+    return path
+
+
+def load_shared_rollup(dataset_name, shared_dir=SHARED_DIR):
+    """
+    Open the published rollup cube of a dataset.
+
+    Args:
+        dataset_name (str): Name of the dataset
+        shared_dir (str): Directory shared with the host
+
+    Returns:
+        RollupCube: The cube; use cube.lookup(group_by=[...], filters={...})
+    """
+    from src.core.rollup_cube import RollupCube
+
+    entry = _read_manifest(shared_dir).get(dataset_name) or {}
+    if "rollup" not in entry:
+        raise FileNotFoundError(f"No rollup cube for dataset '{dataset_name}' in {shared_dir}")
+    return RollupCube.load(os.path.join(shared_dir, entry["rollup"]))
@@ -0,0 +1,89 @@
+"""
+Size limits for the text that tools return to the agents.
+
+Everything a tool returns goes into the agent's context, so output longer
+than a limit is clipped to its first and last lines with a note of what was
+left out. The complete output can be spilled to a file, from which
+read_output_page() returns further lines on request.
+"""
+
+# Share of the limit used for the first lines; the rest shows the last lines
+HEAD_RATIO = 0.6
+
+
+def clip_output(text, max_chars, note=""):
+    """
+    Clip text to about max_chars, keeping whole lines from its start and end.
+
+    Only lines too long to ever fit are cut.
+
+    Args:
+        text (str): The output
+        max_chars (int): Characters kept at most
+        note (str): Appended to the omission marker, e.g. where the full output is
+
+    Returns:
+        str: The text itself if it fits, else its first and last lines around
+             a marker with the number of omitted lines and characters
+    """
+    if len(text) <= max_chars:
+        return text
+    head_budget = int(max_chars * HEAD_RATIO)
+    tail_budget = max_chars - head_budget
+    lines = text.splitlines(keepends=True)
+
+    head, size = [], 0
+    for line in lines:
+        if size + len(line) > head_budget:
+            break
+        head.append(line)
+        size += len(line)
+    tail, size = [], 0
+    for line in reversed(lines[len(head):]):
+        if size + len(line) > tail_budget:
+            break
+        tail.append(line)
+        size += len(line)
+    tail.reverse()
+
+    head_text, tail_text = "".join(head), "".join(tail)
+    middle = lines[len(head):len(lines) - len(tail)]
+    omitted_lines = len(middle)
+    # A line too long for a budget (e.g. a long error message) is cut rather than left out
+    if len(middle[0]) > head_budget:
+        head_text += middle[0][:head_budget - len(head_text)]
+        omitted_lines -= 1
+    if len(middle[-1]) > tail_budget and tail_budget > len(tail_text):
+        tail_text = middle[-1][len(tail_text) - tail_budget:] + tail_text
+        omitted_lines -= 1 if len(middle) > 1 or len(middle[0]) <= head_budget else 0
+    omitted_chars = len(text) - len(head_text) - len(tail_text)
+    omitted = f"{omitted_lines:,} lines ({omitted_chars:,} characters)" if omitted_lines else f"{omitted_chars:,} characters"
+    marker = f"... [{omitted} omitted{note}] ..."
+    return f"{head_text.rstrip(chr(10))}\n{marker}\n{tail_text}"
+
+
+def read_output_page(path, start_line=1, line_count=200, max_chars=8000):
+    """
+    Read lines of an output spilled to a file.
+
+    Args:
+        path (str): The spilled output
+        start_line (int): First line, counting from 1
+        line_count (int): Lines read at most
+        max_chars (int): Characters returned at most; longer pages are clipped
+
+    Returns:
+        str: A header with the line range and total lines, then the lines
+    """
+    start_line = max(start_line, 1)
+    page, total = [], 0
+    # Streamed, so only the requested lines are held in memory
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for total, line in enumerate(f, 1):
+            if start_line <= total < start_line + line_count:
+                page.append(line)
+    if not page:
+        return f"[No lines from line {start_line}; the output has {total:,} lines]"
+    end_line = start_line + len(page) - 1
+    header = f"[Lines {start_line:,}-{end_line:,} of {total:,}]"
+    return f"{header}\n{clip_output(''.join(page), max_chars)}"
@@ -1,24 +1,85 @@
-from crewai import Agent, Crew, Process, Task, LLM
-from crewai.project import CrewBase, agent, crew, task
+from __future__ import annotations
 from dotenv import load_dotenv
+from typing import TYPE_CHECKING
+import atexit
+import functools
+import hashlib
+import json
 import os
+import shutil
+import threading
+import uuid
+import yaml
 from src.core.config_loader import ConfigLoader
-from src.tools.custom_code_interpreter import CustomCodeInterpreterTool
+from src.crew.models import QueryInterpretation
+from src.crew.progress import CrewProgress
+from src.tools.container_pool import ContainerPool
+
+# CrewAI takes seconds to import, so it is only imported once a crew is built
+# (or by prewarm() in the background); importing this module stays cheap
+if TYPE_CHECKING:
+    from crewai import Agent, Crew, Task
 
 
 load_dotenv()
-from docker import from_env
-client = from_env()
-# print(f"Here are the images: {client.images.list()}")
-image = client.images.get("data-science-image")
-print(f"Found image: {image.tags}")
-code_interpreter = CustomCodeInterpreterTool(image_name="data-science-image", verbose=True)
-
-def setup_llm(config_name="default"):
+
+# Created on first use, so importing this module doesn't start Docker containers
+_sandbox_pool = None
+_sandbox_pool_lock = threading.Lock()
+
+def get_sandbox_pool():
+    """Get the process-wide sandbox pool, creating and starting it on the first call."""
+    global _sandbox_pool
+    with _sandbox_pool_lock:
+        if _sandbox_pool is None:
+            sandbox_config = ConfigLoader().get_config("system").get("sandbox", {})
+            pool = ContainerPool.from_config(sandbox_config)
+            pool.start()
+            atexit.register(pool.shutdown)
+            _sandbox_pool = pool
+        return _sandbox_pool
+
+# CrewAI's modules import each other circularly, so importing it from two threads at
+# once (e.g. prewarm and the first crew) can see half-initialized modules
+_import_lock = threading.Lock()
+
+def _import_crewai():
+    """Import CrewAI and the tools built on it, one thread at a time."""
+    with _import_lock:
+        import crewai
+        import src.tools.chart_tool
+        import src.tools.custom_code_interpreter
+        import src.tools.output_page_tool
+        import src.tools.schema_lookup_tool
+        import src.tools.sql_query_tool
+
+def prewarm():
+    """
+    Import CrewAI and the tools and start the sandbox pool on a background
+    thread, e.g. while a server starts up, so the first analysis doesn't wait.
+    
+    Returns:
+        threading.Thread: The pre-warm thread
+    """
+    def warm():
+        _import_crewai()
+        try:
+            get_sandbox_pool()
+        except Exception as e:
+            print(f"Could not pre-start the sandbox pool: {e}")
+    
+    thread = threading.Thread(target=warm, name="crew-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+CREW_CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config")
+
+def setup_llm(config_name="default", llm_configs=None):
     # Try to load LLM config
-    config_loader = ConfigLoader()
-    system_config = config_loader.get_config("system")
-    llm_configs = system_config.get("llm", {})
+    if llm_configs is None:
+        config_loader = ConfigLoader()
+        system_config = config_loader.get_config("system")
+        llm_configs = system_config.get("llm", {})
     
     # Get specific LLM config, fall back to default if not found
     llm_config = llm_configs.get(config_name, llm_configs.get("default", {}))
@@ -27,55 +88,314 @@ def setup_llm(config_name="default"):
     model_type = llm_config.get("type", "").lower()
     print(f"Setting up LLM for {config_name} with model type: {model_type}")
     if model_type == "google":
+        from crewai import LLM
         model=llm_config.get("model", "gemini-pro")
         return LLM(
             model=llm_config.get("model", "gemini-pro"),
             api_key=os.environ.get("GOOGLE_API_KEY"),
-            temperature=llm_config.get("temperature", 0)
+            temperature=llm_config.get("temperature", 0),
+            stream=llm_config.get("stream", False)
         )
     else:
         print(f"Unsupported LLM type: {model_type}")
 
 
-@CrewBase
+class CrewFactory():
+  """
+  Parsed crew configuration and LLM clients, shared by all crews.
+
+  agents.yaml, tasks.yaml and the llm section of system.yaml are read once
+  and re-read only when one of the files changes. LLM clients are built once
+  per agent, so their HTTP connections to the provider are reused across
+  analyses. Agents and tasks hold per-run state (tools with a leased sandbox,
+  executors, outputs), so each crew builds its own from the parsed config.
+  """
+
+  def __init__(self, config_dir=CREW_CONFIG_DIR, system_config_dir="config"):
+    """
+    Args:
+      config_dir (str): Directory with agents.yaml and tasks.yaml
+      system_config_dir (str): Directory with system.yaml
+    """
+    self.config_dir = config_dir
+    self.system_config_dir = system_config_dir
+    self.agents_config = {}
+    self.tasks_config = {}
+    self.system_config = {}
+    self.llm_configs = {}
+    self.config_version = None
+    self._llms = {}
+    self._mtimes = None
+    self._lock = threading.Lock()
+
+  def _config_files(self):
+    return [
+      os.path.join(self.config_dir, "agents.yaml"),
+      os.path.join(self.config_dir, "tasks.yaml"),
+      os.path.join(self.system_config_dir, "system.yaml")
+    ]
+
+  @staticmethod
+  def _mtime(path):
+    try:
+      return os.stat(path).st_mtime_ns
+    except OSError:
+      return None
+
+  def refresh(self):
+    """Load the configuration, again if any of its files changed since the last load."""
+    mtimes = [self._mtime(path) for path in self._config_files()]
+    if mtimes == self._mtimes:
+      return
+
+    with self._lock:
+      if mtimes == self._mtimes:
+        return
+      agents_path, tasks_path, _ = self._config_files()
+      with open(agents_path, "r") as file:
+        agents_text = file.read()
+      with open(tasks_path, "r") as file:
+        tasks_text = file.read()
+      system_config = ConfigLoader(self.system_config_dir).load_config("system")
+      llm_configs = system_config.get("llm", {})
+
+      if llm_configs != self.llm_configs:
+        self._llms = {}
+      self.agents_config = yaml.safe_load(agents_text) or {}
+      self.tasks_config = yaml.safe_load(tasks_text) or {}
+      self.system_config = system_config
+      self.llm_configs = llm_configs
+      # Identifies the prompts and LLM settings, e.g. for answer cache keys
+      digest = hashlib.sha1()
+      for text in (agents_text, tasks_text, json.dumps(llm_configs, sort_keys=True)):
+        digest.update(text.encode("utf-8"))
+      self.config_version = digest.hexdigest()[:16]
+      self._mtimes = mtimes
+      print(f"[CrewFactory] Loaded crew configuration (version {self.config_version})")
+
+  def llm(self, config_name):
+    """Get the shared LLM client of an agent, building it on first use."""
+    with self._lock:
+      if config_name not in self._llms:
+        self._llms[config_name] = setup_llm(config_name, self.llm_configs)
+      return self._llms[config_name]
+
+  def agent_config(self, agent_name):
+    """Get a copy of an agent's configuration."""
+    return dict(self.agents_config[agent_name])
+
+  def task_config(self, task_name):
+    """Get a copy of a task's configuration, without its agent (crews pass their own)."""
+    config = dict(self.tasks_config[task_name])
+    config.pop("agent", None)
+    return config
+
+
+crew_factory = CrewFactory()
+
+def per_crew(method):
+  """Build an agent or task once per crew, so all tasks of a crew share the same agents."""
+  @functools.wraps(method)
+  def wrapper(self):
+    if method.__name__ not in self._members:
+      self._members[method.__name__] = method(self)
+    return self._members[method.__name__]
+  return wrapper
+
+
 class BusinessAnalystCrew():
   """Business Analyst crew"""
 
-  @agent
+  def __init__(self, data_manager=None, progress=None, factory=None, schema_registry=None, chart_service=None):
+    """
+    Args:
+      data_manager (DataManager, optional): Datasets for the SQL tool
+      schema_registry (SchemaRegistry, optional): Schemas for the schema lookup tool,
+        for columns left out of a compact schema
+      chart_service (ChartService, optional): Renders charts of SQL results for the chart tool
+      progress (callable, optional): Called as progress(event_type, data) with
+        the steps, finished tasks and streamed tokens of the run
+      factory (CrewFactory, optional): Shared configuration and LLMs, the module's by default
+    """
+    _import_crewai()
+    self.factory = factory or crew_factory
+    self.factory.refresh()
+    self._members = {}
+    self.progress = CrewProgress(progress) if progress is not None else None
+    # Successful tool calls of this analysis, in order, for replaying it later
+    self.executed_steps = []
+    # Files and charts the tools produced, in order
+    self._artifacts = []
+    # Result tables the code and queries showed, in order
+    self._tables = []
+    from src.tools.chart_tool import ChartTool
+    from src.tools.custom_code_interpreter import CustomCodeInterpreterTool
+    from src.tools.output_page_tool import OutputPageTool
+    from src.tools.schema_lookup_tool import SchemaLookupTool
+    from src.tools.sql_query_tool import SQLQueryTool
+
+    sandbox_config = self.factory.system_config.get("sandbox", {})
+    sql_config = self.factory.system_config.get("sql", {})
+    artifacts_config = self.factory.system_config.get("artifacts", {})
+    # Files and charts of this analysis, relative to the workspace shared with the sandboxes
+    self.output_dir = os.path.join(artifacts_config.get("output_dir", os.path.join(".cache", "outputs")),
+                                   uuid.uuid4().hex)
+    # Each crew leases its own sandbox so concurrent analyses don't share state
+    self.code_interpreter = CustomCodeInterpreterTool(
+      pool_provider=get_sandbox_pool,
+      execution_timeout=sandbox_config.get("execution_timeout", 600),
+      verbose=True,
+      recorder=self.executed_steps,
+      output_dir=self.output_dir,
+      artifacts=self._artifacts,
+      max_table_rows=sandbox_config.get("max_table_rows", 200),
+      preview_rows=sandbox_config.get("table_preview_rows", 20),
+      tables=self._tables,
+      max_output_chars=sandbox_config.get("max_output_chars", 8000),
+      summary_rows=sandbox_config.get("summary_rows", 60),
+      # Next to the output files rather than among them, so they aren't shown to the user
+      spill_dir=os.path.join(self.output_dir, "spill")
+    )
+    # Pages of code outputs too long to return whole
+    self.output_page_tool = OutputPageTool(
+      spill_dir=self.code_interpreter.spill_dir,
+      page_lines=sandbox_config.get("output_page_lines", 200),
+      max_chars=self.code_interpreter.max_output_chars,
+      verbose=True
+    )
+    # In-process SQL over the loaded datasets, for queries that don't need the sandbox
+    self.sql_tool = None
+    if data_manager is not None and sql_config.get("enabled", True):
+      self.sql_tool = SQLQueryTool(
+        data_manager=data_manager,
+        max_rows=sql_config.get("max_rows", 200),
+        verbose=True,
+        recorder=self.executed_steps,
+        tables=self._tables
+      )
+    self.schema_lookup_tool = None
+    if schema_registry is not None:
+      self.schema_lookup_tool = SchemaLookupTool(schema_registry=schema_registry, verbose=True)
+    # Charts of SQL results drawn on the host, so no plotting code runs in the sandbox
+    self.chart_tool = None
+    if chart_service is not None and self.sql_tool is not None:
+      self.chart_tool = ChartTool(
+        sql_tool=self.sql_tool,
+        chart_service=chart_service,
+        verbose=True,
+        recorder=self.executed_steps,
+        artifacts=self._artifacts
+      )
+
+  @property
+  def artifacts(self):
+    """Paths of the files and charts the analysis produced, in order."""
+    return list(self._artifacts)
+
+  @property
+  def tables(self):
+    """Result tables of the analysis, in order (see src.core.result_tables)."""
+    return list(self._tables)
+
+  def release_sandbox(self):
+    """Return the leased sandbox to the pool once the analysis is done."""
+    self.code_interpreter.release()
+
+  def close(self):
+    """Release the sandbox, delete the output files and stop progress reporting once the analysis is done."""
+    self.release_sandbox()
+    shutil.rmtree(self.output_dir, ignore_errors=True)
+    if self.progress is not None:
+      self.progress.detach()
+
+  def _assemble(self, agents, tasks) -> Crew:
+    """Build a sequential crew, reporting its progress if a callback was given."""
+    from crewai import Crew, Process
+
+    callbacks = {}
+    if self.progress is not None:
+      self.progress.attach(agents)
+      callbacks = {"step_callback": self.progress.step_callback, "task_callback": self.progress.task_callback}
+    return Crew(agents=agents, tasks=tasks, process=Process.sequential, **callbacks)
+
+  def replay(self, steps):
+    """
+    Run recorded tool calls again, without involving an LLM.
+
+    Args:
+      steps (list): Steps as recorded in executed_steps by an earlier analysis
+
+    Returns:
+      list: Output of each step
+
+    Raises:
+      RuntimeError: If a step fails or needs a tool this crew doesn't have
+    """
+    # Start from the preloaded kernel state the steps were recorded against
+    self.code_interpreter.reset()
+    outputs = []
+    for step in steps:
+      if step["tool"] == "sql" and self.sql_tool is not None:
+        output = self.sql_tool._run(query=step["query"])
+        failed = output.startswith("Error executing query")
+      elif step["tool"] == "code":
+        output = self.code_interpreter._run(code=step["code"], libraries_used=step.get("libraries_used", []))
+        failed = output.startswith(("Error executing code", "Internal error"))
+      elif step["tool"] == "chart" and self.chart_tool is not None:
+        try:
+          output = f"Chart {self.chart_tool.render(step['query'], step['spec'])}"
+        except Exception as e:
+          output = f"Error drawing chart:\n{str(e)}"
+        failed = output.startswith("Error drawing chart")
+      else:
+        raise RuntimeError(f"Cannot replay a '{step['tool']}' step")
+      if failed:
+        raise RuntimeError(output)
+      outputs.append(output)
+    return outputs
+
+  @per_crew
   def query_interpreter(self) -> Agent:
+    from crewai import Agent
     return Agent(
-      config=self.agents_config['query_interpreter'],
+      config=self.factory.agent_config('query_interpreter'),
       verbose=True,
-      llm = setup_llm("query_interpreter")
+      llm = self.factory.llm("query_interpreter"),
+      tools = [self.schema_lookup_tool] if self.schema_lookup_tool is not None else []
     )
 
-  @agent
+  @per_crew
   def data_analyst_agent(self) -> Agent:
+    from crewai import Agent
     return Agent(
-      config=self.agents_config['data_analyst_agent'],
+      config=self.factory.agent_config('data_analyst_agent'),
       verbose=True,
-      llm = setup_llm("data_analyst_agent"),
-      tools = [code_interpreter]
+      llm = self.factory.llm("data_analyst_agent"),
+      tools = [tool for tool in (self.schema_lookup_tool, self.sql_tool, self.chart_tool, self.code_interpreter,
+                                 self.output_page_tool)
+               if tool is not None]
     )
   
 
-  @task
+  @per_crew
   def interpret_task(self) -> Task:
+    from crewai import Task
     return Task(
-            config = self.tasks_config['interpret_task'],
-            agent = self.query_interpreter()
+            config = self.factory.task_config('interpret_task'),
+            agent = self.query_interpreter(),
+            output_pydantic = QueryInterpretation
         )
 
-  @task
+  @per_crew
   def data_analyst_task(self) -> Task:
+    from crewai import Task
     return Task(
-            config = self.tasks_config['data_analyst_task'],
+            config = self.factory.task_config('data_analyst_task'),
             agent = self.data_analyst_agent()
         )
 
-  @crew
   def crew(self) -> Crew:
-    return Crew(
+    return self._assemble(
       agents=[
         self.query_interpreter(),
         self.data_analyst_agent()
@@ -83,6 +403,13 @@ class BusinessAnalystCrew():
       tasks=[
         self.interpret_task(),
         self.data_analyst_task()
-      ],
-      process=Process.sequential
-    )
\ No newline at end of file
+      ]
+    )
+
+  def interpretation_crew(self) -> Crew:
+    """Crew that only interprets the question, so its requirements can be looked up in caches."""
+    return self._assemble(agents=[self.query_interpreter()], tasks=[self.interpret_task()])
+
+  def analysis_crew(self) -> Crew:
+    """Crew that skips interpretation, for questions whose requirements are already known."""
+    return self._assemble(agents=[self.data_analyst_agent()], tasks=[self.data_analyst_task()])
\ No newline at end of file
@@ -0,0 +1,40 @@
+"""
+Structured outputs of the crew's tasks.
+"""
+from typing import List
+from pydantic import BaseModel, Field
+
+
+class QueryInterpretation(BaseModel):
+    """Data requirements of a business question, as produced by the query interpreter."""
+
+    columns: List[str] = Field(default=[], description="Exact names of the dataset columns needed")
+    filters: List[str] = Field(
+        default=[], description="Row filters as simple conditions, e.g. \"Region = 'West'\" or \"Order Date year = 2017\""
+    )
+    group_by: List[str] = Field(default=[], description="Columns to group by, if any")
+    aggregations: List[str] = Field(
+        default=[], description="Calculations to perform, e.g. \"sum of Sales\" or \"count of Order ID\""
+    )
+    sort_by: str = Field(default="", description="Ordering of the result, e.g. \"Sales descending\", if any")
+    limit: int = Field(default=0, description="Number of rows to return, e.g. 10 for a top 10, or 0 for all")
+    result_type: str = Field(default="table", description="Expected result: table, single value, chart or summary")
+
+    def cache_key(self) -> str:
+        """
+        Canonical form of the interpretation, equal for requirements that differ
+        only in letter case, whitespace or the order of list items.
+        """
+        def canonical(value):
+            return " ".join(str(value).lower().split())
+
+        parts = [
+            ",".join(sorted(canonical(item) for item in self.columns)),
+            ",".join(sorted(canonical(item) for item in self.filters)),
+            ",".join(sorted(canonical(item) for item in self.group_by)),
+            ",".join(sorted(canonical(item) for item in self.aggregations)),
+            canonical(self.sort_by),
+            str(self.limit),
+            canonical(self.result_type),
+        ]
+        return "|".join(parts)
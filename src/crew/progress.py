@@ -0,0 +1,88 @@
+"""
+Live progress reporting for crew runs.
+
+Agent steps (thoughts, tool calls and their output) and finished tasks are
+reported through CrewAI's step and task callbacks. LLM tokens are forwarded
+from CrewAI's event bus as they stream in; the bus is process-wide, so chunks
+are routed to the right run by the id of the agent that produced them.
+"""
+import threading
+
+# Tool output in progress events is cut to this many characters
+MAX_OUTPUT_CHARS = 5000
+
+# Agent id -> progress callback of the run the agent belongs to
+_token_listeners = {}
+_token_listeners_lock = threading.Lock()
+_event_handler_registered = False
+
+
+def _register_event_handler():
+    """Subscribe to streamed LLM chunks once per process."""
+    global _event_handler_registered
+    with _token_listeners_lock:
+        if _event_handler_registered:
+            return
+        _event_handler_registered = True
+
+    from crewai.events import LLMStreamChunkEvent, crewai_event_bus
+
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def forward_chunk(source, event):
+        with _token_listeners_lock:
+            callback = _token_listeners.get(event.agent_id)
+        if callback is not None and event.chunk:
+            callback("token", {"agent": event.agent_role, "text": event.chunk})
+
+
+def _truncate(text):
+    """Shorten long tool output for display."""
+    text = str(text)
+    if len(text) <= MAX_OUTPUT_CHARS:
+        return text
+    return text[:MAX_OUTPUT_CHARS] + f"\n... ({len(text) - MAX_OUTPUT_CHARS} more characters)"
+
+
+class CrewProgress:
+    """Reports the progress of one crew run to a callback."""
+
+    def __init__(self, callback):
+        """
+        Args:
+            callback (callable): Called as callback(event_type, data) for every
+                                 step, task and streamed token
+        """
+        self.callback = callback
+        self._agent_ids = set()
+        _register_event_handler()
+
+    def attach(self, agents):
+        """Forward the streamed tokens of these agents to the callback."""
+        with _token_listeners_lock:
+            for agent in agents:
+                agent_id = str(agent.id)
+                _token_listeners[agent_id] = self.callback
+                self._agent_ids.add(agent_id)
+
+    def detach(self):
+        """Stop forwarding tokens, once the run is over."""
+        with _token_listeners_lock:
+            for agent_id in self._agent_ids:
+                _token_listeners.pop(agent_id, None)
+        self._agent_ids.clear()
+
+    def step_callback(self, step):
+        """Report an agent step: a tool call with its output, or a final answer."""
+        if hasattr(step, "tool"):
+            self.callback("step", {
+                "thought": step.thought,
+                "tool": step.tool,
+                "tool_input": step.tool_input,
+                "output": _truncate(step.result or ""),
+            })
+        elif hasattr(step, "output"):
+            self.callback("step", {"thought": step.thought, "final_answer": _truncate(step.output)})
+
+    def task_callback(self, task_output):
+        """Report a finished task."""
+        self.callback("task", {"agent": task_output.agent, "output": _truncate(task_output.raw)})
@@ -7,7 +7,10 @@ from dotenv import load_dotenv
 from src.core.data_manager import DataManager
 from src.core.schema_registry import SchemaRegistry
 from src.core.config_loader import ConfigLoader
-from src.crew.business_analyst_crew import BusinessAnalystCrew
+from src.application.artifact_store import ArtifactStore
+from src.application.batch_runner import read_questions, run_batch
+from src.application.business_analyst_service import INTERPRETATION_FROM_CONTEXT, BusinessAnalystService
+from src.crew.business_analyst_crew import BusinessAnalystCrew, prewarm
 
 # Load environment variables
 load_dotenv()
@@ -45,9 +48,15 @@ def interactive_mode(data_manager, schema_registry):
     
     print(f"\nUsing dataset: {dataset_name}")
     
-    # Get dataset and schema
+    # Charts and files the analyses produce
+    artifacts_config = ConfigLoader().get_config("system").get("artifacts", {})
+    artifact_store = ArtifactStore(
+        path=artifacts_config.get("path", os.path.join(".cache", "artifacts")),
+        max_bytes=artifacts_config.get("max_bytes", 200 * 1024 * 1024)
+    )
+    
+    # Get dataset
     df = data_manager.get_dataset(dataset_name)
-    schema_info = schema_registry.format_schema_for_llm(dataset_name)
     
     
     # Main loop
@@ -60,10 +69,56 @@ def interactive_mode(data_manager, schema_registry):
             continue
         
         print("\nProcessing your question...")
-        result = BusinessAnalystCrew().crew().kickoff(inputs={"question": question, "dataset_name": dataset_name, "schema_info": schema_info})
+        crew = BusinessAnalystCrew(data_manager=data_manager, schema_registry=schema_registry)
+        try:
+            result = crew.crew().kickoff(inputs={
+                "question": question,
+                "dataset_name": dataset_name,
+                "schema_info": schema_registry.format_schema_for_llm(dataset_name, question=question),
+                "data_access": data_manager.get_load_instructions(dataset_name),
+                "interpretation": INTERPRETATION_FROM_CONTEXT
+            })
+            saved_files = [artifact_store.get(artifact_store.put(path)) for path in crew.artifacts]
+        finally:
+            crew.close()
         # print(f"Output of first task: {result.tasks[0].output}")
         print("\nAnswer:")
         print(result)
+        if saved_files:
+            print("\nSaved files:")
+            for path in saved_files:
+                print(f"  {path}")
+
+def batch_mode(service, dataset_name, questions_path, output_path=None, concurrency=None):
+    """
+    Answer a file of questions concurrently, writing the results as JSONL.
+    
+    Args:
+        service: The business analyst service shared by the workers
+        dataset_name: Dataset for questions that don't name one
+        questions_path: JSONL file of questions
+        output_path: Results file. If None, <questions file>.results.jsonl
+        concurrency: Questions analyzed at the same time.
+                     If None, one per sandbox in the pool (sandbox.pool.max_size)
+    """
+    try:
+        questions = read_questions(questions_path)
+    except (OSError, ValueError) as e:
+        print(f"Could not read questions: {e}")
+        return
+    
+    max_sandboxes = service.system_config.get("sandbox", {}).get("pool", {}).get("max_size", 4)
+    if concurrency is None:
+        concurrency = max_sandboxes
+    elif concurrency > max_sandboxes:
+        print(f"Warning: --concurrency {concurrency} exceeds sandbox.pool.max_size ({max_sandboxes}); "
+              "extra workers will wait for a free sandbox")
+    if output_path is None:
+        output_path = os.path.splitext(questions_path)[0] + ".results.jsonl"
+    
+    print(f"Answering {len(questions)} questions with {concurrency} workers, writing results to {output_path}")
+    summary = run_batch(service, questions, output_path, concurrency=concurrency, dataset_name=dataset_name)
+    print(f"\nDone in {summary['seconds']:.1f}s: {summary['succeeded']} succeeded, {summary['failed']} failed")
 
 def main():
     """Main entry point."""
@@ -71,8 +126,18 @@ def main():
     parser.add_argument("--dataset", help="Path to dataset file")
     parser.add_argument("--question", help="Business question to analyze")
     parser.add_argument("--interactive", action="store_true", help="Run in interactive mode")
+    parser.add_argument("--batch", help="JSONL file of questions to answer concurrently")
+    parser.add_argument("--output", help="JSONL results file for --batch (default: <batch file>.results.jsonl)")
+    parser.add_argument("--concurrency", type=int,
+                        help="Questions answered at the same time in --batch mode (default: sandbox.pool.max_size)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Ingest the dataset in chunks into a partitioned store instead of loading it into memory")
+    parser.add_argument("--partition-by", help="Partition column for --stream, e.g. Region or 'Order Date:year'")
     args = parser.parse_args()
     
+    # Start the code sandboxes in the background while the dataset loads
+    prewarm()
+    
     # Initialize core components
     data_manager = DataManager()
     schema_registry = SchemaRegistry()
@@ -84,20 +149,45 @@ def main():
         print(f"Dataset not found: {dataset_path}")
         return
     
-    df = data_manager.load_dataset(dataset_path)
-    if df is None:
-        print("Failed to load dataset.")
-        return
-    
-    # Register schema
     dataset_name = os.path.splitext(os.path.basename(dataset_path))[0]
-    schema = schema_registry.register_schema(dataset_name, df)
+    if args.stream:
+        lazy_dataset = data_manager.ingest_dataset(dataset_path, partition_by=args.partition_by)
+        if lazy_dataset is None:
+            print("Failed to ingest dataset.")
+            return
+        
+        # Register schema from a sample, telling the agent how to read the rest
+        access_note = (
+            "This dataset is too large to load at once. Open it with "
+            "`from src.core.shared_datasets import open_shared_lazy_dataset; "
+            f"ds = open_shared_lazy_dataset('{dataset_name}')` and read only what you need with "
+            "`ds.scan(columns=[...], filters=[(column, op, value), ...])`."
+        )
+        schema = schema_registry.register_schema(
+            dataset_name, lazy_dataset.head(100), row_count=lazy_dataset.count_rows(), access_note=access_note,
+            fingerprint=data_manager.get_fingerprint(dataset_name)
+        )
+    else:
+        df = data_manager.load_dataset(dataset_path)
+        if df is None:
+            print("Failed to load dataset.")
+            return
+        
+        # Register schema
+        schema = schema_registry.register_schema(
+            dataset_name, df, fingerprint=data_manager.get_fingerprint(dataset_name)
+        )
     schema_info = schema_registry.format_schema_for_llm(dataset_name)
     
     
-    # Process single question or enter interactive mode
-    if args.question:
-        print("Not supported yet")
+    # Process a batch, a single question or enter interactive mode
+    if args.batch:
+        service = BusinessAnalystService(data_manager, schema_registry)
+        batch_mode(service, dataset_name, args.batch, args.output, args.concurrency)
+    elif args.question:
+        service = BusinessAnalystService(data_manager, schema_registry)
+        print("\nAnswer:")
+        print(service.analyze_query(args.question, dataset_name))
     elif args.interactive or not args.question:
         interactive_mode(data_manager, schema_registry)
 
@@ -0,0 +1,88 @@
+from typing import Any
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+class ChartSchema(BaseModel):
+    """Input schema for ChartTool."""
+
+    query: str = Field(
+        ...,
+        description=(
+            "SQL SELECT statement (same rules as the SQL Query tool) whose result is charted, "
+            'e.g. SELECT "Region", SUM("Sales") AS "Sales" FROM "superstore" GROUP BY 1.'
+        ),
+    )
+    chart_type: str = Field(default="bar", description="One of bar, barh, line, area, scatter, pie.")
+    x: str = Field(default="", description="Result column for the x axis (pie: the slices). Default: the first column.")
+    y: str = Field(
+        default="",
+        description="Comma-separated numeric result columns to plot. Default: the first numeric column.",
+    )
+    title: str = Field(default="", description="Chart title.")
+    sort: str = Field(default="", description="Optional: ascending or descending, by the first y column.")
+
+class ChartTool(BaseTool):
+    """Charts the result of a SQL query on the host, without plotting code."""
+
+    name: str = "Chart"
+    description: str = (
+        "Draws a chart of the result of a SQL query over the loaded datasets and shows it to the user. "
+        "Use it instead of writing matplotlib code whenever a chart of a query result is needed."
+    )
+    args_schema: type[BaseModel] = ChartSchema
+
+    # Configuration (these are proper Pydantic fields)
+    sql_tool: Any = None
+    chart_service: Any = None
+    verbose: bool = True
+    # List that successful charts are appended to, so they can be replayed later
+    recorder: Any = None
+    # List that paths of the rendered images are appended to
+    artifacts: Any = None
+
+    def _log(self, message: str) -> None:
+        """Print log messages if verbose mode is enabled."""
+        if self.verbose:
+            print(f"[Chart] {message}")
+
+    def render(self, query: str, spec: dict) -> str:
+        """
+        Chart the result of a query.
+
+        Args:
+            query (str): SQL SELECT statement
+            spec (dict): Chart spec, see chart_renderer.normalize_spec()
+
+        Returns:
+            str: Name of the stored image
+
+        Raises:
+            ValueError: If the query or the spec is invalid
+        """
+        # One row more than charted, so too large results are rejected instead of truncated
+        df = self.sql_tool.run_query(query, self.chart_service.max_rows + 1)
+        result = self.chart_service.render(df, spec)
+        if self.artifacts is not None:
+            self.artifacts.append(self.chart_service.artifact_store.get(result["name"]))
+        return result["name"]
+
+    def _run(self, query: str = "", chart_type: str = "bar", x: str = "", y: str = "",
+             title: str = "", sort: str = "") -> str:
+        """Render the chart and confirm it to the agent."""
+        spec = {
+            "type": chart_type,
+            "x": x or None,
+            "y": [column.strip() for column in y.split(",") if column.strip()] or None,
+            "title": title,
+            "sort": sort or None,
+            "format": "png",
+        }
+        self._log(f"Charting ({chart_type}): {query}")
+        try:
+            self.render(query, spec)
+        except Exception as e:
+            self._log(f"Error: {str(e)}")
+            return f"Error drawing chart:\n{str(e)}"
+        if self.recorder is not None:
+            self.recorder.append({"tool": "chart", "query": query, "spec": spec})
+        return "The chart was drawn and is shown to the user alongside your answer."
@@ -0,0 +1,505 @@
+"""
+Pool of pre-started code execution sandboxes.
+
+Each sandbox is a container (or, for local use and testing, a child process)
+running a warm Python kernel with the configured preload code already executed.
+Analyses lease a sandbox for their duration and hand it back afterwards; the
+pool resets the kernel to its preloaded state before the next lease.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from src.tools.kernel_client import (
+    DockerExecChannel,
+    KernelClient,
+    KernelError,
+    SubprocessChannel,
+    KERNEL_SCRIPT_PATH,
+)
+
+LOCAL_KERNEL_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_kernel.py")
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no sandbox becomes available within the acquire timeout."""
+
+
+class DockerSandboxBackend:
+    """Starts sandboxes as Docker containers with the project mounted at /workspace."""
+
+    def __init__(self, image_name, dockerfile_path=None, workspace=None, name_prefix="code-executor", log=print):
+        """
+        Args:
+            image_name (str): Docker image to run
+            dockerfile_path (str, optional): Dockerfile used to build the image if it is missing
+            workspace (str, optional): Host directory mounted at /workspace (defaults to cwd)
+            name_prefix (str): Prefix for container names
+            log (callable): Logging function
+        """
+        from docker import from_env as docker_from_env
+
+        self.image_name = image_name
+        self.dockerfile_path = dockerfile_path
+        self.workspace = workspace or os.getcwd()
+        self.name_prefix = name_prefix
+        self._log = log
+        self._client = docker_from_env()
+        self._image_checked = False
+
+    def _ensure_image_exists(self):
+        """Make sure the Docker image exists, building it if needed."""
+        from docker.errors import ImageNotFound
+
+        if self._image_checked:
+            return
+        try:
+            self._client.images.get(self.image_name)
+            self._log(f"Using existing Docker image: {self.image_name}")
+        except ImageNotFound:
+            if not self.dockerfile_path:
+                raise ValueError(f"Docker image {self.image_name} not found and no Dockerfile provided")
+
+            if not os.path.exists(self.dockerfile_path):
+                raise FileNotFoundError(f"Dockerfile not found at {self.dockerfile_path}")
+
+            self._log(f"Building Docker image {self.image_name} from {self.dockerfile_path}")
+            self._client.images.build(
+                path=os.path.dirname(self.dockerfile_path),
+                dockerfile=os.path.basename(self.dockerfile_path),
+                tag=self.image_name,
+                rm=True
+            )
+            self._log(f"Successfully built image: {self.image_name}")
+        self._image_checked = True
+
+    def start(self):
+        """
+        Start a new container and a kernel inside it.
+
+        Returns:
+            tuple: (container, KernelClient)
+        """
+        self._ensure_image_exists()
+        name = f"{self.name_prefix}-{uuid.uuid4().hex[:8]}"
+        self._log(f"Creating container {name} from image: {self.image_name}")
+        container = self._client.containers.run(
+            self.image_name,
+            detach=True,
+            tty=True,
+            stdin_open=True,
+            working_dir="/workspace",
+            name=name,
+            labels={"business_analyst.sandbox": "true"},
+            volumes={self.workspace: {"bind": "/workspace", "mode": "rw"}},
+            remove=False
+        )
+        try:
+            channel = DockerExecChannel(
+                container,
+                ["python3", "-u", KERNEL_SCRIPT_PATH],
+                environment={"PYTHONIOENCODING": "utf-8"}
+            )
+            return container, KernelClient(channel)
+        except Exception:
+            self.stop(container)
+            raise
+
+    def install(self, container, library):
+        """
+        Install a pip package in the container.
+
+        Returns:
+            tuple: (success, installer output)
+        """
+        result = container.exec_run(["pip", "install", "--no-cache-dir", library])
+        return result.exit_code == 0, result.output.decode("utf-8", errors="replace")
+
+    def stop(self, container):
+        """Stop and remove a container."""
+        try:
+            container.stop()
+            container.remove()
+        except Exception as e:
+            self._log(f"Error removing container {container.short_id}: {str(e)}")
+
+
+class LocalSubprocessBackend:
+    """
+    Starts sandboxes as local Python child processes.
+
+    This offers no isolation and is meant for development and tests on machines
+    without a Docker daemon.
+    """
+
+    def __init__(self, workspace=None, python_executable=None, log=print):
+        """
+        Args:
+            workspace (str, optional): Working directory for the kernels (defaults to cwd)
+            python_executable (str, optional): Interpreter to run (defaults to the current one)
+            log (callable): Logging function
+        """
+        self.workspace = workspace or os.getcwd()
+        self.python_executable = python_executable or sys.executable
+        self._log = log
+
+    def start(self):
+        """
+        Start a kernel process.
+
+        Returns:
+            tuple: (subprocess.Popen, KernelClient)
+        """
+        process = subprocess.Popen(
+            [self.python_executable, "-u", LOCAL_KERNEL_SCRIPT_PATH],
+            cwd=self.workspace,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            env=dict(os.environ, PYTHONIOENCODING="utf-8"),
+        )
+        try:
+            return process, KernelClient(SubprocessChannel(process))
+        except Exception:
+            self.stop(process)
+            raise
+
+    def install(self, process, library):
+        """
+        Install a pip package into the kernel's interpreter.
+
+        Returns:
+            tuple: (success, installer output)
+        """
+        result = subprocess.run(
+            [self.python_executable, "-m", "pip", "install", "--no-cache-dir", library],
+            capture_output=True,
+            text=True,
+        )
+        return result.returncode == 0, result.stdout + result.stderr
+
+    def stop(self, process):
+        """Terminate the kernel process."""
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+class Sandbox:
+    """A running kernel together with the backend resource that hosts it."""
+
+    def __init__(self, backend, handle, kernel):
+        """
+        Args:
+            backend: Backend that created the sandbox
+            handle: Backend-specific resource (container or process)
+            kernel (KernelClient): Client for the kernel running in the sandbox
+        """
+        self.id = uuid.uuid4().hex[:8]
+        self.backend = backend
+        self.handle = handle
+        self.kernel = kernel
+        self.installed_libraries = []
+        self.last_used = time.time()
+
+    def execute(self, code, timeout=None, **options):
+        """Execute code in the sandbox kernel, see KernelClient.execute() for the options."""
+        self.last_used = time.time()
+        return self.kernel.execute(code, timeout=timeout, **options)
+
+    def install_libraries(self, libraries, log=print):
+        """Install libraries that haven't been installed in this sandbox yet."""
+        for library in libraries:
+            if library in self.installed_libraries:
+                log(f"Library already installed, skipping: {library}")
+                continue
+
+            log(f"Installing library: {library}")
+            ok, output = self.backend.install(self.handle, library)
+            if ok:
+                self.installed_libraries.append(library)
+                log(f"Successfully installed {library}")
+            else:
+                log(f"Failed to install {library}: {output}")
+
+    def is_healthy(self):
+        """Return True if the kernel answers a ping."""
+        return self.kernel.is_alive() and self.kernel.ping()
+
+    def close(self):
+        """Shut down the kernel and release the backend resource."""
+        self.kernel.close()
+        self.backend.stop(self.handle)
+
+
+class ContainerPool:
+    """Keeps a number of warm sandboxes ready to be leased."""
+
+    def __init__(self, backend, min_size=1, max_size=4, preload_code="",
+                 health_check_interval=30, acquire_timeout=300, verbose=True):
+        """
+        Args:
+            backend: DockerSandboxBackend or LocalSubprocessBackend
+            min_size (int): Number of sandboxes to keep started
+            max_size (int): Upper bound on concurrently existing sandboxes
+            preload_code (str): Code run in every new kernel (imports, dataset loading);
+                                 the resulting state is what a reset returns to
+            health_check_interval (float): Seconds between health checks, 0 disables them
+            acquire_timeout (float): Default seconds to wait for a free sandbox
+            verbose (bool): Print pool log messages
+        """
+        if max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+
+        self.backend = backend
+        self.min_size = min_size
+        self.max_size = max_size
+        self.preload_code = preload_code
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.verbose = verbose
+
+        self._idle = []
+        self._leased = set()
+        self._starting = 0
+        self._checking = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._health_thread = None
+
+    @classmethod
+    def from_config(cls, sandbox_config, workspace=None):
+        """
+        Build a pool from the `sandbox` section of system.yaml.
+
+        Args:
+            sandbox_config (dict): Sandbox configuration
+            workspace (str, optional): Directory shared with the sandboxes
+
+        Returns:
+            ContainerPool: The configured (not yet started) pool
+        """
+        verbose = sandbox_config.get("verbose", True)
+        log = print if verbose else (lambda message: None)
+        backend_type = sandbox_config.get("backend", "docker").lower()
+        if backend_type == "docker":
+            backend = DockerSandboxBackend(
+                image_name=sandbox_config.get("image", "data-science-image"),
+                dockerfile_path=sandbox_config.get("dockerfile"),
+                workspace=workspace,
+                log=log,
+            )
+        elif backend_type == "local":
+            backend = LocalSubprocessBackend(workspace=workspace, log=log)
+        else:
+            raise ValueError(f"Unsupported sandbox backend: {backend_type}")
+
+        pool_config = sandbox_config.get("pool", {})
+        return cls(
+            backend,
+            min_size=pool_config.get("min_size", 1),
+            max_size=pool_config.get("max_size", 4),
+            preload_code=sandbox_config.get("preload", ""),
+            health_check_interval=pool_config.get("health_check_interval", 30),
+            acquire_timeout=pool_config.get("acquire_timeout", 300),
+            verbose=verbose,
+        )
+
+    def _log(self, message):
+        """Print log messages if verbose mode is enabled."""
+        if self.verbose:
+            print(f"[ContainerPool] {message}")
+
+    def _create_sandbox(self):
+        """Start a sandbox and run the preload code in it."""
+        handle, kernel = self.backend.start()
+        sandbox = Sandbox(self.backend, handle, kernel)
+        try:
+            if self.preload_code:
+                result = kernel.execute(self.preload_code)
+                if not result.get("ok"):
+                    raise KernelError(f"Preload code failed:\n{result.get('output', '')}")
+            kernel.snapshot()
+        except Exception:
+            sandbox.close()
+            raise
+        self._log(f"Sandbox {sandbox.id} ready")
+        return sandbox
+
+    def _total(self):
+        """Number of sandboxes that exist or are being started (lock must be held)."""
+        return len(self._idle) + len(self._leased) + self._starting + self._checking
+
+    def _fill_to_min_size(self):
+        """Start sandboxes until the pool holds at least min_size of them."""
+        while True:
+            with self._condition:
+                if self._closed or self._total() >= self.min_size:
+                    return
+                self._starting += 1
+            try:
+                sandbox = self._create_sandbox()
+            except Exception as e:
+                self._log(f"Failed to start sandbox: {str(e)}")
+                with self._condition:
+                    self._starting -= 1
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self._starting -= 1
+                self._idle.append(sandbox)
+                self._condition.notify_all()
+
+    def start(self):
+        """Pre-start min_size sandboxes and begin periodic health checks."""
+        self._log(f"Starting pool (min={self.min_size}, max={self.max_size})")
+        self._fill_to_min_size()
+        if self.health_check_interval and self._health_thread is None:
+            self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+            self._health_thread.start()
+
+    def acquire(self, timeout=None):
+        """
+        Lease a sandbox, starting a new one if the pool is below max_size.
+
+        Args:
+            timeout (float, optional): Seconds to wait (defaults to acquire_timeout)
+
+        Returns:
+            Sandbox: A sandbox for exclusive use until release()
+
+        Raises:
+            PoolExhaustedError: If no sandbox becomes available in time
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Sandbox pool has been shut down")
+                if self._idle:
+                    sandbox = self._idle.pop()
+                    self._leased.add(sandbox)
+                    return sandbox
+                if self._total() < self.max_size:
+                    self._starting += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(f"No sandbox available after {timeout} seconds")
+                self._condition.wait(remaining)
+
+        # Start a new sandbox outside the lock so other leases are not blocked
+        try:
+            sandbox = self._create_sandbox()
+        except Exception:
+            with self._condition:
+                self._starting -= 1
+                self._condition.notify_all()
+            raise
+        with self._condition:
+            self._starting -= 1
+            self._leased.add(sandbox)
+        return sandbox
+
+    def release(self, sandbox):
+        """
+        Return a leased sandbox after resetting it to its preloaded state.
+        Sandboxes that fail to reset are discarded and replaced.
+        """
+        healthy = True
+        try:
+            sandbox.kernel.reset()
+        except KernelError as e:
+            self._log(f"Sandbox {sandbox.id} failed to reset: {str(e)}")
+            healthy = False
+
+        with self._condition:
+            self._leased.discard(sandbox)
+            if healthy and not self._closed:
+                self._idle.append(sandbox)
+            self._condition.notify_all()
+
+        if not healthy or self._closed:
+            sandbox.close()
+            self._fill_to_min_size()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Context manager that acquires a sandbox and releases it afterwards."""
+        sandbox = self.acquire(timeout)
+        try:
+            yield sandbox
+        finally:
+            self.release(sandbox)
+
+    def health_check(self):
+        """
+        Ping idle sandboxes, replace the ones that stopped responding and
+        top the pool back up to min_size.
+
+        Returns:
+            int: Number of sandboxes that were replaced
+        """
+        with self._condition:
+            candidates = list(self._idle)
+            # Take them out of rotation while they are being checked
+            self._idle = []
+            self._checking += len(candidates)
+
+        healthy, dead = [], []
+        for sandbox in candidates:
+            (healthy if sandbox.is_healthy() else dead).append(sandbox)
+
+        with self._condition:
+            self._checking -= len(candidates)
+            self._idle.extend(healthy)
+            self._condition.notify_all()
+
+        for sandbox in dead:
+            self._log(f"Sandbox {sandbox.id} is unhealthy, replacing it")
+            sandbox.close()
+        self._fill_to_min_size()
+        return len(dead)
+
+    def _health_loop(self):
+        """Background loop running health checks until shutdown."""
+        while not self._closed:
+            time.sleep(self.health_check_interval)
+            if self._closed:
+                break
+            try:
+                self.health_check()
+            except Exception as e:
+                self._log(f"Health check failed: {str(e)}")
+
+    def stats(self):
+        """
+        Get current pool occupancy.
+
+        Returns:
+            dict: Counts of idle, leased and starting sandboxes
+        """
+        with self._condition:
+            return {
+                "idle": len(self._idle),
+                "leased": len(self._leased),
+                "starting": self._starting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+    def shutdown(self):
+        """Stop all sandboxes. Leased sandboxes are stopped when they are released."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for sandbox in idle:
+            sandbox.close()
+        self._log("Pool shut down")
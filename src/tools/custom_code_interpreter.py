@@ -1,184 +1,180 @@
-from typing import List, Optional
+import os
+from typing import Any, List, Optional
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field, PrivateAttr
-from docker import from_env as docker_from_env
-from docker.errors import ImageNotFound, NotFound
-import os
+from src.core.result_tables import format_table_preview
+from src.core.tool_output import clip_output
+from src.tools.kernel_client import KernelError
 
 class CodeExecutorSchema(BaseModel):
     """Input schema for CustomCodeInterpreterTool."""
-    
+
     code: str = Field(
         ...,
         description="Python code to execute. Always include print statements for output you want to see.",
     )
-    
+
     libraries_used: List[str] = Field(
         default=[],
         description="List of libraries to use (e.g., pandas, numpy, matplotlib). Only specify libraries not already installed.",
     )
 
 class CustomCodeInterpreterTool(BaseTool):
-    """Executes Python code in a persistent Docker container."""
-    
+    """Executes Python code in a warm kernel leased from a ContainerPool."""
+
     name: str = "Code Executor"
-    description: str = "Executes Python code and maintains state between executions."
+    description: str = (
+        "Executes Python code and maintains state between executions. "
+        "Variables, imports and loaded DataFrames from earlier runs are still available."
+    )
     args_schema: type[BaseModel] = CodeExecutorSchema
-    
+
     # Configuration (these are proper Pydantic fields)
-    image_name: str = "data-science-env:latest"
-    container_name: str = "persistent-code-executor"
+    pool: Any = None
+    # Called to get the pool on first use, if no pool was given
+    pool_provider: Any = None
     verbose: bool = True
-    
+    execution_timeout: float = 600
+    # List that successful executions are appended to, so they can be replayed later
+    recorder: Any = None
+    # Directory (relative to the sandbox workspace) that executions write files and figures to
+    output_dir: Optional[str] = None
+    # List that paths of the files produced in output_dir are appended to
+    artifacts: Any = None
+    # DataFrames shown by the code are returned as tables of up to this many rows
+    max_table_rows: int = 200
+    # Rows of each table included in the output the agent sees
+    preview_rows: int = 20
+    # List that the tables shown by successful executions are appended to
+    tables: Any = None
+    # Output of the latest execution, successful or not
+    last_output: Optional[str] = None
+    # Longer outputs are clipped to their first and last lines
+    max_output_chars: int = 8000
+    # DataFrames and Series with more rows than this are printed as a summary
+    summary_rows: int = 60
+    # Directory complete clipped outputs are written to, for the Output Page tool
+    spill_dir: Optional[str] = None
+
     # Use PrivateAttr for internal state that shouldn't be part of the model schema
-    _container = PrivateAttr(default=None)
-    _installed_libraries = PrivateAttr(default_factory=list)
-    _dockerfile_path = PrivateAttr(default=None)
-    
+    _sandbox = PrivateAttr(default=None)
+    _outputs_spilled = PrivateAttr(default=0)
+
     def __init__(self, **data):
         """Initialize with proper kwargs handling for Pydantic."""
         super().__init__(**data)
-        self._installed_libraries = []
-        
-        # Store dockerfile path if provided
-        if "dockerfile_path" in data:
-            self._dockerfile_path = data["dockerfile_path"]
-        
-        # Initialize container on startup
-        self._ensure_container_running()
-    
+        if self.pool is None and self.pool_provider is None:
+            raise ValueError("CustomCodeInterpreterTool requires a ContainerPool or a pool_provider")
+
     def _log(self, message: str) -> None:
         """Print log messages if verbose mode is enabled."""
         if self.verbose:
             print(f"[CodeExecutor] {message}")
-    
-    def _ensure_image_exists(self) -> None:
-        """Make sure the Docker image exists, building it if needed."""
-        client = docker_from_env()
-        
+
+    def _ensure_sandbox(self) -> None:
+        """Lease a sandbox from the pool on first use."""
+        if self._sandbox is None:
+            if self.pool is None:
+                self.pool = self.pool_provider()
+            self._sandbox = self.pool.acquire()
+            self._log(f"Leased sandbox {self._sandbox.id}")
+
+    def reset(self) -> None:
+        """Restore the leased kernel to its preloaded state, keeping the lease."""
+        if self._sandbox is None:
+            return
+
+        self._log("Resetting kernel state")
         try:
-            client.images.get(self.image_name)
-            self._log(f"Using existing Docker image: {self.image_name}")
-        except ImageNotFound:
-            if not self._dockerfile_path:
-                raise ValueError(f"Docker image {self.image_name} not found and no Dockerfile provided")
-            
-            if not os.path.exists(self._dockerfile_path):
-                raise FileNotFoundError(f"Dockerfile not found at {self._dockerfile_path}")
-            
-            self._log(f"Building Docker image {self.image_name} from {self._dockerfile_path}")
-            client.images.build(
-                path=os.path.dirname(self._dockerfile_path),
-                dockerfile=os.path.basename(self._dockerfile_path),
-                tag=self.image_name,
-                rm=True
-            )
-            self._log(f"Successfully built image: {self.image_name}")
-    
-    def _ensure_container_running(self) -> None:
-        """Ensure a container is running, creating one if needed."""
-        if self._container is not None:
-            # Container reference exists, check if it's still running
+            self._sandbox.kernel.reset()
+        except KernelError as e:
+            self._log(f"Kernel reset failed: {str(e)}")
+            self.release()
+
+    def release(self) -> None:
+        """Return the leased sandbox to the pool (call at the end of an analysis)."""
+        if self._sandbox is not None:
+            self._log(f"Releasing sandbox {self._sandbox.id}")
+            sandbox, self._sandbox = self._sandbox, None
+            self.pool.release(sandbox)
+
+    def _limit_output(self, output: str) -> str:
+        """Clip an output longer than max_output_chars, spilling the complete output to a file."""
+        if len(output) <= self.max_output_chars:
+            return output
+        note = "; print a summary instead, e.g. df.head() or an aggregate"
+        if self.spill_dir:
+            self._outputs_spilled += 1
+            output_id = f"output-{self._outputs_spilled}"
             try:
-                client = docker_from_env()
-                container = client.containers.get(self.container_name)
-                if container.status != "running":
-                    self._log(f"Container exists but not running. Starting it...")
-                    container.start()
-                self._container = container
-                self._log(f"Using existing container: {container.short_id}")
-                return
-            except NotFound:
-                self._log(f"Container reference exists but container not found. Creating new one.")
-                self._container = None
-        
-        # Create a new container
-        self._ensure_image_exists()
-        client = docker_from_env()
-        
-        # Remove existing container if any
-        try:
-            old_container = client.containers.get(self.container_name)
-            self._log(f"Removing old container: {old_container.short_id}")
-            old_container.stop()
-            old_container.remove()
-        except NotFound:
-            pass
-        
-        # Create and start new container
-        self._log(f"Creating new container from image: {self.image_name}")
-        self._container = client.containers.run(
-            self.image_name,
-            detach=True,
-            tty=True,
-            stdin_open=True,
-            working_dir="/workspace",
-            name=self.container_name,
-            volumes={os.getcwd(): {"bind": "/workspace", "mode": "rw"}},
-            remove=False  # Don't auto-remove when stopped
-        )
-        self._log(f"Created container: {self._container.short_id}")
-    
-    def _install_libraries(self, libraries: List[str]) -> None:
-        """Install libraries that haven't been installed yet."""
-        if not self._container:
-            self._ensure_container_running()
-        
-        for library in libraries:
-            if library in self._installed_libraries:
-                self._log(f"Library already installed, skipping: {library}")
-                continue
-                
-            self._log(f"Installing library: {library}")
-            result = self._container.exec_run(["pip", "install", "--no-cache-dir", library])
-            
-            if result.exit_code == 0:
-                self._installed_libraries.append(library)
-                if self.verbose:
-                    self._log(f"Successfully installed {library}")
-            else:
-                self._log(f"Failed to install {library}: {result.output.decode('utf-8')}")
-    
+                os.makedirs(self.spill_dir, exist_ok=True)
+                with open(os.path.join(self.spill_dir, f"{output_id}.txt"), "w", encoding="utf-8") as f:
+                    f.write(output)
+                note = f"; read them with the Output Page tool, output_id {output_id}"
+            except OSError as e:
+                self._log(f"Could not spill output: {str(e)}")
+        self._log(f"Clipped output of {len(output):,} characters")
+        return clip_output(output, self.max_output_chars, note)
+
     def _run(self, code: str = "", libraries_used: List[str] = []) -> str:
-        """Execute code in the persistent container."""
+        """Execute code in the leased sandbox."""
         self._log(f"Executing code with {len(libraries_used)} libraries")
-        
+
         try:
-            # Ensure container is running
-            self._ensure_container_running()
-            
+            self._ensure_sandbox()
+
             # Install any requested libraries
             if libraries_used:
-                self._install_libraries(libraries_used)
-            
-            # Execute the code
+                self._sandbox.install_libraries(libraries_used, log=self._log)
+
+            # Execute the code in the warm kernel
             self._log("Running code...")
-            result = self._container.exec_run(
-                ["python3", "-c", code],
-                environment={"PYTHONIOENCODING": "utf-8"}
-            )
-            
+            result = self._sandbox.execute(code, timeout=self.execution_timeout, output_dir=self.output_dir,
+                                           max_table_rows=self.max_table_rows, summary_rows=self.summary_rows)
+
             # Process the result
-            output = result.output.decode("utf-8")
-            if result.exit_code != 0:
-                self._log(f"Code execution failed with exit code {result.exit_code}")
-                return f"Error executing code:\n{output}"
-            
+            output = result.get("output", "")
+            self.last_output = output
+            if not result.get("ok"):
+                self._log("Code execution failed")
+                return f"Error executing code:\n{self._limit_output(output)}"
+
             self._log("Code executed successfully")
+            output = self._limit_output(output)
+            # The agent gets a preview of each table, the complete tables go to the user
+            tables = result.get("tables", [])
+            for table in tables:
+                if "file" in table:
+                    table["file"] = os.path.join(self.output_dir, table["file"])
+                if self.tables is not None:
+                    self.tables.append(table)
+                output = (output.rstrip("\n") + "\n\n" if output.strip() else "") + \
+                    format_table_preview(table, self.preview_rows) + "\n"
+            produced = result.get("artifacts", [])
+            if produced:
+                self._log(f"Collected output files: {', '.join(produced)}")
+                for name in produced:
+                    path = os.path.join(self.output_dir, name)
+                    if self.artifacts is not None and path not in self.artifacts:
+                        self.artifacts.append(path)
+                table_files = {os.path.basename(table["file"]) for table in tables if "file" in table}
+                files = [name for name in produced if name not in table_files]
+                if files:
+                    output += f"\n[Saved output files, shown to the user: {', '.join(files)}]"
+            if self.recorder is not None:
+                self.recorder.append({"tool": "code", "code": code, "libraries_used": list(libraries_used)})
             return output
-            
+
+        except KernelError as e:
+            # The kernel crashed or hung; the pool replaces it and the next call gets a fresh one
+            self._log(f"Kernel error: {str(e)}")
+            self.last_output = str(e)
+            self.release()
+            return f"Error executing code:\n{str(e)}. The Python session was restarted and previous variables are lost."
         except Exception as e:
             self._log(f"Error: {str(e)}")
             return f"Internal error: {str(e)}"
-    
+
     def cleanup(self) -> None:
-        """Stop and remove the container (call at end of session)."""
-        if self._container:
-            self._log("Cleaning up resources...")
-            try:
-                self._container.stop()
-                self._container.remove()
-                self._container = None
-                self._log("Container stopped and removed")
-            except Exception as e:
-                self._log(f"Error during cleanup: {str(e)}")
\ No newline at end of file
+        """Release the sandbox (call at end of session)."""
+        self.release()
@@ -0,0 +1,236 @@
+"""
+Host-side client for the sandbox kernel (see sandbox_kernel.py).
+
+The client talks to a kernel process through a channel, which is any object
+that can write request lines and yield response lines. Responses are read on a
+background thread so that every request can be given a timeout.
+"""
+import itertools
+import json
+import queue
+import threading
+
+# Path of the kernel script inside the sandbox (the project root is mounted at /workspace)
+KERNEL_SCRIPT_PATH = "/workspace/src/tools/sandbox_kernel.py"
+
+STDOUT_STREAM = 1
+
+
+class KernelError(Exception):
+    """Raised when the kernel process dies or stops responding."""
+
+
+class DockerExecChannel:
+    """Runs the kernel with `docker exec` and talks to it over the attached socket."""
+
+    def __init__(self, container, command, environment=None, workdir="/workspace"):
+        """
+        Start the kernel process inside a running container.
+
+        Args:
+            container: docker-py Container to run the kernel in
+            command (list): Command line that starts the kernel
+            environment (dict, optional): Extra environment variables
+            workdir (str): Working directory for the kernel process
+        """
+        self._container = container
+        api = container.client.api
+        exec_id = api.exec_create(
+            container.id,
+            command,
+            stdin=True,
+            stdout=True,
+            stderr=True,
+            tty=False,
+            environment=environment or {},
+            workdir=workdir,
+        )["Id"]
+        self._socket = api.exec_start(exec_id, socket=True)
+        # The raw socket is needed for writing; docker-py only wraps reads
+        self._raw_socket = getattr(self._socket, "_sock", self._socket)
+
+    def write_line(self, line):
+        """Send one request line to the kernel."""
+        self._raw_socket.sendall(line.encode("utf-8") + b"\n")
+
+    def read_lines(self):
+        """Yield response lines from the kernel's stdout until the stream ends."""
+        from docker.utils.socket import frames_iter
+
+        pending = b""
+        for stream, data in frames_iter(self._socket, tty=False):
+            if stream != STDOUT_STREAM:
+                # stderr carries crash output and stray writes, not protocol messages
+                continue
+            pending += data
+            while b"\n" in pending:
+                line, pending = pending.split(b"\n", 1)
+                yield line.decode("utf-8")
+
+    def close(self, pid=None):
+        """
+        Close the connection and stop the kernel process.
+
+        Args:
+            pid (int, optional): Kernel process id to kill inside the container
+        """
+        try:
+            self._socket.close()
+        except Exception:
+            pass
+        if pid:
+            try:
+                self._container.exec_run(["kill", "-9", str(pid)])
+            except Exception:
+                pass
+
+
+class SubprocessChannel:
+    """Talks to a kernel running as a local child process over its stdin/stdout pipes."""
+
+    def __init__(self, process):
+        """
+        Args:
+            process (subprocess.Popen): Kernel process started with text-mode pipes
+        """
+        self._process = process
+
+    def write_line(self, line):
+        """Send one request line to the kernel."""
+        self._process.stdin.write(line + "\n")
+        self._process.stdin.flush()
+
+    def read_lines(self):
+        """Yield response lines from the kernel's stdout until it exits."""
+        for line in self._process.stdout:
+            yield line.rstrip("\n")
+
+    def close(self, pid=None):
+        """Stop the kernel process."""
+        try:
+            self._process.kill()
+            self._process.wait(timeout=5)
+        except Exception:
+            pass
+
+
+class KernelClient:
+    """Sends requests to a sandbox kernel and waits for the matching responses."""
+
+    def __init__(self, channel, startup_timeout=60):
+        """
+        Attach to a freshly started kernel and wait until it is ready.
+
+        Args:
+            channel: Channel connected to the kernel process
+            startup_timeout (float): Seconds to wait for the ready message
+
+        Raises:
+            KernelError: If the kernel does not come up in time
+        """
+        self._channel = channel
+        self._responses = queue.Queue()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._alive = True
+        self.pid = None
+
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+
+        ready = self._next_response(startup_timeout)
+        if not ready.get("ready"):
+            raise KernelError(f"Unexpected kernel greeting: {ready}")
+        self.pid = ready.get("pid")
+
+    def _read_responses(self):
+        """Background loop that decodes response lines into the queue."""
+        try:
+            for line in self._channel.read_lines():
+                if not line.strip():
+                    continue
+                try:
+                    self._responses.put(json.loads(line))
+                except ValueError:
+                    continue
+        except Exception:
+            pass
+        finally:
+            # A None marks the end of the stream, i.e. the kernel is gone
+            self._responses.put(None)
+
+    def _next_response(self, timeout):
+        """Wait for the next response, raising if the kernel died or timed out."""
+        try:
+            response = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            # The kernel is still busy with the request; it can no longer be trusted
+            self._alive = False
+            raise KernelError(f"Kernel did not respond within {timeout} seconds")
+        if response is None:
+            self._alive = False
+            raise KernelError("Kernel process exited")
+        return response
+
+    def request(self, op, timeout=None, **fields):
+        """
+        Send a request and wait for its response.
+
+        Args:
+            op (str): Kernel operation (execute, reset, snapshot, ping)
+            timeout (float, optional): Seconds to wait, None waits forever
+            **fields: Extra request fields
+
+        Returns:
+            dict: The kernel response
+
+        Raises:
+            KernelError: If the kernel is dead or does not answer in time
+        """
+        if not self._alive:
+            raise KernelError("Kernel is not running")
+        with self._lock:
+            request_id = next(self._ids)
+            try:
+                self._channel.write_line(json.dumps(dict(fields, op=op, id=request_id)))
+            except Exception as e:
+                self._alive = False
+                raise KernelError(f"Failed to send request to kernel: {e}")
+            while True:
+                response = self._next_response(timeout)
+                if response.get("id") == request_id:
+                    return response
+
+    def execute(self, code, timeout=None, **options):
+        """
+        Execute code in the kernel's persistent namespace.
+
+        Options set to None are left out, e.g. output_dir (collect the files written
+        there) and max_table_rows (return DataFrames as tables of up to that many rows).
+        """
+        options = {key: value for key, value in options.items() if value is not None}
+        return self.request("execute", timeout=timeout, code=code, **options)
+
+    def reset(self, timeout=30):
+        """Restore the kernel namespace to its last snapshot."""
+        return self.request("reset", timeout=timeout)
+
+    def snapshot(self, timeout=30):
+        """Make the current kernel namespace the state that reset() restores."""
+        return self.request("snapshot", timeout=timeout)
+
+    def ping(self, timeout=5):
+        """Return True if the kernel answers within the timeout."""
+        try:
+            return self.request("ping", timeout=timeout).get("ok", False)
+        except KernelError:
+            return False
+
+    def is_alive(self):
+        """Return False once the kernel has exited or timed out."""
+        return self._alive
+
+    def close(self):
+        """Shut down the kernel process."""
+        self._alive = False
+        self._channel.close(self.pid)
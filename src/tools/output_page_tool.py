@@ -0,0 +1,44 @@
+import os
+import re
+from typing import Optional
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+from src.core.tool_output import read_output_page
+
+# Ids the Code Executor gives the outputs it spills, see CustomCodeInterpreterTool
+OUTPUT_ID_PATTERN = re.compile(r"^output-\d+$")
+
+class OutputPageSchema(BaseModel):
+    """Input schema for OutputPageTool."""
+
+    output_id: str = Field(..., description="Id of the clipped output, e.g. output-1.")
+    start_line: int = Field(default=1, description="First line to read, counting from 1.")
+    line_count: int = Field(default=0, description="Lines to read. Default: one page.")
+
+class OutputPageTool(BaseTool):
+    """Reads lines of Code Executor outputs that were too long to return whole."""
+
+    name: str = "Output Page"
+    description: str = (
+        "Reads more lines of a Code Executor output that was clipped because it was too long. "
+        "Only use it when the omitted part is really needed; printing a summary is usually better."
+    )
+    args_schema: type[BaseModel] = OutputPageSchema
+
+    # Configuration (these are proper Pydantic fields)
+    # Directory the Code Executor spills complete outputs to
+    spill_dir: Optional[str] = None
+    page_lines: int = 200
+    max_chars: int = 8000
+    verbose: bool = True
+
+    def _run(self, output_id: str = "", start_line: int = 1, line_count: int = 0) -> str:
+        """Return the requested lines."""
+        if self.verbose:
+            print(f"[OutputPage] Reading {output_id} from line {start_line}")
+        output_id = output_id.strip()
+        path = os.path.join(self.spill_dir or "", f"{output_id}.txt")
+        if not self.spill_dir or not OUTPUT_ID_PATTERN.match(output_id) or not os.path.isfile(path):
+            return f"Error: unknown output '{output_id}'"
+        return read_output_page(path, start_line=start_line, line_count=line_count or self.page_lines,
+                                max_chars=self.max_chars)
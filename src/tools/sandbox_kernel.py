@@ -0,0 +1,385 @@
+"""
+Long-lived Python kernel that runs inside the code execution sandbox.
+
+The kernel reads one JSON request per line on stdin and writes one JSON
+response per line on stdout. Code runs in a persistent namespace, so imports,
+variables and loaded DataFrames survive between executions until a reset.
+
+DataFrames and Series a cell ends with, or passes to display(), are returned
+as tables with typed columns next to the printed output: at most
+max_table_rows rows inline, with the complete table written to the output
+directory as an Arrow IPC file when it is larger and pyarrow is available.
+
+With summary_rows set, DataFrames and Series longer than that are printed
+as their first and last rows and column statistics instead of in full.
+
+Only the standard library is used here so the script runs in any image;
+pandas and pyarrow are used when user code has imported them.
+"""
+import ast
+import contextlib
+import io
+import json
+import os
+import sys
+import traceback
+import types
+
+PROTOCOL_VERSION = 3
+
+# Files that count as charts the code saved itself
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".pdf")
+# Tables returned per cell at most
+MAX_TABLES = 10
+
+
+class Kernel:
+    """Executes code cells in a persistent namespace."""
+
+    def __init__(self):
+        """Initialize with a fresh namespace."""
+        self.namespace = self._new_namespace()
+        self.baseline = {}
+        # Figures and tables saved automatically so far, to give each file a new name
+        self.figures_saved = 0
+        self.tables_saved = 0
+
+    @staticmethod
+    def _new_namespace():
+        """Create an empty module-like namespace for user code."""
+        return {"__name__": "__main__", "__builtins__": __builtins__}
+
+    @staticmethod
+    def _file_versions(directory):
+        """Name -> (size, mtime) of the files in a directory."""
+        versions = {}
+        for entry in os.scandir(directory):
+            if entry.is_file():
+                stat = entry.stat()
+                versions[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return versions
+
+    def _save_open_figures(self, output_dir, saved):
+        """
+        Save the matplotlib figures a cell left open and close all figures.
+
+        Figures are only saved if the cell didn't save any images itself, so
+        charts it already saved are not captured twice.
+
+        Returns:
+            list: Names of the written files
+        """
+        pyplot = sys.modules.get("matplotlib.pyplot")
+        if pyplot is None:
+            return []
+        written = []
+        try:
+            if not any(name.lower().endswith(IMAGE_EXTENSIONS) for name in saved):
+                for number in pyplot.get_fignums():
+                    self.figures_saved += 1
+                    name = f"figure-{self.figures_saved}.png"
+                    pyplot.figure(number).savefig(os.path.join(output_dir, name), bbox_inches="tight")
+                    written.append(name)
+        finally:
+            # Open figures would otherwise pile up in the persistent session
+            pyplot.close("all")
+        return written
+
+    @staticmethod
+    def _column_type(dtype):
+        """Type name of a column in a table payload."""
+        if str(dtype) == "category":
+            return "category"
+        return {"b": "boolean", "i": "integer", "u": "integer", "f": "number",
+                "M": "datetime", "m": "duration"}.get(dtype.kind, "string")
+
+    def _encode_table(self, value, name, max_rows, output_dir):
+        """
+        Convert a DataFrame or Series into a table payload.
+
+        Returns:
+            dict or None: name, columns (name and type), rows (at most max_rows),
+                          row_count, truncated and, if the complete table was
+                          written to output_dir, file; None for other values
+        """
+        pandas = sys.modules.get("pandas")
+        if pandas is None or not isinstance(value, (pandas.DataFrame, pandas.Series)):
+            return None
+        frame = value.to_frame(name=value.name if value.name is not None else "value") \
+            if isinstance(value, pandas.Series) else value
+        # Group-by keys live in named index levels; a plain row index is dropped
+        if any(level is not None for level in frame.index.names):
+            frame = frame.reset_index(allow_duplicates=True)
+        else:
+            frame = frame.reset_index(drop=True)
+        frame.columns = [" / ".join(str(part) for part in col) if isinstance(col, tuple) else str(col)
+                         for col in frame.columns]
+
+        table = {
+            "name": name,
+            "columns": [{"name": col, "type": self._column_type(dtype)}
+                        for col, dtype in zip(frame.columns, frame.dtypes)],
+            "rows": json.loads(frame.head(max_rows).to_json(orient="values", date_format="iso",
+                                                           default_handler=str)),
+            "row_count": len(frame),
+            "truncated": len(frame) > max_rows,
+        }
+        if table["truncated"] and output_dir:
+            self.tables_saved += 1
+            file_name = f"table-{self.tables_saved}.arrow"
+            try:
+                # Uncompressed, so pages can be read from a memory map
+                frame.to_feather(os.path.join(output_dir, file_name), compression="uncompressed")
+                table["file"] = file_name
+            except Exception:
+                # No pyarrow, or columns Arrow can't store: only the first rows are returned
+                pass
+        return table
+
+    @staticmethod
+    def _summarize(value, summary_rows):
+        """
+        Describe a long DataFrame or Series in a bounded number of lines.
+
+        Returns:
+            str or None: Shape, first and last rows and column statistics; None
+                         for other values and for tables of up to summary_rows rows
+        """
+        pandas = sys.modules.get("pandas")
+        if pandas is None or not isinstance(value, (pandas.DataFrame, pandas.Series)) or len(value) <= summary_rows:
+            return None
+        frame = value.to_frame() if isinstance(value, pandas.Series) else value
+        parts = [
+            f"<{type(value).__name__} with {len(frame):,} rows x {len(frame.columns)} columns, "
+            f"summarized because it has more than {summary_rows} rows>",
+            "First rows:", frame.head(5).to_string(),
+            "Last rows:", frame.tail(5).to_string(),
+        ]
+        try:
+            # One line per column, so the summary grows with the width, not the length
+            parts += ["Column statistics:", frame.describe(include="all").T.to_string()]
+        except Exception:
+            pass
+        return "\n".join(parts)
+
+    def _run_cell(self, code):
+        """
+        Execute a cell, evaluating a final expression separately as an interactive shell does.
+
+        Returns:
+            tuple: (value of the final expression or None, variable name if it was a bare name)
+        """
+        tree = ast.parse(code, "<cell>", "exec")
+        if not tree.body or not isinstance(tree.body[-1], ast.Expr):
+            exec(compile(tree, "<cell>", "exec"), self.namespace)
+            return None, None
+        last = tree.body.pop()
+        exec(compile(tree, "<cell>", "exec"), self.namespace)
+        value = eval(compile(ast.Expression(last.value), "<cell>", "eval"), self.namespace)
+        return value, last.value.id if isinstance(last.value, ast.Name) else None
+
+    @staticmethod
+    def _cell_traceback(tb):
+        """Drop the kernel's own frames so a traceback starts at the cell."""
+        while tb is not None and tb.tb_frame.f_code.co_filename == __file__:
+            tb = tb.tb_next
+        return tb
+
+    def execute(self, code, output_dir=None, max_table_rows=None, summary_rows=None):
+        """
+        Execute a code cell and capture everything it prints.
+
+        Args:
+            code (str): Python source to execute
+            output_dir (str, optional): Directory for files the cell produces, available
+                                        to it as OUTPUT_DIR. Files written there and
+                                        figures left open are reported as artifacts.
+            max_table_rows (int, optional): If given, DataFrames and Series the cell
+                                            ends with or passes to display() are returned
+                                            as tables with up to this many rows
+            summary_rows (int, optional): If given, print() shows DataFrames and
+                                          Series with more rows as a summary
+
+        Returns:
+            dict: Response with the captured output, error state, the tables if
+                  max_table_rows was given and, if an output directory was given,
+                  the names of the artifacts in it
+        """
+        before = None
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            self.namespace["OUTPUT_DIR"] = output_dir
+            before = self._file_versions(output_dir)
+        tables = []
+
+        def add_table(value, name):
+            """Add a DataFrame or Series to the returned tables; False for other values."""
+            if len(tables) >= MAX_TABLES:
+                return False
+            try:
+                table = self._encode_table(value, name or f"table {len(tables) + 1}", max_table_rows, output_dir)
+            except Exception:
+                return False
+            if table is not None:
+                tables.append(table)
+            return table is not None
+
+        if max_table_rows is not None:
+            def display(*values, name=None):
+                """Show DataFrames and Series as tables, print anything else."""
+                for value in values:
+                    if not add_table(value, name):
+                        print(value)
+
+            self.namespace["display"] = display
+        if summary_rows is not None:
+            def summarizing_print(*values, **kwargs):
+                """Print, summarizing long DataFrames and Series."""
+                summaries = [self._summarize(value, summary_rows) for value in values]
+                print(*(value if summary is None else summary for value, summary in zip(values, summaries)), **kwargs)
+
+            self.namespace["print"] = summarizing_print
+        buffer = io.StringIO()
+        ok = True
+        try:
+            with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+                value, variable = self._run_cell(code)
+                # Echo the final expression like an interactive shell, unless it is returned as a table
+                if value is not None and (max_table_rows is None or not add_table(value, variable)):
+                    print(repr(value))
+        except SystemExit as e:
+            # Scripts often end with sys.exit(); treat a clean exit as success
+            ok = e.code in (None, 0)
+            if not ok:
+                buffer.write(f"SystemExit: {e.code}\n")
+        except BaseException as e:
+            ok = False
+            buffer.write("".join(traceback.format_exception(type(e), e, self._cell_traceback(e.__traceback__))))
+        response = {"ok": ok, "output": buffer.getvalue()}
+        if max_table_rows is not None:
+            response["tables"] = tables
+
+        if output_dir:
+            try:
+                saved = [name for name, version in self._file_versions(output_dir).items()
+                         if before.get(name) != version]
+                saved += self._save_open_figures(output_dir, saved)
+            except Exception as e:
+                saved = []
+                response["output"] += f"\nCould not collect output files: {e}\n"
+            response["artifacts"] = sorted(saved)
+        return response
+
+    @staticmethod
+    def _copy_on_write_enabled():
+        """Return True if pandas isolates shallow copies (copy-on-write)."""
+        pandas = sys.modules.get("pandas")
+        if pandas is None:
+            return False
+        if int(pandas.__version__.split(".")[0]) >= 3:
+            return True
+        try:
+            return pandas.options.mode.copy_on_write is True
+        except AttributeError:
+            return False
+
+    @classmethod
+    def _detach(cls, value):
+        """
+        Return a private copy of pandas/numpy objects so in-place changes made
+        by user code cannot leak into the baseline. Other values are shared.
+        With copy-on-write, pandas copies are shallow and keep sharing memory
+        (e.g. with memory-mapped datasets) until they are modified.
+        """
+        if isinstance(value, types.ModuleType):
+            return value
+        package = type(value).__module__.split(".")[0]
+        if package == "pandas" and hasattr(value, "copy"):
+            return value.copy(deep=not cls._copy_on_write_enabled())
+        if package == "numpy" and hasattr(value, "copy"):
+            return value.copy()
+        return value
+
+    def snapshot(self):
+        """Remember the current namespace (e.g. preloaded datasets) as the reset baseline."""
+        self.baseline = {
+            key: self._detach(value)
+            for key, value in self.namespace.items()
+            if key not in ("__name__", "__builtins__")
+        }
+        return {"ok": True, "output": ""}
+
+    def reset(self):
+        """
+        Drop all user state and restore the baseline. Imported modules stay
+        cached in sys.modules, so re-importing them after a reset is cheap.
+        """
+        self.namespace = self._new_namespace()
+        self.namespace.update({key: self._detach(value) for key, value in self.baseline.items()})
+        return {"ok": True, "output": ""}
+
+    def handle(self, request):
+        """
+        Dispatch a single request.
+
+        Args:
+            request (dict): Decoded request with an "op" key
+
+        Returns:
+            dict: Response to send back to the host
+        """
+        op = request.get("op")
+        if op == "execute":
+            return self.execute(request.get("code", ""), request.get("output_dir"), request.get("max_table_rows"),
+                                request.get("summary_rows"))
+        if op == "reset":
+            return self.reset()
+        if op == "snapshot":
+            return self.snapshot()
+        if op == "ping":
+            return {"ok": True, "output": "", "pid": os.getpid(), "protocol": PROTOCOL_VERSION}
+        return {"ok": False, "output": f"Unknown kernel operation: {op}"}
+
+
+def main():
+    """Serve requests until stdin is closed."""
+    # Keep a private handle on the real stdout for protocol messages, then
+    # point file descriptor 1 at stderr so that anything writing to the raw
+    # descriptor (subprocesses, C extensions) cannot corrupt the protocol.
+    # The same goes for stdin, which carries the requests.
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+    requests = os.fdopen(os.dup(sys.stdin.fileno()), "r", encoding="utf-8")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, sys.stdin.fileno())
+    os.close(devnull)
+
+    # Figures are rendered to files, there is no display
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    # Make modules in the working directory importable, as with `python -c`
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    kernel = Kernel()
+    protocol_out.write(json.dumps({"ok": True, "output": "", "ready": True, "pid": os.getpid()}) + "\n")
+    protocol_out.flush()
+
+    for line in requests:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {"ok": False, "output": f"Invalid request: {e}"}
+        else:
+            response = kernel.handle(request)
+            if "id" in request:
+                response["id"] = request["id"]
+        protocol_out.write(json.dumps(response) + "\n")
+        protocol_out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from typing import Any
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+class SchemaLookupSchema(BaseModel):
+    """Input schema for SchemaLookupTool."""
+
+    dataset_name: str = Field(..., description="Name of the dataset, e.g. superstore.")
+    columns: str = Field(
+        ...,
+        description=(
+            "Comma-separated column names, or parts of names to search for, e.g. "
+            "'Order Date, discount' or 'ship'."
+        ),
+    )
+
+class SchemaLookupTool(BaseTool):
+    """Looks up the statistics of dataset columns left out of a compact schema."""
+
+    name: str = "Schema Lookup"
+    description: str = (
+        "Returns the data type, null and distinct counts, value range and most frequent values "
+        "of dataset columns, by name or by part of the name. Use it for columns that are only "
+        "listed by name in the schema, instead of running code to inspect them."
+    )
+    args_schema: type[BaseModel] = SchemaLookupSchema
+
+    # Configuration (these are proper Pydantic fields)
+    schema_registry: Any = None
+    verbose: bool = True
+
+    def _run(self, dataset_name: str = "", columns: str = "") -> str:
+        """Describe the matching columns."""
+        if self.verbose:
+            print(f"[SchemaLookup] Looking up '{columns}' in {dataset_name}")
+        return self.schema_registry.describe_columns(dataset_name, columns.split(","))
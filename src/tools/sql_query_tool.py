@@ -0,0 +1,118 @@
+from typing import Any
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+from src.core.result_tables import encode_table
+
+class SQLQuerySchema(BaseModel):
+    """Input schema for SQLQueryTool."""
+
+    query: str = Field(
+        ...,
+        description=(
+            "A single read-only SQL SELECT statement (DuckDB dialect). Tables are named after "
+            "the datasets; wrap table and column names containing spaces or dashes in double "
+            'quotes, e.g. SELECT "Sub-Category", SUM("Sales") FROM "superstore" GROUP BY 1.'
+        ),
+    )
+
+class SQLQueryTool(BaseTool):
+    """Runs read-only SQL in-process against the datasets held by a DataManager."""
+
+    name: str = "SQL Query"
+    description: str = (
+        "Runs a read-only SQL query against the loaded datasets with an embedded columnar "
+        "engine and returns the result table. Prefer it over the Code Executor for filters, "
+        "group-bys, joins and aggregations; it is much faster and needs no Python code."
+    )
+    args_schema: type[BaseModel] = SQLQuerySchema
+
+    # Configuration (these are proper Pydantic fields)
+    data_manager: Any = None
+    max_rows: int = 200
+    verbose: bool = True
+    # List that successful queries are appended to, so they can be replayed later
+    recorder: Any = None
+    # List that the result tables of successful queries are appended to
+    tables: Any = None
+
+    def _log(self, message: str) -> None:
+        """Print log messages if verbose mode is enabled."""
+        if self.verbose:
+            print(f"[SQLQuery] {message}")
+
+    def _connect(self):
+        """Open an in-memory connection with every dataset registered as a table."""
+        import duckdb
+
+        # No file system access: queries can only see the registered datasets
+        connection = duckdb.connect(config={"enable_external_access": False})
+        for name in self.data_manager.list_datasets():
+            df = self.data_manager.get_dataset(name)
+            if df is not None:
+                connection.register(name, df)
+                # Pre-aggregated totals, sized by the distinct dimension values rather than the rows
+                cube = self.data_manager.get_rollup(name)
+                if cube is not None:
+                    connection.register(f"{name}_rollup", cube.table())
+                continue
+            lazy_dataset = self.data_manager.get_lazy_dataset(name)
+            if lazy_dataset is not None:
+                # Arrow datasets are scanned lazily, with filters and projections pushed down
+                connection.register(name, lazy_dataset.arrow_dataset)
+        return connection
+
+    @staticmethod
+    def _validate(connection, query: str) -> None:
+        """Reject anything other than a single SELECT statement."""
+        import duckdb
+
+        statements = connection.extract_statements(query)
+        if len(statements) != 1:
+            raise ValueError("Provide exactly one SQL statement")
+        if statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only read-only SELECT queries are allowed")
+
+    def run_query(self, query: str, limit: int):
+        """
+        Run a read-only query and fetch its first rows.
+
+        Args:
+            query (str): A single SELECT statement
+            limit (int): Rows fetched at most
+
+        Returns:
+            pandas.DataFrame: The result rows
+
+        Raises:
+            ValueError: If the query is not a single SELECT statement
+        """
+        connection = self._connect()
+        try:
+            self._validate(connection, query)
+            return connection.sql(query).limit(limit).df()
+        finally:
+            connection.close()
+
+    def _run(self, query: str = "") -> str:
+        """Execute the query and return the result as text."""
+        self._log(f"Running query: {query}")
+        try:
+            # Only fetch what we show, plus one row to detect truncation
+            result = self.run_query(query, self.max_rows + 1)
+            output = result.head(self.max_rows).to_string(index=False)
+            if len(result) > self.max_rows:
+                output += f"\n\n(showing the first {self.max_rows} rows; aggregate or filter further to see the rest)"
+            self._log(f"Query returned {min(len(result), self.max_rows)} rows")
+            if self.tables is not None:
+                table = encode_table(result, "SQL result", self.max_rows)
+                if table["truncated"]:
+                    # On its own line, so a trailing comment in the query doesn't swallow the parenthesis
+                    count_query = f"SELECT COUNT(*) FROM ({query.strip().rstrip(';')}\n)"
+                    table["row_count"] = int(self.run_query(count_query, 1).iloc[0, 0])
+                self.tables.append(table)
+            if self.recorder is not None:
+                self.recorder.append({"tool": "sql", "query": query})
+            return output
+        except Exception as e:
+            self._log(f"Error: {str(e)}")
+            return f"Error executing query:\n{str(e)}"
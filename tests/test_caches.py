@@ -0,0 +1,187 @@
+"""
+Tests for the answer, code and semantic caches.
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.application.answer_cache import AnswerCache
+from src.application.code_cache import CodeCache
+from src.application.semantic_cache import HashingEmbedder, SemanticCache, question_constraints
+
+VOCABULARY = {"sales", "profit", "region", "segment", "west", "east", "consumer"}
+
+
+class CacheTestCase(unittest.TestCase):
+    """Runs each test on caches in a fresh directory."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def later(self, seconds):
+        """Patch the clock of the caches to run ahead by seconds."""
+        now = time.time() + seconds
+        return mock.patch("src.application.sqlite_cache.time.time", return_value=now)
+
+
+class AnswerCacheTest(CacheTestCase):
+    """Keys, expiry and eviction of cached answers."""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = AnswerCache(self.path("answers.sqlite"), ttl_seconds=60, max_entries=2)
+
+    def tearDown(self):
+        self.cache.close()
+        super().tearDown()
+
+    def test_hit_returns_answer_and_outputs(self):
+        outputs = [["artifact", {"name": "chart.png"}]]
+        self.cache.put("Sales by region?", "superstore", "f1", "v1", "West leads", outputs)
+
+        # Questions are normalized: case, whitespace and trailing punctuation don't matter
+        cached = self.cache.get("  sales  by REGION", "superstore", "f1", "v1")
+        self.assertEqual(cached, {"answer": "West leads", "outputs": outputs})
+        self.assertEqual((self.cache.stats()["hits"], self.cache.stats()["misses"]), (1, 0))
+
+    def test_changed_data_or_config_misses(self):
+        self.cache.put("sales by region", "superstore", "f1", "v1", "West leads")
+
+        self.assertIsNone(self.cache.get("sales by region", "superstore", "f2", "v1"))
+        self.assertIsNone(self.cache.get("sales by region", "superstore", "f1", "v2"))
+        self.assertIsNone(self.cache.get("sales by region", "orders", "f1", "v1"))
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.put("sales by region", "superstore", "f1", "v1", "West leads")
+
+        with self.later(61):
+            self.assertIsNone(self.cache.get("sales by region", "superstore", "f1", "v1"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.put("first", "superstore", "f1", "v1", "1")
+        with self.later(1):
+            self.cache.put("second", "superstore", "f1", "v1", "2")
+        with self.later(2):
+            self.assertIsNotNone(self.cache.get("first", "superstore", "f1", "v1"))
+        with self.later(3):
+            self.cache.put("third", "superstore", "f1", "v1", "3")
+
+        self.assertIsNotNone(self.cache.get("first", "superstore", "f1", "v1"))
+        self.assertIsNone(self.cache.get("second", "superstore", "f1", "v1"))
+        self.assertIsNotNone(self.cache.get("third", "superstore", "f1", "v1"))
+
+
+class CodeCacheTest(CacheTestCase):
+    """Storing and listing replayable steps."""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = CodeCache(self.path("code.sqlite"), ttl_seconds=60, max_entries=10)
+        self.steps = [{"tool": "sql", "query": "SELECT Region, SUM(Sales) FROM superstore GROUP BY Region"}]
+
+    def tearDown(self):
+        self.cache.close()
+        super().tearDown()
+
+    def test_entries_are_keyed_by_interpretation_and_schema(self):
+        self.cache.put("sum sales by region", "superstore", "s1", "Sales by region?", self.steps)
+
+        entry = self.cache.get("sum sales by region", "superstore", "s1")
+        self.assertEqual((entry["question"], entry["steps"]), ("Sales by region?", self.steps))
+        self.assertIsNone(self.cache.get("sum sales by region", "superstore", "s2"))
+        self.assertIsNone(self.cache.get("sum profit by region", "superstore", "s1"))
+
+    def test_entries_lists_unexpired_steps_of_a_schema(self):
+        self.cache.put("sum sales by region", "superstore", "s1", "Sales by region?", self.steps)
+        self.cache.put("sum sales by segment", "superstore", "s2", "Sales by segment?", self.steps)
+
+        self.assertEqual([entry["question"] for entry in self.cache.entries("superstore", "s1")],
+                         ["Sales by region?"])
+        with self.later(61):
+            self.assertEqual(self.cache.entries("superstore", "s1"), [])
+
+
+class QuestionConstraintsTest(unittest.TestCase):
+    """Literal constraints that must match for questions to share an interpretation."""
+
+    def test_numbers_names_and_modifiers_are_constraints(self):
+        constraints = question_constraints("Top 5 products in the West in 2017", VOCABULARY)
+        self.assertEqual(constraints, ["name:west", "number:2017", "number:5", "word:top"])
+
+    def test_paraphrases_have_the_same_constraints(self):
+        self.assertEqual(question_constraints("Sales by region", VOCABULARY),
+                         question_constraints("what's revenue per region", VOCABULARY))
+        self.assertEqual(question_constraints("average profit by segment", VOCABULARY),
+                         question_constraints("mean profit for each segment", VOCABULARY))
+
+    def test_different_filters_have_different_constraints(self):
+        for first, second in [("sales in 2016", "sales in 2017"),
+                              ("sales in the West", "sales in the East"),
+                              ("sales by region", "sales by segment"),
+                              ("sales by region", "sales trend by region"),
+                              ('sales of "Tables"', 'sales of "Chairs"')]:
+            with self.subTest(first=first, second=second):
+                self.assertNotEqual(question_constraints(first, VOCABULARY),
+                                    question_constraints(second, VOCABULARY))
+
+    def test_columns_named_like_a_synonym_are_kept(self):
+        # A dataset with its own revenue column: revenue and sales differ
+        vocabulary = VOCABULARY | {"revenue"}
+        self.assertNotEqual(question_constraints("revenue by region", vocabulary),
+                            question_constraints("sales by region", vocabulary))
+
+
+class SemanticCacheTest(CacheTestCase):
+    """Reusing interpretations of similar questions."""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = self.open()
+        self.cache.add("Sales by region", "superstore", "f1", "sum sales by region", VOCABULARY)
+
+    def tearDown(self):
+        self.cache.close()
+        super().tearDown()
+
+    def open(self):
+        return SemanticCache(HashingEmbedder(), path=self.path("semantic.sqlite"), ttl_seconds=60, max_entries=10)
+
+    def test_paraphrase_reuses_interpretation(self):
+        similar = self.cache.lookup("what's revenue per region?", "superstore", "f1", VOCABULARY)
+        self.assertEqual(similar["interpretation"], "sum sales by region")
+        self.assertEqual(similar["question"], "Sales by region")
+
+    def test_question_with_other_constraints_misses(self):
+        for question in ["sales by segment", "profit by region", "sales by region in 2017", "top sales by region"]:
+            with self.subTest(question=question):
+                self.assertIsNone(self.cache.lookup(question, "superstore", "f1", VOCABULARY))
+
+    def test_changed_dataset_drops_entries(self):
+        self.assertIsNone(self.cache.lookup("sales per region", "superstore", "f2", VOCABULARY))
+        # The entries of the old version are gone, also after reopening the cache
+        self.cache.close()
+        self.cache = self.open()
+        self.assertIsNone(self.cache.lookup("sales per region", "superstore", "f1", VOCABULARY))
+
+    def test_entries_survive_reopening(self):
+        self.cache.close()
+        self.cache = self.open()
+        self.assertIsNotNone(self.cache.lookup("sales per region", "superstore", "f1", VOCABULARY))
+
+    def test_expired_entries_are_not_reused(self):
+        with self.later(61):
+            self.assertIsNone(self.cache.lookup("sales per region", "superstore", "f1", VOCABULARY))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests for the sandbox pool, run on the local subprocess backend so no Docker
+daemon is needed.
+"""
+import threading
+import unittest
+
+from src.tools.container_pool import ContainerPool, LocalSubprocessBackend, PoolExhaustedError
+
+
+class ContainerPoolTest(unittest.TestCase):
+    """Leasing, resetting and replacing sandboxes."""
+
+    def setUp(self):
+        self.pool = ContainerPool(
+            LocalSubprocessBackend(log=lambda message: None),
+            min_size=1,
+            max_size=1,
+            preload_code="preloaded = 1",
+            health_check_interval=0,
+            acquire_timeout=5,
+            verbose=False,
+        )
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_release_resets_to_preloaded_state(self):
+        sandbox = self.pool.acquire()
+        result = sandbox.execute("preloaded = 2\nleftover = 3")
+        self.assertTrue(result["ok"])
+        self.pool.release(sandbox)
+
+        again = self.pool.acquire()
+        # The pool holds one sandbox, so it is leased again after the reset
+        self.assertIs(again, sandbox)
+        result = again.execute("print(preloaded, 'leftover' in globals())")
+        self.assertEqual(result["output"].strip(), "1 False")
+        self.pool.release(again)
+        self.assertEqual(self.pool.stats()["idle"], 1)
+
+    def test_health_check_replaces_crashed_kernel(self):
+        with self.pool.lease() as sandbox:
+            crashed = sandbox
+        crashed.handle.kill()
+        crashed.handle.wait()
+
+        self.assertEqual(self.pool.health_check(), 1)
+        stats = self.pool.stats()
+        self.assertEqual((stats["idle"], stats["leased"]), (1, 0))
+
+        with self.pool.lease() as sandbox:
+            self.assertIsNot(sandbox, crashed)
+            result = sandbox.execute("print(preloaded)")
+            self.assertEqual(result["output"].strip(), "1")
+
+    def test_acquire_blocks_while_pool_is_full(self):
+        sandbox = self.pool.acquire()
+        with self.assertRaises(PoolExhaustedError):
+            self.pool.acquire(timeout=0.2)
+
+        leased = []
+        waiter = threading.Thread(target=lambda: leased.append(self.pool.acquire(timeout=10)))
+        waiter.start()
+        waiter.join(0.5)
+        self.assertTrue(waiter.is_alive())
+
+        self.pool.release(sandbox)
+        waiter.join(10)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(leased, [sandbox])
+        self.pool.release(sandbox)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,258 @@
+"""
+Tests for loading, caching and ingesting datasets.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from src.core.data_manager import DataManager
+from src.core.dataset_cache import DatasetCache
+from src.core.dtype_optimizer import optimize_dataframe
+from src.core.rollup_cube import RollupCube
+
+
+def orders(count, start=0):
+    """Order rows with a few regions, categories and dates."""
+    return pd.DataFrame({
+        "Region": [["West", "East", "South"][i % 3] for i in range(start, start + count)],
+        "Category": [["Furniture", "Technology"][i % 2] for i in range(start, start + count)],
+        "Order Date": [f"{1 + i % 28:02d}/{1 + i % 12:02d}/{2016 + i % 3}" for i in range(start, start + count)],
+        "Sales": [round(10 + i * 1.5, 2) for i in range(start, start + count)],
+    })
+
+
+class TemporaryDirectoryTestCase(unittest.TestCase):
+    """Runs each test in a fresh directory."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+class IngestDatasetTest(TemporaryDirectoryTestCase):
+    """Streaming CSV files into the partitioned store."""
+
+    def setUp(self):
+        super().setUp()
+        self.data_manager = DataManager({
+            "cache_enabled": False,
+            "share_with_sandbox": False,
+            "shared_dir": self.path("shared"),
+        })
+
+    def test_column_types_widen_when_later_chunks_differ(self):
+        orders = pd.DataFrame({
+            "Order ID": [str(i) for i in range(12)],
+            "Quantity": [str(i) for i in range(12)],
+            "Region": ["East", "West"] * 6,
+        })
+        # Only chunks after the first have a non-numeric id and a fractional quantity
+        orders.loc[8, "Order ID"] = "AB-1"
+        orders.loc[6, "Quantity"] = "1.5"
+        path = self.path("orders.csv")
+        orders.to_csv(path, index=False)
+
+        lazy_dataset = self.data_manager.ingest_dataset(path, partition_by="Region", chunksize=5)
+
+        self.assertIsNotNone(lazy_dataset)
+        data = lazy_dataset.scan()
+        self.assertEqual(len(data), 12)
+        self.assertIn("AB-1", set(data["Order ID"]))
+        self.assertIn("0", set(data["Order ID"]))
+        self.assertAlmostEqual(data["Quantity"].sum(), 61.5)
+        self.assertEqual(lazy_dataset.count_rows([("Region", "=", "West")]), 6)
+
+
+
+class RollupCubeTest(unittest.TestCase):
+    """Rollup lookups agree with aggregating the rows."""
+
+    def setUp(self):
+        self.df = orders(120)
+        self.df["Order Date"] = pd.to_datetime(self.df["Order Date"], format="%d/%m/%Y")
+        self.cube = RollupCube.build(self.df, ["Region", "Category", "Order Date:year"], ["Sales"], max_dimensions=2)
+
+    def expected(self, df, group_by):
+        grouped = df.groupby(group_by)["Sales"].agg(["sum", "count", "min", "max", "mean"])
+        return grouped.add_prefix("Sales_").reset_index()
+
+    def assertMatches(self, result, expected, group_by):
+        columns = list(expected.columns)
+        result = result[columns].sort_values(group_by).reset_index(drop=True)
+        expected = expected.sort_values(group_by).reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    def test_lookup_equals_groupby(self):
+        for group_by in (["Region"], ["Region", "Category"]):
+            with self.subTest(group_by=group_by):
+                self.assertMatches(self.cube.lookup(group_by), self.expected(self.df, group_by), group_by)
+
+    def test_lookup_by_date_part_with_filter(self):
+        df = self.df[self.df["Region"] == "West"].assign(order_date_year=self.df["Order Date"].dt.year)
+        result = self.cube.lookup(["Order Date:year"], filters={"Region": "West"})
+        self.assertMatches(result, self.expected(df, ["order_date_year"]), ["order_date_year"])
+
+    def test_grand_total_and_too_many_dimensions(self):
+        total = self.cube.lookup()
+        self.assertAlmostEqual(total["Sales_sum"].iloc[0], self.df["Sales"].sum())
+        self.assertEqual(total["row_count"].iloc[0], len(self.df))
+        self.assertIsNone(self.cube.lookup(["Region", "Category", "Order Date:year"]))
+
+
+class UpdateRollupsTest(TemporaryDirectoryTestCase):
+    """Rollups follow reloads of the dataset file."""
+
+    def setUp(self):
+        super().setUp()
+        self.data_manager = DataManager({
+            "cache_enabled": False,
+            "share_with_sandbox": False,
+            "optimize_dtypes": True,
+            "date_columns": ["Order Date"],
+            "date_format": "%d/%m/%Y",
+            "rollups": {"orders": {"dimensions": ["Region", "Order Date:month"], "measures": ["Sales"]}},
+        })
+        self.csv_path = self.path("orders.csv")
+        orders(60).to_csv(self.csv_path, index=False)
+
+    def reload(self):
+        df = self.data_manager.load_dataset(self.csv_path)
+        self.assertIsNotNone(df)
+        return df
+
+    def test_appended_rows_update_the_cube_incrementally(self):
+        self.reload()
+        cube = self.data_manager.get_rollup("orders")
+        orders(15, start=60).to_csv(self.csv_path, mode="a", header=False, index=False)
+
+        with mock.patch.object(RollupCube, "_aggregate_rows", autospec=True,
+                               side_effect=RollupCube._aggregate_rows) as aggregate:
+            df = self.reload()
+        # Only the appended rows are aggregated, into the same cube
+        self.assertIs(self.data_manager.get_rollup("orders"), cube)
+        self.assertEqual(len(aggregate.call_args.args[1]), 15)
+        self.assertEqual(cube.row_count, 75)
+        by_region = cube.lookup(["Region"]).set_index("Region")["Sales_sum"]
+        pd.testing.assert_series_equal(by_region.sort_index(), df.groupby("Region", observed=True)["Sales"].sum(),
+                                       check_names=False)
+
+    def test_changed_rows_rebuild_the_cube(self):
+        self.reload()
+        cube = self.data_manager.get_rollup("orders")
+        changed = orders(60)
+        changed.loc[0, "Sales"] = 1000.0
+        changed.to_csv(self.csv_path, index=False)
+
+        df = self.reload()
+        rebuilt = self.data_manager.get_rollup("orders")
+        self.assertIsNot(rebuilt, cube)
+        self.assertAlmostEqual(rebuilt.lookup()["Sales_sum"].iloc[0], df["Sales"].sum())
+
+
+class DatasetCacheTest(TemporaryDirectoryTestCase):
+    """Parsed datasets cached per file version and parse options."""
+
+    def setUp(self):
+        super().setUp()
+        self.csv_path = self.path("orders.csv")
+        orders(30).to_csv(self.csv_path, index=False)
+        self.cache_dir = self.path("cache")
+
+    def cache(self, date_format="%d/%m/%Y"):
+        return DatasetCache(self.cache_dir, date_columns=["Order Date"], date_format=date_format)
+
+    def entries(self):
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_current_version_is_served_from_the_cache(self):
+        df, _ = self.cache().load(self.csv_path)
+        self.assertEqual(len(self.entries()), 2)
+
+        with mock.patch("src.core.dataset_cache.read_dataset", side_effect=AssertionError("parsed again")):
+            cached, _ = self.cache().load(self.csv_path)
+        pd.testing.assert_frame_equal(cached, df, check_categorical=False)
+        self.assertEqual(str(cached["Order Date"].dtype), "datetime64[ns]")
+
+    def test_parse_options_are_part_of_the_key(self):
+        self.cache().load(self.csv_path)
+        df, _ = self.cache(date_format="%m/%d/%Y").load(self.csv_path)
+
+        # Day-first dates don't parse month-first, so the result must not come from the first entry
+        self.assertNotEqual(str(df["Order Date"].dtype), "datetime64[ns]")
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_changed_file_replaces_stale_entries(self):
+        self.cache().load(self.csv_path)
+        old_entries = self.entries()
+        orders(40).to_csv(self.csv_path, index=False)
+
+        df, _ = self.cache().load(self.csv_path)
+        self.assertEqual(len(df), 40)
+        self.assertEqual(len(self.entries()), 2)
+        self.assertFalse(set(old_entries) & set(self.entries()))
+
+    def test_entry_without_report_is_incomplete(self):
+        self.cache().load(self.csv_path)
+        report = next(name for name in self.entries() if name.endswith(".json"))
+        os.remove(os.path.join(self.cache_dir, report))
+
+        with mock.patch("src.core.dataset_cache.read_dataset", wraps=pd.read_csv) as read:
+            self.cache().load(self.csv_path)
+        read.assert_called_once()
+        self.assertIn(report, self.entries())
+
+    def test_failed_write_leaves_no_entry(self):
+        with mock.patch.object(pd.DataFrame, "to_parquet", side_effect=OSError("disk full")):
+            df, _ = self.cache().load(self.csv_path)
+        self.assertEqual(len(df), 30)
+        self.assertEqual(self.entries(), [])
+
+
+class OptimizeDataframeTest(unittest.TestCase):
+    """Compact dtypes for loaded datasets."""
+
+    def test_columns_get_compact_dtypes(self):
+        df = pd.DataFrame({
+            "Region": ["West", "East"] * 50,
+            "Order Date": ["01/02/2020", "15/03/2021"] * 50,
+            "Quantity": list(range(100)),
+            "Discount": [1.0, None] * 50,
+            "Customer": [f"customer {i}" for i in range(100)],
+        })
+
+        optimized, report = optimize_dataframe(df, date_format="%d/%m/%Y")
+
+        self.assertEqual({col: str(dtype) for col, dtype in optimized.dtypes.items()}, {
+            "Region": "category",
+            "Order Date": "datetime64[ns]",
+            "Quantity": "int8",
+            "Discount": "Int8",
+            "Customer": "object",
+        })
+        self.assertEqual([entry["column"] for entry in report], ["Region", "Order Date", "Quantity", "Discount"])
+        self.assertTrue(all(entry["bytes_saved"] > 0 for entry in report))
+        # The input is left as it was
+        self.assertEqual(str(df["Quantity"].dtype), "int64")
+        pd.testing.assert_frame_equal(optimized.astype({"Region": object}).drop(columns=["Order Date"]),
+                                      df.drop(columns=["Order Date"]).astype({"Quantity": "int8", "Discount": "Int8"}))
+
+    def test_only_configured_dates_without_detection(self):
+        df = pd.DataFrame({"Order Date": ["01/02/2020"] * 3, "Ship Date": ["02/02/2020"] * 3})
+
+        optimized, _ = optimize_dataframe(df, date_columns=["Order Date"], date_format="%d/%m/%Y",
+                                          categorical_max_ratio=0, detect_dates=False)
+        self.assertEqual(str(optimized["Order Date"].dtype), "datetime64[ns]")
+        self.assertEqual(str(optimized["Ship Date"].dtype), "object")
+
+
+if __name__ == "__main__":
+    unittest.main()
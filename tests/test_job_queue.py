@@ -0,0 +1,118 @@
+"""
+Tests for the background job queue.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from src.application.job_queue import FAILED, SUCCEEDED, JobQueue, QueueFullError, current_job
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until_done(job, timeout=10):
+    """Wait for the done event of a job, returning its events."""
+    deadline = time.time() + timeout
+    events = []
+    while not any(event["type"] == "done" for event in events) and time.time() < deadline:
+        events = job.wait_for_events(timeout=0.1)
+    return events
+
+
+class JobQueueTest(unittest.TestCase):
+    """Running, bounding and forgetting jobs."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.release = threading.Event()
+
+    def tearDown(self):
+        # Let blocked workers finish
+        self.release.set()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def queue(self, **kwargs):
+        return JobQueue(lock_path=os.path.join(self.directory, "jobs.lock"), **kwargs)
+
+    def test_jobs_return_results_and_errors(self):
+        queue = self.queue(workers=1)
+
+        def fail():
+            raise ValueError("bad data")
+
+        succeeded = queue.submit(lambda a, b: a + b, 1, 2, metadata={"query": "sum"})
+        failed = queue.submit(fail)
+        events = wait_until_done(succeeded)
+        wait_until_done(failed)
+
+        self.assertEqual((succeeded.status, succeeded.result), (SUCCEEDED, 3))
+        self.assertEqual(events[-1]["data"]["metadata"], {"query": "sum"})
+        self.assertEqual((failed.status, failed.error), (FAILED, "bad data"))
+        self.assertIs(queue.get(succeeded.id), succeeded)
+
+    def test_full_queue_rejects_submissions(self):
+        queue = self.queue(workers=1, max_pending=1)
+        running = queue.submit(self.release.wait)
+        while running.status != "running":
+            time.sleep(0.01)
+        waiting = queue.submit(lambda: None)
+
+        with self.assertRaises(QueueFullError):
+            queue.submit(lambda: None)
+        self.assertEqual(queue.position(waiting), 0)
+        self.assertEqual((queue.stats()["running"], queue.stats()["queued"]), (1, 1))
+
+        self.release.set()
+        wait_until_done(waiting)
+        self.assertEqual(waiting.status, SUCCEEDED)
+
+    def test_finished_jobs_expire_after_result_ttl(self):
+        queue = self.queue(workers=1, result_ttl_seconds=60)
+        job = queue.submit(lambda: "done")
+        wait_until_done(job)
+
+        with mock.patch("src.application.job_queue.time.time", return_value=time.time() + 61):
+            queue.submit(lambda: None)
+        self.assertIsNone(queue.get(job.id))
+
+    def test_token_events_are_dropped_when_the_job_finishes(self):
+        queue = self.queue(workers=1)
+
+        def answer():
+            job = current_job()
+            job.emit("stage", {"stage": "analyzing"})
+            for token in ("West ", "leads"):
+                job.emit("token", {"text": token})
+            return "West leads"
+
+        job = queue.submit(answer)
+        wait_until_done(job)
+
+        events = job.wait_for_events(timeout=0)
+        self.assertEqual([(event["id"], event["type"]) for event in events],
+                         [(0, "status"), (1, "stage"), (4, "done")])
+        # Clients resuming after a dropped token only get the later events
+        self.assertEqual([event["id"] for event in job.wait_for_events(after=2, timeout=0)], [4])
+        self.assertEqual(job.wait_for_events(after=4, timeout=0), [])
+
+    def test_second_process_refuses_to_start(self):
+        queue = self.queue(workers=1)
+        lock_path = os.path.join(self.directory, "jobs.lock")
+        result = subprocess.run(
+            [sys.executable, "-c", f"from src.application.job_queue import JobQueue; JobQueue(lock_path={lock_path!r})"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True
+        )
+
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("Another process already runs the job queue", result.stderr)
+        self.assertIsNotNone(queue.submit(lambda: None))
+
+
+if __name__ == "__main__":
+    unittest.main()
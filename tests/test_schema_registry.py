@@ -0,0 +1,117 @@
+"""
+Tests for stored schemas and schema descriptions within a token budget.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from src.core.schema_registry import SchemaRegistry
+from src.core.schema_summarizer import estimate_tokens
+
+FINGERPRINT = "0123456789abcdef"
+NEW_FINGERPRINT = "fedcba9876543210"
+
+
+def wide_table(metrics=150, rows=50):
+    """A table with a few dimensions and many numeric metric columns."""
+    rng = np.random.default_rng(0)
+    data = {
+        "region": [["West", "East", "South", "Central"][i % 4] for i in range(rows)],
+        "segment": [["Consumer", "Corporate"][i % 2] for i in range(rows)],
+    }
+    for index in range(metrics):
+        data[f"metric_{index:03d}_value"] = rng.normal(size=rows)
+    data["revenue_q3"] = rng.uniform(0, 1000, size=rows)
+    return pd.DataFrame(data)
+
+
+class StoredSchemaTest(unittest.TestCase):
+    """Profiles stored on disk per dataset fingerprint."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.df = pd.DataFrame({"Region": ["West", "East", "West"], "Sales": [1.0, 2.0, 3.0]})
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def registry(self):
+        return SchemaRegistry({"cache_enabled": True, "cache_dir": self.cache_dir})
+
+    def test_schema_is_reused_for_the_same_fingerprint(self):
+        schema = self.registry().register_schema("sales", self.df, fingerprint=FINGERPRINT)
+        self.assertEqual(os.listdir(self.cache_dir), [f"sales-{FINGERPRINT}.json"])
+
+        with mock.patch("src.core.schema_registry.profile_dataframe", side_effect=AssertionError("profiled again")):
+            stored = self.registry().register_schema("sales", self.df, fingerprint=FINGERPRINT)
+        self.assertEqual(stored, schema)
+
+    def test_new_fingerprint_profiles_again_and_replaces_the_old_schema(self):
+        self.registry().register_schema("sales", self.df, fingerprint=FINGERPRINT)
+        # Another dataset whose name starts with the same prefix
+        self.registry().register_schema("sales-2024", self.df, fingerprint=FINGERPRINT)
+
+        changed = pd.concat([self.df, self.df])
+        schema = self.registry().register_schema("sales", changed, fingerprint=NEW_FINGERPRINT)
+
+        self.assertEqual(schema["row_count"], 6)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         [f"sales-2024-{FINGERPRINT}.json", f"sales-{NEW_FINGERPRINT}.json"])
+
+    def test_other_access_note_profiles_again(self):
+        self.registry().register_schema("sales", self.df, fingerprint=FINGERPRINT)
+
+        with mock.patch("src.core.schema_registry.profile_dataframe", return_value=[]) as profile:
+            schema = self.registry().register_schema("sales", self.df, access_note="Use the lazy handle",
+                                                     fingerprint=FINGERPRINT)
+        profile.assert_called_once()
+        self.assertEqual(schema["access_note"], "Use the lazy handle")
+
+
+class SchemaDescriptionTest(unittest.TestCase):
+    """Describing wide tables within the token budget."""
+
+    def setUp(self):
+        self.registry = SchemaRegistry({"cache_enabled": False, "token_budget": 800})
+        self.registry.register_schema("wide", wide_table())
+
+    def test_full_description_without_question(self):
+        description = self.registry.format_schema_for_llm("wide")
+        self.assertGreater(estimate_tokens(description), 800)
+        self.assertIn("- metric_149_value (", description)
+
+    def test_description_for_question_stays_within_budget(self):
+        description = self.registry.format_schema_for_llm("wide", question="What is the revenue q3 by region?")
+
+        self.assertLessEqual(estimate_tokens(description), 800)
+        # The columns named in the question are described in full, others only listed or counted
+        self.assertIn("- revenue_q3 (", description)
+        self.assertIn("- region (", description)
+        self.assertIn("Schema Lookup tool", description)
+        self.assertIn("Other columns: ", description)
+
+    def test_describe_columns_finds_exact_and_partial_names(self):
+        description = self.registry.describe_columns("wide", ["REVENUE_Q3", "metric_14"])
+        lines = description.splitlines()
+
+        self.assertTrue(lines[0].startswith("- revenue_q3 ("))
+        self.assertEqual([line.split(" (")[0] for line in lines[1:]],
+                         [f"- metric_{index:03d}_value" for index in range(140, 150)])
+        self.assertIn("min", lines[0])
+
+    def test_describe_columns_limits_and_reports_misses(self):
+        description = self.registry.describe_columns("wide", ["metric"], limit=5)
+        self.assertEqual(len(description.splitlines()), 6)
+        self.assertIn("145 more matching columns", description)
+
+        self.assertIn("No columns of 'wide' match", self.registry.describe_columns("wide", ["discount"]))
+        self.assertIn("not found", self.registry.describe_columns("narrow", ["region"]))
+
+
+if __name__ == "__main__":
+    unittest.main()